@@ -0,0 +1,52 @@
+"""content-addressed blobs for equipment photos
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by init_db()
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("stored_blobs"):
+        op.create_table(
+            "stored_blobs",
+            sa.Column("sha256", sa.String(64), primary_key=True),
+            sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+            sa.Column("content_type", sa.String(100)),
+            sa.Column("storage_key", sa.String(500), nullable=False),
+            sa.Column("thumbnail_key", sa.String(500)),
+            sa.Column("width", sa.Integer()),
+            sa.Column("height", sa.Integer()),
+            sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("last_referenced_at", sa.DateTime()),
+            sa.Column("created_at", sa.DateTime()),
+        )
+
+    columns = {c["name"] for c in inspector.get_columns("equipment_photos")}
+    if "blob_sha256" not in columns:
+        op.add_column(
+            "equipment_photos",
+            sa.Column("blob_sha256", sa.String(64), sa.ForeignKey("stored_blobs.sha256")),
+        )
+        op.create_index("ix_equipment_photos_blob_sha256", "equipment_photos", ["blob_sha256"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_equipment_photos_blob_sha256", table_name="equipment_photos")
+    op.drop_column("equipment_photos", "blob_sha256")
+    op.drop_table("stored_blobs")
@@ -0,0 +1,26 @@
+"""direct-to-storage uploads
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE upload_sessions ADD COLUMN IF NOT EXISTS storage_key VARCHAR(500)")
+
+
+def downgrade() -> None:
+    op.drop_column("upload_sessions", "storage_key")
@@ -0,0 +1,58 @@
+"""sync versions and tombstones for offline delta sync
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SYNCED_TABLES = [
+    "categories",
+    "locations",
+    "equipment",
+    "equipment_tags",
+    "checkouts",
+    "transfer_requests",
+    "transfers",
+]
+
+
+def upgrade() -> None:
+    for table in SYNCED_TABLES:
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS sync_version BIGINT "
+            f"NOT NULL DEFAULT (pg_current_xact_id()::text)::bigint"
+        )
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_sync_version ON {table} (sync_version)")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS sync_tombstones (
+            id BIGSERIAL CONSTRAINT pk_sync_tombstones PRIMARY KEY,
+            entity VARCHAR(30) NOT NULL,
+            entity_id UUID NOT NULL,
+            sync_version BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text)::bigint,
+            deleted_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+    """)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_sync_tombstones_entity_sync_version "
+        "ON sync_tombstones (entity, sync_version)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sync_tombstones")
+    for table in SYNCED_TABLES:
+        op.drop_index(f"ix_{table}_sync_version", table_name=table)
+        op.drop_column(table, "sync_version")
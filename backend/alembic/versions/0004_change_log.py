@@ -0,0 +1,71 @@
+"""change_log table and row triggers for change-data capture
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.change_log import RECORD_CHANGE_FUNCTION, change_trigger_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRACKED_TABLES = [
+    "calibrations",
+    "categories",
+    "checkouts",
+    "equipment",
+    "equipment_photos",
+    "equipment_tags",
+    "locations",
+    "maintenance_records",
+    "notifications",
+    "transfer_offers",
+    "transfer_requests",
+    "transfers",
+]
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq BIGSERIAL CONSTRAINT pk_change_log PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT (pg_current_xact_id()::text)::bigint,
+            table_name VARCHAR(63) NOT NULL,
+            row_id VARCHAR(64) NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            columns VARCHAR[],
+            changed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_change_log_version_seq ON change_log (version, seq)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_change_log_changed_at ON change_log (changed_at)")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS change_log_consumers (
+            name VARCHAR(100) CONSTRAINT pk_change_log_consumers PRIMARY KEY,
+            position_version BIGINT NOT NULL,
+            position_seq BIGINT NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE
+        )
+    """)
+
+    op.execute(RECORD_CHANGE_FUNCTION)
+    for table in TRACKED_TABLES:
+        op.execute(change_trigger_ddl(table))
+
+
+def downgrade() -> None:
+    for table in TRACKED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_record_change ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS record_change()")
+    op.drop_table("change_log_consumers")
+    op.drop_table("change_log")
@@ -0,0 +1,113 @@
+"""monthly range partitioning of audit_log and notifications
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.change_log import change_trigger_ddl
+from app.models.partitioning import create_partition_ddl, upcoming_months, month_start
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = {
+    "audit_log": """
+        id UUID NOT NULL,
+        user_id UUID CONSTRAINT fk_audit_log_user_id_users REFERENCES users (id),
+        action VARCHAR(100) NOT NULL,
+        entity_type VARCHAR(50),
+        entity_id UUID,
+        old_values JSONB,
+        new_values JSONB,
+        ip_address VARCHAR(45),
+        user_agent TEXT,
+        platform VARCHAR(20),
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+    """,
+    "notifications": """
+        id UUID NOT NULL,
+        user_id UUID NOT NULL CONSTRAINT fk_notifications_user_id_users REFERENCES users (id),
+        type VARCHAR(50) NOT NULL,
+        title VARCHAR(200) NOT NULL,
+        message TEXT,
+        related_entity_type VARCHAR(50),
+        related_entity_id UUID,
+        is_read BOOLEAN NOT NULL,
+        read_at TIMESTAMP WITHOUT TIME ZONE,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+    """,
+}
+
+INDEXES = {
+    "audit_log": {
+        "ix_audit_log_action": "action",
+        "ix_audit_log_entity_type": "entity_type",
+        "ix_audit_log_entity_id": "entity_id",
+        "ix_audit_log_created_at": "created_at",
+    },
+    "notifications": {
+        "ix_notifications_user_id_created_at": "user_id, created_at",
+    },
+}
+
+
+def is_partitioned(bind, table: str) -> bool:
+    return bool(bind.execute(
+        sa.text("SELECT 1 FROM pg_class WHERE relname = :table AND relkind = 'p'"),
+        {"table": table}
+    ).scalar())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for table, columns in COLUMNS.items():
+        # Tables may already have been created partitioned by init_db()
+        if is_partitioned(bind, table):
+            continue
+
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+        op.execute(f"ALTER TABLE {table}_unpartitioned DROP CONSTRAINT IF EXISTS pk_{table}")
+        for index in INDEXES[table]:
+            op.execute(f"DROP INDEX IF EXISTS {index}")
+
+        op.execute(
+            f"CREATE TABLE {table} ({columns}, CONSTRAINT pk_{table} PRIMARY KEY (id, created_at)) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        oldest = bind.execute(sa.text(f"SELECT min(created_at) FROM {table}_unpartitioned")).scalar()
+        for month in upcoming_months(month_start(oldest) if oldest else None):
+            op.execute(create_partition_ddl(table, month))
+
+        op.execute(f"UPDATE {table}_unpartitioned SET created_at = now() AT TIME ZONE 'utc' WHERE created_at IS NULL")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned")
+        op.execute(f"DROP TABLE {table}_unpartitioned")
+
+        for index, columns in INDEXES[table].items():
+            op.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+    op.execute(change_trigger_ddl("notifications"))
+
+
+def downgrade() -> None:
+    for table, columns in COLUMNS.items():
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(f"ALTER TABLE {table}_partitioned DROP CONSTRAINT pk_{table}")
+        for index in INDEXES[table]:
+            op.execute(f"DROP INDEX IF EXISTS {index}")
+        op.execute(f"CREATE TABLE {table} ({columns}, CONSTRAINT pk_{table} PRIMARY KEY (id))")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+        op.execute(f"DROP TABLE {table}_partitioned")
+        for index, columns in INDEXES[table].items():
+            op.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+    op.execute(change_trigger_ddl("notifications"))
@@ -0,0 +1,29 @@
+"""partial index on unread notifications
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_notifications_user_id_unread "
+        "ON notifications (user_id) WHERE is_read = false"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notifications_user_id_unread", table_name="notifications")
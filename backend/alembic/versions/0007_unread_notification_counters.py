@@ -0,0 +1,35 @@
+"""per-user unread notification counters
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 15:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.notification import COUNT_UNREAD_FUNCTION, COUNT_UNREAD_TRIGGERS, RECONCILE_UNREAD
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS unread_notifications INTEGER NOT NULL DEFAULT 0")
+    op.execute(COUNT_UNREAD_FUNCTION)
+    for ddl in COUNT_UNREAD_TRIGGERS:
+        op.execute(ddl)
+    op.execute(RECONCILE_UNREAD)
+
+
+def downgrade() -> None:
+    for event in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS notifications_count_unread_{event} ON notifications")
+    op.execute("DROP FUNCTION IF EXISTS count_unread_notifications()")
+    op.drop_column("users", "unread_notifications")
@@ -0,0 +1,37 @@
+"""notification dedupe ledger
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by init_db()
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("notification_keys"):
+        op.create_table(
+            "notification_keys",
+            sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("key", sa.String(200), primary_key=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_notification_keys_expires_at", "notification_keys", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("notification_keys")
@@ -0,0 +1,45 @@
+"""calibration reminder ledger constraint and next_calibration_date index
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 17:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_equipment_next_calibration_date "
+        "ON equipment (next_calibration_date)"
+    )
+    # Keep the earliest of any reminders recorded twice before the constraint existed
+    op.execute("""
+        DELETE FROM calibration_reminders_sent a
+        USING calibration_reminders_sent b
+        WHERE a.equipment_id = b.equipment_id
+          AND a.calibration_id IS NOT DISTINCT FROM b.calibration_id
+          AND a.reminder_type IS NOT DISTINCT FROM b.reminder_type
+          AND a.sent_to IS NOT DISTINCT FROM b.sent_to
+          AND (a.sent_at, a.id) > (b.sent_at, b.id)
+    """)
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_calibration_reminders_sent_cycle "
+        "ON calibration_reminders_sent (equipment_id, calibration_id, reminder_type, sent_to) "
+        "NULLS NOT DISTINCT"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_calibration_reminders_sent_cycle", table_name="calibration_reminders_sent")
+    op.drop_index("ix_equipment_next_calibration_date", table_name="equipment")
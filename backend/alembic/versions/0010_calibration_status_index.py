@@ -0,0 +1,26 @@
+"""index on equipment.calibration_status
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 18:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_equipment_calibration_status ON equipment (calibration_status)")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_equipment_calibration_status", table_name="equipment")
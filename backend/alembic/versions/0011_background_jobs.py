@@ -0,0 +1,59 @@
+"""background job queue
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 19:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by init_db()
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("background_jobs"):
+        op.create_table(
+            "background_jobs",
+            sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column("name", sa.String(100), nullable=False),
+            sa.Column("payload", postgresql.JSONB(), nullable=False),
+            sa.Column("key", sa.String(200)),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("max_attempts", sa.Integer(), nullable=False),
+            sa.Column("run_at", sa.DateTime(), nullable=False),
+            sa.Column("locked_until", sa.DateTime()),
+            sa.Column("worker", sa.String(100)),
+            sa.Column("result", postgresql.JSONB()),
+            sa.Column("last_error", sa.Text()),
+            sa.Column("created_by", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id")),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("started_at", sa.DateTime()),
+            sa.Column("finished_at", sa.DateTime()),
+            sa.UniqueConstraint("key", name="uq_background_jobs_key"),
+        )
+        op.create_index(
+            "ix_background_jobs_due", "background_jobs", ["run_at"],
+            postgresql_where=sa.text("status = 'queued'")
+        )
+        op.create_index(
+            "ix_background_jobs_running", "background_jobs", ["locked_until"],
+            postgresql_where=sa.text("status = 'running'")
+        )
+        op.create_index("ix_background_jobs_name_created_at", "background_jobs", ["name", "created_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("background_jobs")
@@ -0,0 +1,47 @@
+"""materialized paths for categories
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 20:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.tree import (
+    SET_TREE_PATH_FUNCTION, MOVE_TREE_PATH_FUNCTION, tree_trigger_ddl, backfill_tree_paths,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE categories ADD COLUMN IF NOT EXISTS path TEXT COLLATE \"C\" NOT NULL DEFAULT ''")
+    op.execute("ALTER TABLE categories ADD COLUMN IF NOT EXISTS depth INTEGER NOT NULL DEFAULT 0")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_categories_path ON categories (path)")
+
+    op.execute(SET_TREE_PATH_FUNCTION)
+    op.execute(MOVE_TREE_PATH_FUNCTION)
+    # Triggers installed by init_db() would act on the backfill
+    op.execute("DROP TRIGGER IF EXISTS categories_set_path ON categories")
+    op.execute("DROP TRIGGER IF EXISTS categories_move_path ON categories")
+    op.execute(backfill_tree_paths("categories", "parent_category_id"))
+    for ddl in tree_trigger_ddl("categories", "parent_category_id"):
+        op.execute(ddl)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS categories_set_path ON categories")
+    op.execute("DROP TRIGGER IF EXISTS categories_move_path ON categories")
+    op.execute("DROP FUNCTION IF EXISTS set_tree_path()")
+    op.execute("DROP FUNCTION IF EXISTS move_tree_path()")
+    op.drop_index("ix_categories_path", table_name="categories")
+    op.drop_column("categories", "depth")
+    op.drop_column("categories", "path")
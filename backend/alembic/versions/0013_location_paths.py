@@ -0,0 +1,45 @@
+"""materialized paths for locations, equipment indexes for subtree filters
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 21:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.tree import tree_trigger_ddl, backfill_tree_paths
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE locations ADD COLUMN IF NOT EXISTS path TEXT COLLATE \"C\" NOT NULL DEFAULT ''")
+    op.execute("ALTER TABLE locations ADD COLUMN IF NOT EXISTS depth INTEGER NOT NULL DEFAULT 0")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_locations_path ON locations (path)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_equipment_category_id ON equipment (category_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_equipment_current_location_id ON equipment (current_location_id)")
+
+    # Triggers installed by init_db() would act on the backfill
+    op.execute("DROP TRIGGER IF EXISTS locations_set_path ON locations")
+    op.execute("DROP TRIGGER IF EXISTS locations_move_path ON locations")
+    op.execute(backfill_tree_paths("locations", "parent_location_id"))
+    for ddl in tree_trigger_ddl("locations", "parent_location_id"):
+        op.execute(ddl)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS locations_set_path ON locations")
+    op.execute("DROP TRIGGER IF EXISTS locations_move_path ON locations")
+    op.drop_index("ix_equipment_current_location_id", table_name="equipment")
+    op.drop_index("ix_equipment_category_id", table_name="equipment")
+    op.drop_index("ix_locations_path", table_name="locations")
+    op.drop_column("locations", "depth")
+    op.drop_column("locations", "path")
@@ -0,0 +1,36 @@
+"""indexes for transfer lists and received requests
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19 22:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0014'
+down_revision: Union[str, None] = '0013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_equipment_current_holder_id", "equipment", "current_holder_id"),
+    ("ix_transfer_requests_equipment_id_status", "transfer_requests", "equipment_id, status"),
+    ("ix_transfer_requests_requester_id_created_at", "transfer_requests", "requester_id, created_at, id"),
+    ("ix_transfers_from_user_id_created_at", "transfers", "from_user_id, created_at, id"),
+    ("ix_transfers_to_user_id_created_at", "transfers", "to_user_id, created_at, id"),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def downgrade() -> None:
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
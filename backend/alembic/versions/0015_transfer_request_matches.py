@@ -0,0 +1,48 @@
+"""candidate holders for broadcast transfer requests
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-19 23:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0015'
+down_revision: Union[str, None] = '0014'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by init_db()
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("transfer_request_matches"):
+        op.create_table(
+            "transfer_request_matches",
+            sa.Column(
+                "request_id", postgresql.UUID(as_uuid=True),
+                sa.ForeignKey("transfer_requests.id", ondelete="CASCADE"), primary_key=True
+            ),
+            sa.Column(
+                "user_id", postgresql.UUID(as_uuid=True),
+                sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+            ),
+            sa.Column("equipment_count", sa.Integer(), nullable=False),
+            sa.Column("distance_km", sa.Float()),
+            sa.Column("matched_at", sa.DateTime()),
+        )
+        op.create_index(
+            "ix_transfer_request_matches_user_id_distance_km",
+            "transfer_request_matches", ["user_id", "distance_km"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("transfer_request_matches")
@@ -0,0 +1,38 @@
+"""partial indexes over active transfer requests
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-20 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.transfer import ACTIVE_REQUEST_WHERE
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0016'
+down_revision: Union[str, None] = '0015'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_transfer_requests_active_type_created_at", "request_type, created_at, id"),
+    ("ix_transfer_requests_active_expires_at", "expires_at"),
+]
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES:
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON transfer_requests ({columns}) "
+            f"WHERE {ACTIVE_REQUEST_WHERE.text}"
+        )
+
+
+def downgrade() -> None:
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name="transfer_requests")
@@ -0,0 +1,30 @@
+"""row versions for optimistic locking of state transitions
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-20 01:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0017'
+down_revision: Union[str, None] = '0016'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ["equipment", "checkouts", "transfer_requests", "transfers"]
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_column(table, "version")
@@ -0,0 +1,46 @@
+"""stored responses for Idempotency-Key
+
+Revision ID: 0018
+Revises: 0017
+Create Date: 2026-10-20 02:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0018'
+down_revision: Union[str, None] = '0017'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tables may already have been created by init_db()
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("idempotency_keys"):
+        op.create_table(
+            "idempotency_keys",
+            sa.Column(
+                "user_id", postgresql.UUID(as_uuid=True),
+                sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+            ),
+            sa.Column("key", sa.String(200), primary_key=True),
+            sa.Column("fingerprint", sa.String(64), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("status_code", sa.Integer()),
+            sa.Column("headers", postgresql.JSONB()),
+            sa.Column("body", sa.LargeBinary()),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("idempotency_keys")
@@ -0,0 +1,31 @@
+"""partial index over open checkouts by return date
+
+Revision ID: 0019
+Revises: 0018
+Create Date: 2026-10-20 03:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.checkout import OPEN_CHECKOUT_WHERE
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0019'
+down_revision: Union[str, None] = '0018'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_checkouts_open_expected_return_at "
+        f"ON checkouts (expected_return_at) WHERE {OPEN_CHECKOUT_WHERE.text}"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_checkouts_open_expected_return_at", table_name="checkouts")
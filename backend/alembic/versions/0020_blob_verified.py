@@ -0,0 +1,33 @@
+"""verified flag for stored blobs
+
+Revision ID: 0020
+Revises: 0019
+Create Date: 2026-10-20 04:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0020'
+down_revision: Union[str, None] = '0019'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE stored_blobs ADD COLUMN IF NOT EXISTS verified boolean NOT NULL DEFAULT true")
+    # Direct uploads whose verification is still queued
+    op.execute("""
+        UPDATE stored_blobs SET verified = false
+        WHERE sha256 IN (
+            SELECT payload->>'sha256' FROM background_jobs
+            WHERE name = 'blobs.verify' AND status IN ('queued', 'running')
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column("stored_blobs", "verified")
@@ -0,0 +1,42 @@
+"""record sync tombstones with row triggers
+
+Revision ID: 0021
+Revises: 0020
+Create Date: 2026-10-20 05:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.models.sync import RECORD_TOMBSTONE_FUNCTION, tombstone_trigger_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0021'
+down_revision: Union[str, None] = '0020'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> sync entity
+SYNCED_TABLES = {
+    "categories": "categories",
+    "locations": "locations",
+    "equipment": "equipment",
+    "equipment_tags": "tags",
+    "checkouts": "checkouts",
+    "transfer_requests": "transfer_requests",
+    "transfers": "transfers",
+}
+
+
+def upgrade() -> None:
+    op.execute(RECORD_TOMBSTONE_FUNCTION)
+    for table, entity in SYNCED_TABLES.items():
+        op.execute(tombstone_trigger_ddl(table, entity))
+
+
+def downgrade() -> None:
+    for table in SYNCED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_record_tombstone ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS record_tombstone()")
@@ -0,0 +1,32 @@
+"""default partitions for audit_log and notifications
+
+Revision ID: 0022
+Revises: 0021
+Create Date: 2026-10-20 06:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.models.partitioning import create_default_partition_ddl, default_partition_name
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0022'
+down_revision: Union[str, None] = '0021'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONED_TABLES = ["audit_log", "notifications"]
+
+
+def upgrade() -> None:
+    for table in PARTITIONED_TABLES:
+        op.execute(create_default_partition_ddl(table))
+
+
+def downgrade() -> None:
+    # Rows still in a default partition are lost with it
+    for table in PARTITIONED_TABLES:
+        op.execute(f"DROP TABLE IF EXISTS {default_partition_name(table)}")
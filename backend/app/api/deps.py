@@ -8,8 +8,9 @@ from sqlalchemy.orm import selectinload
 
 from app.core.database import get_db
 from app.core.security import verify_access_token
-from app.core.permissions import Permission, Role, has_permission, get_role_permissions
+from app.core.permissions import Permission, Role, has_permission, get_role_permissions, get_user_role
 from app.models.user import User, Role as RoleModel
+from app.services import audit
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
@@ -54,6 +55,7 @@ async def get_current_user(
             detail="User is inactive"
         )
 
+    audit.set_user(user.id)
     return user
 
 
@@ -77,17 +79,11 @@ async def get_current_user_optional(
     user = result.scalar_one_or_none()
 
     if user and user.is_active:
+        audit.set_user(user.id)
         return user
     return None
 
 
-def get_user_role(user: User) -> Role:
-    """Get the Role enum from user's role"""
-    if not user.role:
-        return Role.WORKER
-    return Role(user.role.code)
-
-
 def check_permission(permission: Permission):
     """Dependency factory to check if user has a specific permission"""
     async def permission_checker(
@@ -0,0 +1,137 @@
+"""Idempotency-Key support for mutating routes.
+
+A client may send Idempotency-Key with a request it might retry. The
+first request with a key runs normally and its response is stored; a
+retry with the same key gets that response back, marked with
+Idempotent-Replayed, instead of running again. Routes opt in with
+dependencies=[Idempotent] on a router built with IdempotentRoute.
+
+Client errors are final and replayed like successes, except the ones a
+retry may get past (a conflict, a rate limit). Server errors release the
+key, so a retry runs the request again.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Request, Response, status
+from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.datastructures import UploadFile
+
+from app.api.deps import CurrentUser
+from app.services import idempotency
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# Recomputed on replay
+SKIPPED_HEADERS = {"content-length"}
+# Client errors that may go away on retry; their key is released
+RETRYABLE_STATUS_CODES = {
+    status.HTTP_408_REQUEST_TIMEOUT,
+    status.HTTP_409_CONFLICT,
+    status.HTTP_425_TOO_EARLY,
+    status.HTTP_429_TOO_MANY_REQUESTS,
+}
+
+
+class IdempotentReplay(Exception):
+    """Raised by the dependency to answer with a stored response"""
+
+    def __init__(self, response: Response):
+        self.response = response
+
+
+async def request_fingerprint(request: Request) -> str:
+    digest = hashlib.sha256(f"{request.method} {request.url.path}?{request.url.query}\n".encode())
+    if request.headers.get("content-type", "").startswith("multipart/"):
+        # The body stream is consumed by form parsing; files count by name and size
+        form = await request.form()
+        for name, value in form.multi_items():
+            if isinstance(value, UploadFile):
+                value = f"{value.filename}:{value.size}"
+            digest.update(f"{name}={value}\n".encode())
+    else:
+        digest.update(await request.body())
+    return digest.hexdigest()
+
+
+async def idempotency_key(
+    request: Request,
+    current_user: CurrentUser,
+    key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER, max_length=200),
+) -> None:
+    if not key:
+        return
+
+    fingerprint = await request_fingerprint(request)
+    existing = await idempotency.claim(current_user.id, key, fingerprint)
+    if existing is None:
+        request.state.idempotency_key = (current_user.id, key)
+        return
+
+    if existing.fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    if existing.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed"
+        )
+    raise IdempotentReplay(Response(
+        content=existing.body,
+        status_code=existing.status_code,
+        headers={**(existing.headers or {}), REPLAYED_HEADER: "true"},
+    ))
+
+
+Idempotent = Depends(idempotency_key)
+
+
+async def settle(request: Request, response: Response) -> None:
+    """Store the response under the request's key, or release the key for a retry"""
+    claimed = getattr(request.state, "idempotency_key", None)
+    if not claimed:
+        return
+    body = getattr(response, "body", None)
+    if body is None or response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES:
+        # Streamed, failed or worth retrying: nothing to replay
+        await idempotency.release(*claimed)
+    else:
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name not in SKIPPED_HEADERS
+        }
+        await idempotency.complete(*claimed, response.status_code, headers, body)
+
+
+class IdempotentRoute(APIRoute):
+    """Stores the response of a request that claimed an Idempotency-Key,
+    and answers replays"""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except IdempotentReplay as replay:
+                return replay.response
+            except HTTPException as exc:
+                await settle(request, await http_exception_handler(request, exc))
+                raise
+            except RequestValidationError as exc:
+                await settle(request, await request_validation_exception_handler(request, exc))
+                raise
+            except BaseException:
+                claimed = getattr(request.state, "idempotency_key", None)
+                if claimed:
+                    await idempotency.release(*claimed)
+                raise
+
+            await settle(request, response)
+            return response
+
+        return route_handler
@@ -0,0 +1,47 @@
+"""Keyset pagination over (created_at, id), newest first.
+
+The cursor for the next page is sent in the X-Next-Cursor header, so the
+endpoints keep returning plain lists; no header means the last page.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (ValueError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset(query, model, cursor: Optional[str], limit: int):
+    """Order newest first and fetch one row past the page to detect more"""
+    if cursor:
+        query = query.where(tuple_(model.created_at, model.id) < decode_cursor(cursor))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def page(rows: List, limit: int, response: Response) -> List:
+    """Trim the extra row and point X-Next-Cursor past the page"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
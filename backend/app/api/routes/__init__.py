@@ -15,6 +15,11 @@ from .maintenance import router as maintenance_router
 from .notifications import router as notifications_router
 from .reports import router as reports_router
 from .settings import router as settings_router
+from .uploads import router as uploads_router
+from .storage import router as storage_router
+from .sync import router as sync_router
+from .events import router as events_router
+from .jobs import router as jobs_router
 
 api_router = APIRouter()
 
@@ -33,3 +38,8 @@ api_router.include_router(maintenance_router, prefix="/maintenance", tags=["Main
 api_router.include_router(notifications_router, prefix="/notifications", tags=["Notifications"])
 api_router.include_router(reports_router, prefix="/reports", tags=["Reports"])
 api_router.include_router(settings_router, prefix="/settings", tags=["Settings"])
+api_router.include_router(uploads_router, prefix="/uploads", tags=["Uploads"])
+api_router.include_router(storage_router, prefix="/storage", tags=["Storage"])
+api_router.include_router(sync_router, prefix="/sync", tags=["Sync"])
+api_router.include_router(events_router, prefix="/events", tags=["Events"])
+api_router.include_router(jobs_router, prefix="/jobs", tags=["Jobs"])
@@ -1,3 +1,4 @@
+import time
 from datetime import date, timedelta
 from typing import List, Optional
 from uuid import UUID
@@ -7,8 +8,10 @@ from sqlalchemy import select, func, and_
 from sqlalchemy.orm import selectinload
 
 from app.api.deps import DB, CurrentUser, LeaderUser, ManagerUser
+from app.core.config import settings as app_settings
 from app.models.calibration import Calibration, CalibrationReminderSetting
 from app.models.equipment import Equipment
+from app.models.job import BackgroundJob
 from app.schemas.calibration import (
     CalibrationCreate,
     CalibrationUpdate,
@@ -20,9 +23,17 @@ from app.schemas.calibration import (
     CalibrationReminderSettingResponse,
 )
 from app.schemas.equipment import EquipmentListResponse
+from app.schemas.upload import PresignedUrlResponse
+from app.services import jobs
+from app.services.calibrations import calibration_status
+from app.services.certificates import save_calibration_certificate
+from app.services.storage import spool_upload, key_from_url, presigned_url_for
 
 router = APIRouter()
 
+# Manual reminder runs requested within this window share one job
+REMINDER_RUN_WINDOW_SECONDS = 60
+
 
 @router.get("/dashboard", response_model=CalibrationDashboard)
 async def get_calibration_dashboard(
@@ -36,63 +47,26 @@ async def get_calibration_dashboard(
     thirty_days = today + timedelta(days=30)
     seven_days = today + timedelta(days=7)
 
-    # Base query for equipment requiring calibration
-    base_query = select(Equipment).where(Equipment.requires_calibration == True)
+    # One pass, bucketed by date as the dashboard labels them: due today
+    # counts as expired, and items without a date only in the total
+    counts_query = select(
+        func.count(),
+        func.count().filter(Equipment.next_calibration_date > thirty_days),
+        func.count().filter(and_(
+            Equipment.next_calibration_date <= thirty_days,
+            Equipment.next_calibration_date > seven_days
+        )),
+        func.count().filter(and_(
+            Equipment.next_calibration_date <= seven_days,
+            Equipment.next_calibration_date > today
+        )),
+        func.count().filter(Equipment.next_calibration_date <= today),
+    ).where(Equipment.requires_calibration == True)
 
     if category_id:
-        base_query = base_query.where(Equipment.category_id == category_id)
-
-    # Count total
-    total_result = await db.execute(
-        select(func.count()).select_from(base_query.subquery())
-    )
-    total = total_result.scalar() or 0
-
-    # Count valid (next_calibration_date > 30 days)
-    valid_result = await db.execute(
-        select(func.count()).where(
-            and_(
-                Equipment.requires_calibration == True,
-                Equipment.next_calibration_date > thirty_days
-            )
-        )
-    )
-    valid = valid_result.scalar() or 0
+        counts_query = counts_query.where(Equipment.category_id == category_id)
 
-    # Count expiring in 30 days
-    expiring_30_result = await db.execute(
-        select(func.count()).where(
-            and_(
-                Equipment.requires_calibration == True,
-                Equipment.next_calibration_date <= thirty_days,
-                Equipment.next_calibration_date > seven_days
-            )
-        )
-    )
-    expiring_30 = expiring_30_result.scalar() or 0
-
-    # Count expiring in 7 days
-    expiring_7_result = await db.execute(
-        select(func.count()).where(
-            and_(
-                Equipment.requires_calibration == True,
-                Equipment.next_calibration_date <= seven_days,
-                Equipment.next_calibration_date > today
-            )
-        )
-    )
-    expiring_7 = expiring_7_result.scalar() or 0
-
-    # Count expired
-    expired_result = await db.execute(
-        select(func.count()).where(
-            and_(
-                Equipment.requires_calibration == True,
-                Equipment.next_calibration_date <= today
-            )
-        )
-    )
-    expired = expired_result.scalar() or 0
+    total, valid, expiring_30, expiring_7, expired = (await db.execute(counts_query)).one()
 
     # Get upcoming (next 30 days)
     upcoming_result = await db.execute(
@@ -283,14 +257,7 @@ async def create_calibration(
     equipment.last_calibration_date = calibration_data.calibration_date
     equipment.next_calibration_date = calibration_data.valid_until
 
-    today = date.today()
-    days_until = (calibration_data.valid_until - today).days
-    if days_until < 0:
-        equipment.calibration_status = "expired"
-    elif days_until <= 30:
-        equipment.calibration_status = "expiring"
-    else:
-        equipment.calibration_status = "valid"
+    equipment.calibration_status = calibration_status(equipment.requires_calibration, calibration_data.valid_until)
 
     await db.commit()
     await db.refresh(calibration)
@@ -346,15 +313,34 @@ async def upload_certificate(
             detail="Calibration not found"
         )
 
-    # TODO: Upload to MinIO/S3
-    certificate_url = f"/uploads/calibrations/{calibration_id}/{file.filename}"
-    calibration.certificate_url = certificate_url
-
-    await db.commit()
+    upload = await spool_upload(file, app_settings.ALLOWED_DOC_TYPES + app_settings.ALLOWED_IMAGE_TYPES)
+    certificate_url = await save_calibration_certificate(db, calibration, upload)
 
     return {"certificate_url": certificate_url}
 
 
+@router.get("/{calibration_id}/certificate/url", response_model=PresignedUrlResponse)
+async def get_certificate_download_url(
+    calibration_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Get a short-lived download URL for the calibration certificate"""
+    result = await db.execute(
+        select(Calibration.certificate_url).where(Calibration.id == calibration_id)
+    )
+    key = key_from_url(result.scalar_one_or_none())
+
+    if not key:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Certificate not found"
+        )
+
+    url, expires_at = presigned_url_for("GET", key)
+    return PresignedUrlResponse(url=url, expires_at=expires_at)
+
+
 # Reminder settings
 @router.get("/reminder-settings", response_model=List[CalibrationReminderSettingResponse])
 async def get_reminder_settings(
@@ -387,3 +373,16 @@ async def create_reminder_setting(
     await db.refresh(setting)
 
     return CalibrationReminderSettingResponse.model_validate(setting)
+
+
+@router.post("/reminders/run", status_code=status.HTTP_202_ACCEPTED)
+async def run_reminders(
+    db: DB,
+    current_user: ManagerUser,
+):
+    """Queue a reminder run now instead of waiting for the hourly one; follow it with GET /jobs/{job_id}"""
+    key = f"calibrations.send_reminders:manual:{int(time.time() // REMINDER_RUN_WINDOW_SECONDS)}"
+    await jobs.enqueue(db, "calibrations.send_reminders", key=key, created_by=current_user.id)
+    await db.commit()
+    job_id = (await db.execute(select(BackgroundJob.id).where(BackgroundJob.key == key))).scalar_one()
+    return {"job_id": job_id}
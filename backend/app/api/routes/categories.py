@@ -2,12 +2,13 @@ from typing import List, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
 from app.api.deps import DB, CurrentUser, ManagerUser, AdminUser
 from app.models.equipment import Category
 from app.schemas.category import CategoryCreate, CategoryUpdate, CategoryResponse, CategoryTree
+from app.services import trees
 
 router = APIRouter()
 
@@ -39,38 +40,8 @@ async def get_category_tree(
     current_user: CurrentUser,
 ):
     """Get category tree structure"""
-    result = await db.execute(
-        select(Category)
-        .options(selectinload(Category.children))
-        .where(Category.parent_category_id.is_(None))
-        .order_by(Category.name)
-    )
-    root_categories = result.scalars().all()
-
-    async def build_tree(category: Category) -> CategoryTree:
-        children_result = await db.execute(
-            select(Category)
-            .where(Category.parent_category_id == category.id)
-            .order_by(Category.name)
-        )
-        children = children_result.scalars().all()
-
-        return CategoryTree(
-            id=category.id,
-            name=category.name,
-            code=category.code,
-            parent_category_id=category.parent_category_id,
-            default_maintenance_interval_days=category.default_maintenance_interval_days,
-            requires_certification=category.requires_certification,
-            transfer_requires_approval=category.transfer_requires_approval,
-            max_transfer_days=category.max_transfer_days,
-            icon=category.icon,
-            color=category.color,
-            created_at=category.created_at,
-            children=[await build_tree(c) for c in children]
-        )
-
-    return [await build_tree(c) for c in root_categories]
+    forest = await trees.category_forest(db)
+    return JSONResponse(forest.roots())
 
 
 @router.post("", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
@@ -84,6 +55,7 @@ async def create_category(
     db.add(category)
     await db.commit()
     await db.refresh(category)
+    trees.invalidate("categories")
 
     return CategoryResponse.model_validate(category)
 
@@ -130,11 +102,20 @@ async def update_category(
         )
 
     update_data = category_data.model_dump(exclude_unset=True)
+    parent_id = update_data.get("parent_category_id")
+    if parent_id:
+        parent = await db.get(Category, parent_id)
+        if parent and f"/{category_id}/" in parent.path:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A category cannot be moved below itself"
+            )
     for field, value in update_data.items():
         setattr(category, field, value)
 
     await db.commit()
     await db.refresh(category)
+    trees.invalidate("categories")
 
     return CategoryResponse.model_validate(category)
 
@@ -170,5 +151,6 @@ async def delete_category(
 
     await db.delete(category)
     await db.commit()
+    trees.invalidate("categories")
 
     return {"message": "Category deleted successfully"}
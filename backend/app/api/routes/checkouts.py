@@ -2,17 +2,36 @@ from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, status, Query
-from sqlalchemy import select, func, and_
+from fastapi import APIRouter, status, Query
+from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 
 from app.api.deps import DB, CurrentUser, LeaderUser
-from app.models.checkout import Checkout
-from app.models.equipment import Equipment
-from app.schemas.checkout import CheckoutCreate, CheckoutReturn, CheckoutExtend, CheckoutResponse
+from app.api.idempotency import Idempotent, IdempotentRoute
+from app.core.database import retry_on_conflict
+from app.models.checkout import Checkout, OPEN_CHECKOUT_STATUSES
+from app.schemas.checkout import (
+    CheckoutCreate,
+    CheckoutReturn,
+    CheckoutExtend,
+    CheckoutResponse,
+    CheckoutBatchCreate,
+    CheckoutBatchReturn,
+    CheckoutBatchItemResult,
+    CheckoutBatchResponse,
+)
 from app.schemas.common import PaginatedResponse
+from app.services.checkouts import (
+    get_checkout,
+    checkout_equipment,
+    return_equipment,
+    extend_return_date,
+    checkout_batch,
+    return_batch,
+    overdue,
+)
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
 
 
 @router.get("", response_model=PaginatedResponse[CheckoutResponse])
@@ -68,7 +87,7 @@ async def get_active_checkouts(
         selectinload(Checkout.equipment),
         selectinload(Checkout.user),
         selectinload(Checkout.location)
-    ).where(Checkout.status == "active")
+    ).where(Checkout.status.in_(OPEN_CHECKOUT_STATUSES))
 
     if user_id:
         query = query.where(Checkout.user_id == user_id)
@@ -87,8 +106,7 @@ async def get_overdue_checkouts(
     db: DB,
     current_user: LeaderUser,
 ):
-    """Get overdue checkouts"""
-    now = datetime.utcnow()
+    """Get overdue checkouts, longest overdue first"""
     result = await db.execute(
         select(Checkout)
         .options(
@@ -96,12 +114,7 @@ async def get_overdue_checkouts(
             selectinload(Checkout.user),
             selectinload(Checkout.location)
         )
-        .where(
-            and_(
-                Checkout.status == "active",
-                Checkout.expected_return_at < now
-            )
-        )
+        .where(overdue(datetime.utcnow()))
         .order_by(Checkout.expected_return_at)
     )
     checkouts = result.scalars().all()
@@ -109,64 +122,67 @@ async def get_overdue_checkouts(
     return [CheckoutResponse.model_validate(c) for c in checkouts]
 
 
-@router.post("", response_model=CheckoutResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "", response_model=CheckoutResponse, status_code=status.HTTP_201_CREATED,
+    dependencies=[Idempotent],
+)
 async def create_checkout(
     checkout_data: CheckoutCreate,
     db: DB,
     current_user: CurrentUser,
 ):
     """Checkout equipment"""
-    # Check equipment exists and is available
-    eq_result = await db.execute(
-        select(Equipment).where(Equipment.id == checkout_data.equipment_id)
-    )
-    equipment = eq_result.scalar_one_or_none()
+    async def attempt() -> Checkout:
+        checkout = await checkout_equipment(db, checkout_data, current_user)
+        await db.commit()
+        return checkout
 
-    if not equipment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Equipment not found"
-        )
+    checkout = await retry_on_conflict(db, attempt)
+    await db.refresh(checkout)
 
-    if equipment.status != "available":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Equipment is not available (status: {equipment.status})"
-        )
+    return CheckoutResponse.model_validate(checkout)
 
-    # Determine user
-    user_id = checkout_data.user_id or current_user.id
-
-    # Create checkout
-    checkout = Checkout(
-        equipment_id=checkout_data.equipment_id,
-        user_id=user_id,
-        location_id=checkout_data.location_id,
-        expected_return_at=checkout_data.expected_return_at,
-        checkout_condition=checkout_data.condition,
-        checkout_photo_url=checkout_data.photo_url,
-        checkout_notes=checkout_data.notes,
-        checkout_gps_lat=checkout_data.gps_lat,
-        checkout_gps_lng=checkout_data.gps_lng,
-        checked_out_by=current_user.id,
-        status="active"
-    )
 
-    db.add(checkout)
+def batch_response(items: List[CheckoutBatchItemResult]) -> CheckoutBatchResponse:
+    failed = sum(1 for item in items if item.status == "error")
+    return CheckoutBatchResponse(items=items, succeeded=len(items) - failed, failed=failed)
 
-    # Update equipment
-    equipment.status = "checked_out"
-    equipment.current_holder_id = user_id
-    if checkout_data.location_id:
-        equipment.current_location_id = checkout_data.location_id
 
-    await db.commit()
-    await db.refresh(checkout)
+@router.post("/batch", response_model=CheckoutBatchResponse, dependencies=[Idempotent])
+async def create_checkout_batch(
+    batch: CheckoutBatchCreate,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Check out many pieces by id or scanned tag in one transaction.
 
-    return CheckoutResponse.model_validate(checkout)
+    Each item gets its own result; items that cannot be checked out are
+    skipped without affecting the rest.
+    """
+    async def attempt() -> List[CheckoutBatchItemResult]:
+        items = await checkout_batch(db, batch, current_user)
+        await db.commit()
+        return items
+
+    return batch_response(await retry_on_conflict(db, attempt))
 
 
-@router.put("/{checkout_id}/return", response_model=CheckoutResponse)
+@router.post("/batch-return", response_model=CheckoutBatchResponse, dependencies=[Idempotent])
+async def return_checkout_batch(
+    batch: CheckoutBatchReturn,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Return many pieces by id or scanned tag in one transaction"""
+    async def attempt() -> List[CheckoutBatchItemResult]:
+        items = await return_batch(db, batch, current_user)
+        await db.commit()
+        return items
+
+    return batch_response(await retry_on_conflict(db, attempt))
+
+
+@router.put("/{checkout_id}/return", response_model=CheckoutResponse, dependencies=[Idempotent])
 async def return_checkout(
     checkout_id: UUID,
     return_data: CheckoutReturn,
@@ -174,51 +190,19 @@ async def return_checkout(
     current_user: CurrentUser,
 ):
     """Return checked out equipment"""
-    result = await db.execute(
-        select(Checkout)
-        .options(selectinload(Checkout.equipment))
-        .where(Checkout.id == checkout_id)
-    )
-    checkout = result.scalar_one_or_none()
-
-    if not checkout:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Checkout not found"
-        )
-
-    if checkout.status != "active":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Checkout is not active"
-        )
+    async def attempt() -> Checkout:
+        checkout = await get_checkout(db, checkout_id)
+        return_equipment(checkout, return_data, current_user)
+        await db.commit()
+        return checkout
 
-    # Update checkout
-    checkout.actual_return_at = datetime.utcnow()
-    checkout.return_condition = return_data.condition
-    checkout.return_photo_url = return_data.photo_url
-    checkout.return_notes = return_data.notes
-    checkout.return_gps_lat = return_data.gps_lat
-    checkout.return_gps_lng = return_data.gps_lng
-    checkout.checked_in_by = current_user.id
-    checkout.status = "returned"
-
-    # Update equipment
-    equipment = checkout.equipment
-    equipment.status = "available"
-    equipment.current_holder_id = None
-    if equipment.home_location_id:
-        equipment.current_location_id = equipment.home_location_id
-    if return_data.condition:
-        equipment.condition = return_data.condition
-
-    await db.commit()
+    checkout = await retry_on_conflict(db, attempt)
     await db.refresh(checkout)
 
     return CheckoutResponse.model_validate(checkout)
 
 
-@router.post("/{checkout_id}/extend", response_model=CheckoutResponse)
+@router.post("/{checkout_id}/extend", response_model=CheckoutResponse, dependencies=[Idempotent])
 async def extend_checkout(
     checkout_id: UUID,
     extend_data: CheckoutExtend,
@@ -226,26 +210,13 @@ async def extend_checkout(
     current_user: CurrentUser,
 ):
     """Extend checkout return date"""
-    result = await db.execute(
-        select(Checkout).where(Checkout.id == checkout_id)
-    )
-    checkout = result.scalar_one_or_none()
-
-    if not checkout:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Checkout not found"
-        )
-
-    if checkout.status != "active":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Checkout is not active"
-        )
-
-    checkout.expected_return_at = extend_data.expected_return_at
+    async def attempt() -> Checkout:
+        checkout = await get_checkout(db, checkout_id)
+        extend_return_date(checkout, extend_data)
+        await db.commit()
+        return checkout
 
-    await db.commit()
+    checkout = await retry_on_conflict(db, attempt)
     await db.refresh(checkout)
 
     return CheckoutResponse.model_validate(checkout)
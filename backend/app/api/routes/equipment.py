@@ -1,11 +1,13 @@
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Query, UploadFile, File, BackgroundTasks
 from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 
 from app.api.deps import DB, CurrentUser, ManagerUser, AdminUser
+from app.api.idempotency import Idempotent, IdempotentRoute
+from app.core.config import settings
 from app.core.permissions import Permission
 from app.models.equipment import Equipment, EquipmentPhoto, EquipmentTag, Category, Location
 from app.models.user import User
@@ -15,12 +17,16 @@ from app.schemas.equipment import (
     EquipmentResponse,
     EquipmentListResponse,
     EquipmentPhotoResponse,
+    EquipmentPhotoByHash,
     EquipmentTagResponse,
     EquipmentAccessory,
 )
 from app.schemas.common import PaginatedResponse
+from app.schemas.upload import PresignedUrlResponse
+from app.services.photos import save_equipment_photo, attach_equipment_photo, delete_photo_files
+from app.services.storage import spool_upload, key_from_url, presigned_url_for
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
 
 
 @router.get("", response_model=PaginatedResponse[EquipmentListResponse])
@@ -37,8 +43,13 @@ async def list_equipment(
     holder_id: Optional[UUID] = None,
     requires_calibration: Optional[bool] = None,
     calibration_status: Optional[str] = None,
+    include_descendants: bool = False,
 ):
-    """List equipment with pagination and filters"""
+    """List equipment with pagination and filters.
+
+    include_descendants widens category_id and location_id to everything
+    below the given node.
+    """
     query = select(Equipment).options(
         selectinload(Equipment.category),
         selectinload(Equipment.current_location),
@@ -52,13 +63,17 @@ async def list_equipment(
             (Equipment.internal_code.ilike(f"%{search}%")) |
             (Equipment.serial_number.ilike(f"%{search}%"))
         )
-    if category_id:
+    if category_id and include_descendants:
+        query = query.where(Equipment.category_id.in_(Category.subtree_ids(category_id)))
+    elif category_id:
         query = query.where(Equipment.category_id == category_id)
     if status:
         query = query.where(Equipment.status == status)
     if condition:
         query = query.where(Equipment.condition == condition)
-    if location_id:
+    if location_id and include_descendants:
+        query = query.where(Equipment.current_location_id.in_(Location.subtree_ids(location_id)))
+    elif location_id:
         query = query.where(Equipment.current_location_id == location_id)
     if holder_id:
         query = query.where(Equipment.current_holder_id == holder_id)
@@ -319,35 +334,96 @@ async def get_equipment_photos(
     return [EquipmentPhotoResponse.model_validate(p) for p in photos]
 
 
-@router.post("/{equipment_id}/photos", response_model=EquipmentPhotoResponse)
+@router.post("/{equipment_id}/photos", response_model=EquipmentPhotoResponse, dependencies=[Idempotent])
 async def upload_equipment_photo(
     equipment_id: UUID,
     photo_type: str,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     description: Optional[str] = None,
     db: DB = None,
     current_user: CurrentUser = None,
 ):
     """Upload equipment photo"""
-    # TODO: Implement file upload to MinIO/S3
-    # For now, return placeholder
-
-    photo = EquipmentPhoto(
-        equipment_id=equipment_id,
-        photo_type=photo_type,
-        file_url=f"/uploads/{equipment_id}/{file.filename}",
-        description=description,
-        uploaded_by=current_user.id,
-        is_synced=True
+    result = await db.execute(
+        select(Equipment.id).where(Equipment.id == equipment_id)
+    )
+    if not result.scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Equipment not found"
+        )
+
+    upload = await spool_upload(file, settings.ALLOWED_IMAGE_TYPES)
+    photo = await save_equipment_photo(
+        db, equipment_id, upload, photo_type, description, current_user.id, background_tasks
+    )
+
+    return EquipmentPhotoResponse.model_validate(photo)
+
+
+@router.post(
+    "/{equipment_id}/photos/by-hash", response_model=EquipmentPhotoResponse,
+    dependencies=[Idempotent],
+)
+async def attach_equipment_photo_by_hash(
+    equipment_id: UUID,
+    photo_data: EquipmentPhotoByHash,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Add a photo whose bytes are already stored, identified by SHA-256"""
+    result = await db.execute(
+        select(Equipment.id).where(Equipment.id == equipment_id)
     )
+    if not result.scalar_one_or_none():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Equipment not found"
+        )
 
-    db.add(photo)
+    photo = await attach_equipment_photo(
+        db, equipment_id, photo_data.sha256, photo_data.photo_type,
+        photo_data.description, current_user.id
+    )
+    if not photo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No stored file with this hash, upload the photo"
+        )
     await db.commit()
     await db.refresh(photo)
 
     return EquipmentPhotoResponse.model_validate(photo)
 
 
+@router.get("/{equipment_id}/photos/{photo_id}/url", response_model=PresignedUrlResponse)
+async def get_equipment_photo_download_url(
+    equipment_id: UUID,
+    photo_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Get a short-lived download URL for the original photo"""
+    result = await db.execute(
+        select(EquipmentPhoto.file_url)
+        .where(
+            EquipmentPhoto.id == photo_id,
+            EquipmentPhoto.equipment_id == equipment_id
+        )
+    )
+    key = key_from_url(result.scalar_one_or_none())
+
+    if not key:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Photo not found"
+        )
+
+    url, expires_at = presigned_url_for("GET", key)
+    return PresignedUrlResponse(url=url, expires_at=expires_at)
+
+
 @router.delete("/{equipment_id}/photos/{photo_id}")
 async def delete_equipment_photo(
     equipment_id: UUID,
@@ -373,6 +449,7 @@ async def delete_equipment_photo(
 
     await db.delete(photo)
     await db.commit()
+    await delete_photo_files(db, photo)
 
     return {"message": "Photo deleted successfully"}
 
@@ -0,0 +1,87 @@
+import json
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, status, Header, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.core.database import async_session_factory
+from app.core.security import verify_access_token
+from app.models.user import User
+from app.services import push
+
+router = APIRouter()
+
+# Streams stay open for a long time, so they authenticate with a short
+# session of their own instead of holding the request's DB session.
+# EventSource and browser WebSockets cannot set headers, hence ?token=.
+
+
+async def authenticate(authorization: Optional[str], token: Optional[str]) -> Optional[UUID]:
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    user_id = verify_access_token(token) if token else None
+    if not user_id:
+        return None
+    async with async_session_factory() as db:
+        user = (await db.execute(
+            select(User).where(User.id == UUID(user_id))
+        )).scalar_one_or_none()
+    return user.id if user and user.is_active else None
+
+
+@router.get("/stream")
+async def event_stream(
+    authorization: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+    token: Optional[str] = Query(None),
+):
+    """Server-sent events for the current user"""
+    user_id = await authenticate(authorization, token)
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    async def generate():
+        yield "retry: 5000\n\n"
+        async for event in push.user_events(user_id, last_event_id):
+            if event is None:
+                yield ": heartbeat\n\n"
+            else:
+                yield f"id: {event.id}\nevent: {event.type}\ndata: {event.payload()}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def event_socket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    last_event_id: Optional[str] = Query(None),
+):
+    """WebSocket carrying the same events as /events/stream"""
+    user_id = await authenticate(websocket.headers.get("authorization"), token)
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    try:
+        async for event in push.user_events(user_id, last_event_id):
+            if event is None:
+                await websocket.send_json({"type": "heartbeat"})
+            else:
+                await websocket.send_text(json.dumps(
+                    {"id": event.id, "type": event.type, "data": event.data}, default=str
+                ))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,122 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, status, Query
+from sqlalchemy import select, func
+
+from app.api.deps import DB, CurrentUser, AdminUser, get_user_role
+from app.core.permissions import Role
+from app.models.job import BackgroundJob
+from app.schemas.common import PaginatedResponse
+from app.schemas.job import JobCreate, JobResponse
+from app.services import jobs
+
+router = APIRouter()
+
+
+@router.get("", response_model=PaginatedResponse[JobResponse])
+async def list_jobs(
+    db: DB,
+    current_user: AdminUser,
+    page: int = Query(1, ge=1),
+    size: int = Query(20, ge=1, le=100),
+    name: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status", pattern="^(queued|running|succeeded|failed)$"),
+):
+    """List background jobs, newest first"""
+    query = select(BackgroundJob)
+    if name:
+        query = query.where(BackgroundJob.name == name)
+    if status_filter:
+        query = query.where(BackgroundJob.status == status_filter)
+
+    count_query = select(func.count()).select_from(query.subquery())
+    total = (await db.execute(count_query)).scalar() or 0
+
+    query = query.order_by(BackgroundJob.created_at.desc()).offset((page - 1) * size).limit(size)
+    result = await db.execute(query)
+
+    return PaginatedResponse(
+        items=[JobResponse.model_validate(job) for job in result.scalars().all()],
+        total=total,
+        page=page,
+        size=size,
+        pages=(total + size - 1) // size
+    )
+
+
+@router.get("/tasks")
+async def list_tasks(
+    current_user: AdminUser,
+):
+    """Registered job names with their schedule interval in seconds"""
+    return [
+        {"name": name, "interval_seconds": interval}
+        for name, interval in jobs.registered().items()
+    ]
+
+
+@router.post("", response_model=JobResponse, status_code=status.HTTP_201_CREATED)
+async def create_job(
+    data: JobCreate,
+    db: DB,
+    current_user: AdminUser,
+):
+    """Queue a job, e.g. to run a periodic task ahead of its schedule"""
+    try:
+        job_id = await jobs.enqueue(
+            db, data.name, data.payload, delay_seconds=data.delay_seconds, created_by=current_user.id
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    await db.commit()
+    return await db.get(BackgroundJob, job_id)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Get a job's status; users see the jobs they started"""
+    job = await db.get(BackgroundJob, job_id)
+    is_admin = get_user_role(current_user) in (Role.ADMIN, Role.SUPERADMIN)
+    if not job or (job.created_by != current_user.id and not is_admin):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.post("/{job_id}/retry", response_model=JobResponse)
+async def retry_job(
+    job_id: UUID,
+    db: DB,
+    current_user: AdminUser,
+):
+    """Queue a failed job again with a fresh set of attempts"""
+    job = await db.get(BackgroundJob, job_id, with_for_update=True)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    if job.status != "failed":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Job is {job.status}"
+        )
+
+    job.status = "queued"
+    job.attempts = 0
+    job.run_at = datetime.utcnow()
+    job.finished_at = None
+    await db.commit()
+    await db.refresh(job)
+    return job
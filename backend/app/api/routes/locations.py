@@ -2,6 +2,7 @@ from typing import List, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, status, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
@@ -9,6 +10,7 @@ from app.api.deps import DB, CurrentUser, ManagerUser, AdminUser
 from app.models.equipment import Location, Equipment
 from app.schemas.location import LocationCreate, LocationUpdate, LocationResponse, LocationTree
 from app.schemas.equipment import EquipmentListResponse
+from app.services import trees
 
 router = APIRouter()
 
@@ -42,39 +44,16 @@ async def list_locations(
 async def get_location_tree(
     db: DB,
     current_user: CurrentUser,
+    max_depth: Optional[int] = Query(None, ge=1),
+    with_counts: bool = False,
 ):
-    """Get location tree structure"""
-    result = await db.execute(
-        select(Location)
-        .where(Location.parent_location_id.is_(None))
-        .order_by(Location.name)
-    )
-    root_locations = result.scalars().all()
-
-    async def build_tree(location: Location) -> LocationTree:
-        children_result = await db.execute(
-            select(Location)
-            .where(Location.parent_location_id == location.id)
-            .order_by(Location.name)
-        )
-        children = children_result.scalars().all()
-
-        return LocationTree(
-            id=location.id,
-            name=location.name,
-            type=location.type,
-            code=location.code,
-            address=location.address,
-            gps_lat=location.gps_lat,
-            gps_lng=location.gps_lng,
-            parent_location_id=location.parent_location_id,
-            responsible_user_id=location.responsible_user_id,
-            is_active=location.is_active,
-            created_at=location.created_at,
-            children=[await build_tree(c) for c in children]
-        )
+    """Get location tree structure, optionally cut off below max_depth levels.
 
-    return [await build_tree(loc) for loc in root_locations]
+    with_counts adds equipment_count, which includes all locations below.
+    """
+    forest = await trees.location_forest(db)
+    counts = await trees.location_equipment_counts(db) if with_counts else None
+    return JSONResponse(forest.roots(max_depth, counts))
 
 
 @router.post("", response_model=LocationResponse, status_code=status.HTTP_201_CREATED)
@@ -88,6 +67,7 @@ async def create_location(
     db.add(location)
     await db.commit()
     await db.refresh(location)
+    trees.invalidate("locations")
 
     return LocationResponse.model_validate(location)
 
@@ -113,6 +93,25 @@ async def get_location(
     return LocationResponse.model_validate(location)
 
 
+@router.get("/{location_id}/tree", response_model=LocationTree)
+async def get_location_subtree(
+    location_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+    max_depth: Optional[int] = Query(None, ge=1),
+    with_counts: bool = False,
+):
+    """Get a location with the locations below it"""
+    forest = await trees.location_forest(db)
+    if str(location_id) not in forest.nodes:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Location not found"
+        )
+    counts = await trees.location_equipment_counts(db) if with_counts else None
+    return JSONResponse(forest.tree(str(location_id), max_depth, counts))
+
+
 @router.put("/{location_id}", response_model=LocationResponse)
 @router.patch("/{location_id}", response_model=LocationResponse)
 async def update_location(
@@ -134,11 +133,20 @@ async def update_location(
         )
 
     update_data = location_data.model_dump(exclude_unset=True)
+    parent_id = update_data.get("parent_location_id")
+    if parent_id:
+        parent = await db.get(Location, parent_id)
+        if parent and f"/{location_id}/" in parent.path:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="A location cannot be moved below itself"
+            )
     for field, value in update_data.items():
         setattr(location, field, value)
 
     await db.commit()
     await db.refresh(location)
+    trees.invalidate("locations")
 
     return LocationResponse.model_validate(location)
 
@@ -164,6 +172,7 @@ async def delete_location(
     # Soft delete - just deactivate
     location.is_active = False
     await db.commit()
+    trees.invalidate("locations")
 
     return {"message": "Location deactivated successfully"}
 
@@ -173,15 +182,20 @@ async def get_location_equipment(
     location_id: UUID,
     db: DB,
     current_user: CurrentUser,
+    include_descendants: bool = False,
 ):
-    """Get equipment at location"""
+    """Get equipment at location, or with include_descendants anywhere below it too"""
+    if include_descendants:
+        location_filter = Equipment.current_location_id.in_(Location.subtree_ids(location_id))
+    else:
+        location_filter = Equipment.current_location_id == location_id
     result = await db.execute(
         select(Equipment)
         .options(
             selectinload(Equipment.category),
             selectinload(Equipment.current_holder)
         )
-        .where(Equipment.current_location_id == location_id)
+        .where(location_filter)
         .order_by(Equipment.name)
     )
     equipment = result.scalars().all()
@@ -3,11 +3,11 @@ from typing import List
 from uuid import UUID
 
 from fastapi import APIRouter, HTTPException, status, Query
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, delete
 
 from app.api.deps import DB, CurrentUser
 from app.models.notification import Notification
-from app.schemas.notification import NotificationResponse
+from app.schemas.notification import NotificationResponse, NotificationBulkAction
 from app.schemas.common import PaginatedResponse
 
 router = APIRouter()
@@ -21,7 +21,11 @@ async def list_notifications(
     size: int = Query(20, ge=1, le=100),
     unread_only: bool = False,
 ):
-    """Get user's notifications"""
+    """Get user's notifications.
+
+    Lists every row users.unread_notifications counts: months past
+    retention disappear from both when partitions.maintain detaches them.
+    """
     query = select(Notification).where(Notification.user_id == current_user.id)
 
     if unread_only:
@@ -47,20 +51,10 @@ async def list_notifications(
 
 @router.get("/unread-count")
 async def get_unread_count(
-    db: DB,
     current_user: CurrentUser,
 ):
     """Get unread notification count"""
-    result = await db.execute(
-        select(func.count())
-        .where(
-            Notification.user_id == current_user.id,
-            Notification.is_read == False
-        )
-    )
-    count = result.scalar() or 0
-
-    return {"unread_count": count}
+    return {"unread_count": current_user.unread_notifications}
 
 
 @router.put("/{notification_id}/read")
@@ -99,21 +93,57 @@ async def mark_all_as_read(
 ):
     """Mark all notifications as read"""
     result = await db.execute(
-        select(Notification).where(
+        update(Notification)
+        .where(
             Notification.user_id == current_user.id,
             Notification.is_read == False
         )
+        .values(is_read=True, read_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
     )
-    notifications = result.scalars().all()
+    await db.commit()
+
+    return {"message": f"{result.rowcount} notifications marked as read"}
 
-    now = datetime.utcnow()
-    for notification in notifications:
-        notification.is_read = True
-        notification.read_at = now
 
+@router.post("/bulk")
+async def bulk_notifications(
+    data: NotificationBulkAction,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Mark read or delete notifications matching ids, type or a date range"""
+    filters = []
+    if data.ids is not None:
+        filters.append(Notification.id.in_(data.ids))
+    if data.type:
+        filters.append(Notification.type == data.type)
+    if data.created_from:
+        filters.append(Notification.created_at >= data.created_from)
+    if data.created_to:
+        filters.append(Notification.created_at < data.created_to)
+    if not filters:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Specify ids, type or a date range"
+        )
+
+    if data.action == "read":
+        statement = (
+            update(Notification)
+            .where(Notification.is_read == False)
+            .values(is_read=True, read_at=datetime.utcnow())
+        )
+    else:
+        statement = delete(Notification)
+    result = await db.execute(
+        statement
+        .where(Notification.user_id == current_user.id, *filters)
+        .execution_options(synchronize_session=False)
+    )
     await db.commit()
 
-    return {"message": f"{len(notifications)} notifications marked as read"}
+    return {"action": data.action, "count": result.rowcount}
 
 
 @router.delete("/{notification_id}")
@@ -3,7 +3,7 @@ from datetime import datetime, timedelta, date
 from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Form, BackgroundTasks
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
@@ -16,6 +16,7 @@ from app.schemas.onboarding import (
     OnboardingSession,
     OnboardingScan,
     OnboardingScanResponse,
+    OnboardingPhotoByHash,
     OnboardingPhotoResponse,
     OnboardingDetails,
     OnboardingAccessory,
@@ -23,6 +24,9 @@ from app.schemas.onboarding import (
     OnboardingComplete,
     OnboardingCompleteResponse,
 )
+from app.services.calibrations import calibration_status
+from app.services.photos import save_onboarding_photo, attach_onboarding_photo, refresh_onboarding_photos
+from app.services.storage import spool_upload
 
 router = APIRouter()
 
@@ -124,6 +128,7 @@ async def scan_tag(
 @router.post("/{session_id}/photos", response_model=OnboardingPhotoResponse)
 async def upload_photo(
     session_id: UUID,
+    background_tasks: BackgroundTasks,
     photo_type: str = Form(...),
     description: Optional[str] = Form(None),
     file: UploadFile = File(...),
@@ -138,23 +143,46 @@ async def upload_photo(
             detail="Session not found or expired"
         )
 
-    # TODO: Upload to MinIO/S3
-    photo_id = uuid_module.uuid4()
-    file_url = f"/uploads/onboarding/{session_id}/{photo_id}_{file.filename}"
-    thumbnail_url = f"/uploads/onboarding/{session_id}/thumb_{photo_id}_{file.filename}"
+    upload = await spool_upload(file, settings.ALLOWED_IMAGE_TYPES)
+    photo = await save_onboarding_photo(
+        db, session, upload, photo_type, description, background_tasks
+    )
+
+    return OnboardingPhotoResponse(
+        photo_id=UUID(photo["id"]),
+        url=photo["file_url"],
+        thumbnail_url=photo["thumbnail_url"]
+    )
 
-    session["photos"].append({
-        "id": str(photo_id),
-        "photo_type": photo_type,
-        "file_url": file_url,
-        "thumbnail_url": thumbnail_url,
-        "description": description
-    })
+
+@router.post("/{session_id}/photos/by-hash", response_model=OnboardingPhotoResponse)
+async def attach_photo_by_hash(
+    session_id: UUID,
+    photo_data: OnboardingPhotoByHash,
+    db: DB,
+    current_user: ManagerUser,
+):
+    """Step 2: Add a photo whose bytes are already stored, identified by SHA-256"""
+    session = onboarding_sessions.get(str(session_id))
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found or expired"
+        )
+
+    photo = await attach_onboarding_photo(
+        db, session, photo_data.sha256, photo_data.photo_type, photo_data.description
+    )
+    if not photo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No stored file with this hash, upload the photo"
+        )
 
     return OnboardingPhotoResponse(
-        photo_id=photo_id,
-        url=file_url,
-        thumbnail_url=thumbnail_url
+        photo_id=UUID(photo["id"]),
+        url=photo["file_url"],
+        thumbnail_url=photo["thumbnail_url"]
     )
 
 
@@ -338,9 +366,9 @@ async def complete_onboarding(
         equipment.last_calibration_date = date.fromisoformat(cal["calibration_date"])
         equipment.next_calibration_date = date.fromisoformat(cal["valid_until"])
 
-        today = date.today()
-        days_until = (equipment.next_calibration_date - today).days
-        equipment.calibration_status = "expired" if days_until < 0 else ("expiring" if days_until <= 30 else "valid")
+        equipment.calibration_status = calibration_status(
+            equipment.requires_calibration, equipment.next_calibration_date
+        )
 
     db.add(equipment)
     await db.flush()
@@ -356,14 +384,20 @@ async def complete_onboarding(
             tag.equipment_id = equipment.id
             tag.applied_at = datetime.utcnow()
 
-    # Create photos
+    # Create photos; the session's blob references pass to the new rows
+    await refresh_onboarding_photos(db, session.get("photos", []))
     for photo_data in session.get("photos", []):
         photo = EquipmentPhoto(
             equipment_id=equipment.id,
             photo_type=photo_data["photo_type"],
+            blob_sha256=photo_data.get("blob_sha256"),
             file_url=photo_data["file_url"],
             thumbnail_url=photo_data.get("thumbnail_url"),
+            file_size_bytes=photo_data.get("file_size_bytes"),
+            width=photo_data.get("width"),
+            height=photo_data.get("height"),
             description=photo_data.get("description"),
+            uploaded_at=datetime.utcnow(),
             uploaded_by=current_user.id,
             is_synced=True
         )
@@ -1,4 +1,4 @@
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from typing import Optional
 from uuid import UUID
 
@@ -7,9 +7,10 @@ from sqlalchemy import select, func, and_
 
 from app.api.deps import DB, CurrentUser, LeaderUser, ManagerUser
 from app.models.equipment import Equipment, Category
-from app.models.checkout import Checkout
+from app.models.checkout import Checkout, OPEN_CHECKOUT_STATUSES
 from app.models.maintenance import MaintenanceRecord
 from app.models.user import User
+from app.services.checkouts import overdue as overdue_checkouts
 
 router = APIRouter()
 
@@ -85,20 +86,15 @@ async def get_checkout_stats(
     )
     total_checkouts = total_result.scalar() or 0
 
-    # Active checkouts
+    # Active checkouts, including overdue ones
     active_result = await db.execute(
-        select(func.count()).where(Checkout.status == "active")
+        select(func.count()).where(Checkout.status.in_(OPEN_CHECKOUT_STATUSES))
     )
     active = active_result.scalar() or 0
 
     # Overdue
     overdue_result = await db.execute(
-        select(func.count()).where(
-            and_(
-                Checkout.status == "active",
-                Checkout.expected_return_at < date.today()
-            )
-        )
+        select(func.count()).where(overdue_checkouts(datetime.utcnow()))
     )
     overdue = overdue_result.scalar() or 0
 
@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+import aiofiles
+from fastapi import APIRouter, HTTPException, status, Request, Response, Query
+from fastapi.responses import FileResponse
+
+from app.core.config import settings
+from app.services.storage import LocalStorage, get_storage, verify_local_signature
+
+router = APIRouter()
+
+# Signed GET/PUT endpoints standing in for MinIO presigned URLs when files
+# are kept on the local filesystem. The signature is the only credential.
+
+
+def get_local_storage(method: str, key: str, expires: int, signature: str) -> LocalStorage:
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not found"
+        )
+    if not verify_local_signature(method, key, expires, signature):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired signature"
+        )
+    return storage
+
+
+@router.get("/{key:path}")
+async def download_object(
+    key: str,
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    """Download a stored file through a presigned URL"""
+    storage = get_local_storage("GET", key, expires, signature)
+    try:
+        path = storage.path_for(key)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return FileResponse(path)
+
+
+@router.put("/{key:path}", status_code=status.HTTP_200_OK)
+async def upload_object(
+    key: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    """Store the request body under key through a presigned URL"""
+    storage = get_local_storage("PUT", key, expires, signature)
+    try:
+        target = storage.path_for(key)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid key")
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".put_")
+    os.close(fd)
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds maximum size of {settings.MAX_UPLOAD_SIZE // (1024 * 1024)} MB"
+                    )
+                await out.write(chunk)
+        os.replace(path, target)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return Response(status_code=status.HTTP_200_OK)
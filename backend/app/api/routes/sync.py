@@ -0,0 +1,30 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from app.api.deps import DB, CurrentUser
+from app.schemas.sync import SyncPullResponse, SyncPushRequest, SyncPushResponse
+from app.services.sync import pull_changes, apply_operations, parse_token
+
+router = APIRouter()
+
+
+@router.get("/pull", response_model=SyncPullResponse)
+async def pull(
+    db: DB,
+    current_user: CurrentUser,
+    since: Optional[str] = Query(None, description="Token from the previous pull"),
+):
+    """Get equipment, tags, categories, locations, checkouts and transfers changed since a token"""
+    return await pull_changes(db, current_user, parse_token(since))
+
+
+@router.post("/push", response_model=SyncPushResponse)
+async def push(
+    push_data: SyncPushRequest,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Apply a batch of offline changes with conflict detection"""
+    results = await apply_operations(db, current_user, push_data.operations)
+    return SyncPushResponse(results=results)
@@ -2,12 +2,17 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, status, Query
-from sqlalchemy import select, func, and_, or_
-from sqlalchemy.orm import selectinload
-
-from app.api.deps import DB, CurrentUser, LeaderUser
-from app.models.transfer import TransferRequest, TransferOffer, Transfer
+from fastapi import APIRouter, HTTPException, status, Query, Response
+from sqlalchemy import select, func, update, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.api.deps import DB, CurrentUser, LeaderUser, get_user_role
+from app.api.idempotency import Idempotent, IdempotentRoute
+from app.api.pagination import DEFAULT_LIMIT, MAX_LIMIT, keyset, page
+from app.core.database import retry_on_conflict
+from app.core.permissions import Permission, has_permission
+from app.models.transfer import TransferRequest, TransferOffer, Transfer, TransferMatch
 from app.models.equipment import Equipment
 from app.schemas.transfer import (
     TransferRequestCreate,
@@ -18,13 +23,21 @@ from app.schemas.transfer import (
     TransferConfirmation,
     TransferApproval,
     TransferResponse,
+    MatchedTransferRequestResponse,
+    TransferMatchResponse,
 )
+from app.services.notifications import NotificationEvent, enqueue_notify
+from app.services.transfer_expiry import ensure_not_expired
+from app.services.transfer_matching import enqueue_match
 
-router = APIRouter()
+router = APIRouter(route_class=IdempotentRoute)
 
 
 # Requests
-@router.post("/requests", response_model=TransferRequestResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/requests", response_model=TransferRequestResponse, status_code=status.HTTP_201_CREATED,
+    dependencies=[Idempotent],
+)
 async def create_transfer_request(
     request_data: TransferRequestCreate,
     db: DB,
@@ -109,6 +122,18 @@ async def create_transfer_request(
     )
 
     db.add(transfer_request)
+    await db.flush()
+    if transfer_request.request_type == "broadcast":
+        await enqueue_match(db, transfer_request)
+    if transfer_request.status == "pending" and request_data.request_type == "direct" and equipment:
+        await enqueue_notify(db, [NotificationEvent(
+            type="transfer_request",
+            title=f"{current_user.full_name} requests {equipment.name}",
+            message=request_data.message,
+            recipients=[equipment.current_holder_id],
+            entity_type="transfer_request",
+            entity_id=transfer_request.id,
+        )])
     await db.commit()
     await db.refresh(transfer_request)
 
@@ -134,9 +159,12 @@ async def create_transfer_request(
 async def get_sent_requests(
     db: DB,
     current_user: CurrentUser,
+    response: Response,
     status: Optional[str] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
 ):
-    """Get requests sent by current user"""
+    """Get requests sent by current user, newest first; X-Next-Cursor points to the next page"""
     query = select(TransferRequest).options(
         selectinload(TransferRequest.equipment),
         selectinload(TransferRequest.category),
@@ -148,9 +176,8 @@ async def get_sent_requests(
     if status:
         query = query.where(TransferRequest.status == status)
 
-    query = query.order_by(TransferRequest.created_at.desc())
-    result = await db.execute(query)
-    requests = result.scalars().all()
+    result = await db.execute(keyset(query, TransferRequest, cursor, limit))
+    requests = page(result.scalars().all(), limit, response)
 
     return [TransferRequestResponse.model_validate(r) for r in requests]
 
@@ -159,32 +186,28 @@ async def get_sent_requests(
 async def get_received_requests(
     db: DB,
     current_user: CurrentUser,
+    response: Response,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
 ):
     """Get requests received by current user (as equipment holder)"""
-    # Get equipment IDs held by current user
-    eq_result = await db.execute(
-        select(Equipment.id).where(Equipment.current_holder_id == current_user.id)
-    )
-    equipment_ids = [row[0] for row in eq_result.fetchall()]
-
-    if not equipment_ids:
-        return []
-
     query = select(TransferRequest).options(
         selectinload(TransferRequest.equipment),
         selectinload(TransferRequest.category),
         selectinload(TransferRequest.requester),
         selectinload(TransferRequest.holder),
         selectinload(TransferRequest.offers)
+    ).join(
+        Equipment, Equipment.id == TransferRequest.equipment_id
     ).where(
         and_(
-            TransferRequest.equipment_id.in_(equipment_ids),
+            Equipment.current_holder_id == current_user.id,
             TransferRequest.status == "pending"
         )
-    ).order_by(TransferRequest.created_at.desc())
+    )
 
-    result = await db.execute(query)
-    requests = result.scalars().all()
+    result = await db.execute(keyset(query, TransferRequest, cursor, limit))
+    requests = page(result.scalars().all(), limit, response)
 
     return [TransferRequestResponse.model_validate(r) for r in requests]
 
@@ -193,6 +216,9 @@ async def get_received_requests(
 async def get_available_requests(
     db: DB,
     current_user: CurrentUser,
+    response: Response,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
 ):
     """Get broadcast requests where current user can offer"""
     query = select(TransferRequest).options(
@@ -206,27 +232,58 @@ async def get_available_requests(
             TransferRequest.status == "pending",
             TransferRequest.requester_id != current_user.id
         )
-    ).order_by(TransferRequest.created_at.desc())
+    )
 
-    result = await db.execute(query)
-    requests = result.scalars().all()
+    result = await db.execute(keyset(query, TransferRequest, cursor, limit))
+    requests = page(result.scalars().all(), limit, response)
 
     return [TransferRequestResponse.model_validate(r) for r in requests]
 
 
-@router.post("/requests/{request_id}/respond")
-async def respond_to_request(
-    request_id: UUID,
-    response_data: TransferRequestRespond,
+@router.get("/requests/matching", response_model=List[MatchedTransferRequestResponse])
+async def get_matching_requests(
     db: DB,
     current_user: CurrentUser,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
 ):
-    """Accept or reject a transfer request"""
+    """Get pending broadcast requests the current user holds matching equipment for, nearest first"""
     result = await db.execute(
-        select(TransferRequest)
-        .options(selectinload(TransferRequest.equipment))
-        .where(TransferRequest.id == request_id)
+        select(TransferRequest, TransferMatch.equipment_count, TransferMatch.distance_km)
+        .options(
+            selectinload(TransferRequest.category),
+            selectinload(TransferRequest.requester),
+            selectinload(TransferRequest.location),
+            selectinload(TransferRequest.offers)
+        )
+        .join(TransferMatch, TransferMatch.request_id == TransferRequest.id)
+        .where(
+            and_(
+                TransferMatch.user_id == current_user.id,
+                TransferRequest.status == "pending"
+            )
+        )
+        .order_by(TransferMatch.distance_km.asc().nulls_last(), TransferRequest.created_at.desc())
+        .limit(limit)
     )
+
+    return [
+        MatchedTransferRequestResponse(
+            **TransferRequestResponse.model_validate(r).model_dump(),
+            equipment_count=equipment_count,
+            distance_km=distance_km,
+        )
+        for r, equipment_count, distance_km in result.all()
+    ]
+
+
+@router.get("/requests/{request_id}/matches", response_model=List[TransferMatchResponse])
+async def get_request_matches(
+    request_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Get the users who could fulfil a broadcast request, nearest first"""
+    result = await db.execute(select(TransferRequest).where(TransferRequest.id == request_id))
     transfer_request = result.scalar_one_or_none()
 
     if not transfer_request:
@@ -235,39 +292,92 @@ async def respond_to_request(
             detail="Request not found"
         )
 
-    if transfer_request.status != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Request is not pending (status: {transfer_request.status})"
-        )
-
-    # Verify current user is the holder
-    if transfer_request.equipment and transfer_request.equipment.current_holder_id != current_user.id:
+    if transfer_request.requester_id != current_user.id and not has_permission(
+        get_user_role(current_user), Permission.TRANSFERS_VIEW_TEAM
+    ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not the equipment holder"
+            detail="Not authorized to view matches for this request"
         )
 
-    if response_data.action == "accept":
-        transfer_request.status = "accepted"
-        transfer_request.responded_at = datetime.utcnow()
+    result = await db.execute(
+        select(TransferMatch)
+        .options(selectinload(TransferMatch.user))
+        .where(TransferMatch.request_id == request_id)
+        .order_by(TransferMatch.distance_km.asc().nulls_last(), TransferMatch.equipment_count.desc())
+    )
 
-        # Create transfer record
-        transfer = Transfer(
-            equipment_id=transfer_request.equipment_id,
-            request_id=transfer_request.id,
-            from_user_id=current_user.id,
-            to_user_id=transfer_request.requester_id,
-            transfer_type="peer"
+    return [TransferMatchResponse.model_validate(m) for m in result.scalars().all()]
+
+
+@router.post("/requests/{request_id}/respond", dependencies=[Idempotent])
+async def respond_to_request(
+    request_id: UUID,
+    response_data: TransferRequestRespond,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Accept or reject a transfer request"""
+    async def attempt():
+        result = await db.execute(
+            select(TransferRequest)
+            .options(selectinload(TransferRequest.equipment))
+            .where(TransferRequest.id == request_id)
+            .with_for_update()
         )
-        db.add(transfer)
+        transfer_request = result.scalar_one_or_none()
 
-    elif response_data.action == "reject":
-        transfer_request.status = "rejected"
-        transfer_request.responded_at = datetime.utcnow()
-        transfer_request.rejection_reason = response_data.rejection_reason
+        if not transfer_request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request not found"
+            )
 
-    await db.commit()
+        if transfer_request.status != "pending":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Request is not pending (status: {transfer_request.status})"
+            )
+        ensure_not_expired(transfer_request)
+
+        # Verify current user is the holder
+        if transfer_request.equipment and transfer_request.equipment.current_holder_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not the equipment holder"
+            )
+
+        if response_data.action == "accept":
+            transfer_request.status = "accepted"
+            transfer_request.responded_at = datetime.utcnow()
+
+            # Create transfer record
+            transfer = Transfer(
+                equipment_id=transfer_request.equipment_id,
+                request_id=transfer_request.id,
+                from_user_id=current_user.id,
+                to_user_id=transfer_request.requester_id,
+                transfer_type="peer"
+            )
+            db.add(transfer)
+
+        elif response_data.action == "reject":
+            transfer_request.status = "rejected"
+            transfer_request.responded_at = datetime.utcnow()
+            transfer_request.rejection_reason = response_data.rejection_reason
+
+        equipment_name = transfer_request.equipment.name if transfer_request.equipment else "equipment"
+        await enqueue_notify(db, [NotificationEvent(
+            type=f"transfer_request_{transfer_request.status}",
+            title=f"Your request for {equipment_name} was {transfer_request.status}",
+            message=transfer_request.rejection_reason,
+            recipients=[transfer_request.requester_id],
+            entity_type="transfer_request",
+            entity_id=transfer_request.id,
+        )])
+        await db.commit()
+
+    await retry_on_conflict(db, attempt)
 
     return {"message": f"Request {response_data.action}ed successfully"}
 
@@ -279,37 +389,40 @@ async def cancel_request(
     current_user: CurrentUser,
 ):
     """Cancel a transfer request"""
-    result = await db.execute(
-        select(TransferRequest).where(TransferRequest.id == request_id)
-    )
-    transfer_request = result.scalar_one_or_none()
-
-    if not transfer_request:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Request not found"
+    async def attempt():
+        result = await db.execute(
+            select(TransferRequest).where(TransferRequest.id == request_id).with_for_update()
         )
+        transfer_request = result.scalar_one_or_none()
 
-    if transfer_request.requester_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only cancel your own requests"
-        )
+        if not transfer_request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request not found"
+            )
 
-    if transfer_request.status not in ["pending", "requires_approval"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot cancel this request"
-        )
+        if transfer_request.requester_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You can only cancel your own requests"
+            )
 
-    transfer_request.status = "cancelled"
-    await db.commit()
+        if transfer_request.status not in ["pending", "requires_approval"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot cancel this request"
+            )
+
+        transfer_request.status = "cancelled"
+        await db.commit()
+
+    await retry_on_conflict(db, attempt)
 
     return {"message": "Request cancelled successfully"}
 
 
 # Offers
-@router.post("/requests/{request_id}/offer", response_model=TransferOfferResponse)
+@router.post("/requests/{request_id}/offer", response_model=TransferOfferResponse, dependencies=[Idempotent])
 async def create_offer(
     request_id: UUID,
     offer_data: TransferOfferCreate,
@@ -317,133 +430,184 @@ async def create_offer(
     current_user: CurrentUser,
 ):
     """Offer equipment for a broadcast request"""
-    # Check request exists and is broadcast
-    req_result = await db.execute(
-        select(TransferRequest).where(TransferRequest.id == request_id)
-    )
-    transfer_request = req_result.scalar_one_or_none()
-
-    if not transfer_request:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Request not found"
+    async def attempt():
+        # Check request exists and is broadcast; the share lock keeps it
+        # from being accepted or expired until the offer is in
+        req_result = await db.execute(
+            select(TransferRequest).where(TransferRequest.id == request_id).with_for_update(read=True)
         )
+        transfer_request = req_result.scalar_one_or_none()
 
-    if transfer_request.request_type != "broadcast":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Can only offer on broadcast requests"
-        )
+        if not transfer_request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request not found"
+            )
 
-    # Check equipment
-    eq_result = await db.execute(
-        select(Equipment).where(Equipment.id == offer_data.equipment_id)
-    )
-    equipment = eq_result.scalar_one_or_none()
+        if transfer_request.request_type != "broadcast":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Can only offer on broadcast requests"
+            )
 
-    if not equipment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Equipment not found"
-        )
+        if transfer_request.status != "pending":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Request is not pending (status: {transfer_request.status})"
+            )
+        ensure_not_expired(transfer_request)
 
-    if equipment.current_holder_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't hold this equipment"
+        # Check equipment
+        eq_result = await db.execute(
+            select(Equipment).where(Equipment.id == offer_data.equipment_id)
         )
+        equipment = eq_result.scalar_one_or_none()
 
-    offer = TransferOffer(
-        request_id=request_id,
-        offerer_id=current_user.id,
-        equipment_id=offer_data.equipment_id,
-        message=offer_data.message,
-        status="pending"
-    )
+        if not equipment:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Equipment not found"
+            )
 
-    db.add(offer)
-    await db.commit()
+        if equipment.current_holder_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't hold this equipment"
+            )
+
+        offer = TransferOffer(
+            request_id=request_id,
+            offerer_id=current_user.id,
+            equipment_id=offer_data.equipment_id,
+            message=offer_data.message,
+            status="pending"
+        )
+
+        db.add(offer)
+        await db.flush()
+        await enqueue_notify(db, [NotificationEvent(
+            type="transfer_offer",
+            title=f"{current_user.full_name} offers {equipment.name}",
+            message=offer_data.message,
+            recipients=[transfer_request.requester_id],
+            entity_type="transfer_offer",
+            entity_id=offer.id,
+        )])
+        await db.commit()
+        return offer
+
+    offer = await retry_on_conflict(db, attempt)
     await db.refresh(offer)
 
     return TransferOfferResponse.model_validate(offer)
 
 
-@router.post("/offers/{offer_id}/accept")
+@router.post("/offers/{offer_id}/accept", dependencies=[Idempotent])
 async def accept_offer(
     offer_id: UUID,
     db: DB,
     current_user: CurrentUser,
 ):
     """Accept an offer for your broadcast request"""
-    result = await db.execute(
-        select(TransferOffer)
-        .options(
-            selectinload(TransferOffer.request),
-            selectinload(TransferOffer.equipment)
+    async def attempt():
+        # Locks the offer and its request, so two offers cannot both be accepted
+        result = await db.execute(
+            select(TransferOffer)
+            .options(
+                joinedload(TransferOffer.request, innerjoin=True),
+                selectinload(TransferOffer.equipment)
+            )
+            .where(TransferOffer.id == offer_id)
+            .with_for_update()
         )
-        .where(TransferOffer.id == offer_id)
-    )
-    offer = result.scalar_one_or_none()
+        offer = result.scalar_one_or_none()
 
-    if not offer:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Offer not found"
-        )
+        if not offer:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Offer not found"
+            )
 
-    if offer.request.requester_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only accept offers on your requests"
-        )
+        if offer.request.requester_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You can only accept offers on your requests"
+            )
+
+        if offer.request.status != "pending" or offer.status != "pending":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Offer is no longer open"
+            )
+        ensure_not_expired(offer.request)
 
-    # Accept this offer
-    offer.status = "accepted"
+        # Accept this offer
+        offer.status = "accepted"
 
-    # Reject other offers
-    await db.execute(
-        select(TransferOffer)
-        .where(
-            and_(
-                TransferOffer.request_id == offer.request_id,
-                TransferOffer.id != offer_id
+        # Reject other offers
+        await db.execute(
+            update(TransferOffer)
+            .where(
+                and_(
+                    TransferOffer.request_id == offer.request_id,
+                    TransferOffer.id != offer_id
+                )
             )
+            .values(status="rejected")
+            .execution_options(synchronize_session=False)
         )
-    )
-    # Update status on other offers
-    other_offers_result = await db.execute(
-        select(TransferOffer).where(
-            and_(
-                TransferOffer.request_id == offer.request_id,
-                TransferOffer.id != offer_id
-            )
+
+        # Update request
+        offer.request.status = "accepted"
+        offer.request.equipment_id = offer.equipment_id
+        offer.request.holder_id = offer.offerer_id
+
+        # Create transfer
+        transfer = Transfer(
+            equipment_id=offer.equipment_id,
+            request_id=offer.request_id,
+            from_user_id=offer.offerer_id,
+            to_user_id=current_user.id,
+            transfer_type="peer"
         )
-    )
-    for other_offer in other_offers_result.scalars():
-        other_offer.status = "rejected"
-
-    # Update request
-    offer.request.status = "accepted"
-    offer.request.equipment_id = offer.equipment_id
-    offer.request.holder_id = offer.offerer_id
-
-    # Create transfer
-    transfer = Transfer(
-        equipment_id=offer.equipment_id,
-        request_id=offer.request_id,
-        from_user_id=offer.offerer_id,
-        to_user_id=current_user.id,
-        transfer_type="peer"
-    )
-    db.add(transfer)
+        db.add(transfer)
 
-    await db.commit()
+        await enqueue_notify(db, [NotificationEvent(
+            type="transfer_offer_accepted",
+            title=f"Your offer of {offer.equipment.name} was accepted",
+            recipients=[offer.offerer_id],
+            entity_type="transfer_offer",
+            entity_id=offer.id,
+        )])
+        await db.commit()
+
+    await retry_on_conflict(db, attempt)
 
     return {"message": "Offer accepted successfully"}
 
 
 # Transfer confirmations
-@router.post("/{transfer_id}/confirm-handover")
+async def _complete_transfer(db: AsyncSession, transfer: Transfer) -> None:
+    """Both sides confirmed: hand the equipment over and close the request.
+
+    The transfer row is locked by the caller, so of two confirmations
+    arriving together the second one sees the first and completes.
+    """
+    # Update equipment holder
+    transfer.equipment.current_holder_id = transfer.to_user_id
+
+    # Update request if exists
+    if transfer.request_id:
+        req_result = await db.execute(
+            select(TransferRequest).where(TransferRequest.id == transfer.request_id)
+        )
+        request = req_result.scalar_one_or_none()
+        if request:
+            request.status = "completed"
+            request.completed_at = datetime.utcnow()
+
+
+@router.post("/{transfer_id}/confirm-handover", dependencies=[Idempotent])
 async def confirm_handover(
     transfer_id: UUID,
     confirmation: TransferConfirmation,
@@ -451,37 +615,46 @@ async def confirm_handover(
     current_user: CurrentUser,
 ):
     """Confirm handover (from giver's side)"""
-    result = await db.execute(
-        select(Transfer).where(Transfer.id == transfer_id)
-    )
-    transfer = result.scalar_one_or_none()
-
-    if not transfer:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transfer not found"
+    async def attempt():
+        result = await db.execute(
+            select(Transfer)
+            .options(selectinload(Transfer.equipment))
+            .where(Transfer.id == transfer_id)
+            .with_for_update()
         )
+        transfer = result.scalar_one_or_none()
 
-    if transfer.from_user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not the giver in this transfer"
-        )
+        if not transfer:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Transfer not found"
+            )
 
-    transfer.from_confirmed_at = datetime.utcnow()
-    transfer.condition_at_transfer = confirmation.condition
-    transfer.photo_url = confirmation.photo_url
-    transfer.notes = confirmation.notes
-    if confirmation.gps_lat:
-        transfer.transfer_gps_lat = confirmation.gps_lat
-        transfer.transfer_gps_lng = confirmation.gps_lng
+        if transfer.from_user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not the giver in this transfer"
+            )
 
-    await db.commit()
+        transfer.from_confirmed_at = datetime.utcnow()
+        transfer.condition_at_transfer = confirmation.condition
+        transfer.photo_url = confirmation.photo_url
+        transfer.notes = confirmation.notes
+        if confirmation.gps_lat:
+            transfer.transfer_gps_lat = confirmation.gps_lat
+            transfer.transfer_gps_lng = confirmation.gps_lng
+
+        if transfer.to_confirmed_at:
+            await _complete_transfer(db, transfer)
+
+        await db.commit()
+
+    await retry_on_conflict(db, attempt)
 
     return {"message": "Handover confirmed"}
 
 
-@router.post("/{transfer_id}/confirm-receipt")
+@router.post("/{transfer_id}/confirm-receipt", dependencies=[Idempotent])
 async def confirm_receipt(
     transfer_id: UUID,
     confirmation: TransferConfirmation,
@@ -489,44 +662,35 @@ async def confirm_receipt(
     current_user: CurrentUser,
 ):
     """Confirm receipt (from receiver's side)"""
-    result = await db.execute(
-        select(Transfer)
-        .options(selectinload(Transfer.equipment))
-        .where(Transfer.id == transfer_id)
-    )
-    transfer = result.scalar_one_or_none()
-
-    if not transfer:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Transfer not found"
+    async def attempt():
+        result = await db.execute(
+            select(Transfer)
+            .options(selectinload(Transfer.equipment))
+            .where(Transfer.id == transfer_id)
+            .with_for_update()
         )
+        transfer = result.scalar_one_or_none()
 
-    if transfer.to_user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You are not the receiver in this transfer"
-        )
+        if not transfer:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Transfer not found"
+            )
 
-    transfer.to_confirmed_at = datetime.utcnow()
+        if transfer.to_user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You are not the receiver in this transfer"
+            )
 
-    # If both confirmed, complete the transfer
-    if transfer.from_confirmed_at and transfer.to_confirmed_at:
-        # Update equipment holder
-        equipment = transfer.equipment
-        equipment.current_holder_id = transfer.to_user_id
+        transfer.to_confirmed_at = datetime.utcnow()
 
-        # Update request if exists
-        if transfer.request_id:
-            req_result = await db.execute(
-                select(TransferRequest).where(TransferRequest.id == transfer.request_id)
-            )
-            request = req_result.scalar_one_or_none()
-            if request:
-                request.status = "completed"
-                request.completed_at = datetime.utcnow()
+        if transfer.from_confirmed_at:
+            await _complete_transfer(db, transfer)
 
-    await db.commit()
+        await db.commit()
+
+    await retry_on_conflict(db, attempt)
 
     return {"message": "Receipt confirmed"}
 
@@ -535,7 +699,10 @@ async def confirm_receipt(
 async def get_transfer_history(
     db: DB,
     current_user: CurrentUser,
+    response: Response,
     equipment_id: Optional[UUID] = None,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
 ):
     """Get transfer history"""
     query = select(Transfer).options(
@@ -553,9 +720,8 @@ async def get_transfer_history(
     if equipment_id:
         query = query.where(Transfer.equipment_id == equipment_id)
 
-    query = query.order_by(Transfer.created_at.desc())
-    result = await db.execute(query)
-    transfers = result.scalars().all()
+    result = await db.execute(keyset(query, Transfer, cursor, limit))
+    transfers = page(result.scalars().all(), limit, response)
 
     return [TransferResponse.model_validate(t) for t in transfers]
 
@@ -603,31 +769,35 @@ async def approve_request(
     current_user: LeaderUser,
 ):
     """Approve or reject a transfer request"""
-    result = await db.execute(
-        select(TransferRequest).where(TransferRequest.id == request_id)
-    )
-    transfer_request = result.scalar_one_or_none()
-
-    if not transfer_request:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Request not found"
+    async def attempt():
+        result = await db.execute(
+            select(TransferRequest).where(TransferRequest.id == request_id).with_for_update()
         )
+        transfer_request = result.scalar_one_or_none()
 
-    if transfer_request.status != "requires_approval":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Request does not require approval"
-        )
+        if not transfer_request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Request not found"
+            )
 
-    if approval.approved:
-        transfer_request.status = "pending"
-        transfer_request.approved_by = current_user.id
-        transfer_request.approved_at = datetime.utcnow()
-    else:
-        transfer_request.status = "rejected"
-        transfer_request.rejection_reason = approval.notes
+        if transfer_request.status != "requires_approval":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Request does not require approval"
+            )
+        ensure_not_expired(transfer_request)
 
-    await db.commit()
+        if approval.approved:
+            transfer_request.status = "pending"
+            transfer_request.approved_by = current_user.id
+            transfer_request.approved_at = datetime.utcnow()
+        else:
+            transfer_request.status = "rejected"
+            transfer_request.rejection_reason = approval.notes
+
+        await db.commit()
+
+    await retry_on_conflict(db, attempt)
 
     return {"message": "Request " + ("approved" if approval.approved else "rejected")}
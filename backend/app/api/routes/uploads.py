@@ -0,0 +1,488 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, status, Request, Response, Header, BackgroundTasks
+from sqlalchemy import select
+
+from app.api.deps import DB, CurrentUser, get_user_role
+from app.api.idempotency import Idempotent, IdempotentRoute
+from app.core.config import settings
+from app.core.permissions import Permission, has_permission
+from app.models.calibration import Calibration
+from app.models.equipment import Equipment
+from app.models.upload import UploadSession
+from app.schemas.equipment import EquipmentPhotoResponse
+from app.schemas.onboarding import OnboardingPhotoResponse
+from app.schemas.upload import UploadCreate, UploadSessionResponse, DirectUploadResponse
+from app.services.certificates import (
+    delete_previous_certificate,
+    replace_certificate,
+    store_certificate,
+    store_staged_certificate,
+)
+from app.services.photos import (
+    acquire_spooled,
+    acquire_staged,
+    attach_equipment_photo,
+    attach_onboarding_photo,
+    create_equipment_photo,
+    create_onboarding_photo,
+)
+from app.services.storage import get_storage, file_extension, presigned_url_for
+from app.services.uploads import (
+    append_chunk,
+    create_spool_file,
+    parse_checksum_header,
+    remove_spool_file,
+    session_expiry,
+    take_completed_file,
+)
+
+router = APIRouter(route_class=IdempotentRoute)
+
+# purpose -> (required permission, allowed content types)
+UPLOAD_PURPOSES = {
+    "equipment_photo": (Permission.EQUIPMENT_ADD_PHOTOS, settings.ALLOWED_IMAGE_TYPES),
+    "onboarding_photo": (Permission.EQUIPMENT_ONBOARD, settings.ALLOWED_IMAGE_TYPES),
+    "calibration_certificate": (
+        Permission.CALIBRATIONS_CREATE,
+        settings.ALLOWED_DOC_TYPES + settings.ALLOWED_IMAGE_TYPES,
+    ),
+}
+
+
+def upload_headers(upload: UploadSession) -> dict:
+    return {
+        "Upload-Offset": str(upload.received_size),
+        "Upload-Length": str(upload.total_size),
+        "Upload-Expires": upload.expires_at.isoformat() + "Z",
+        "Cache-Control": "no-store",
+    }
+
+
+def to_response(upload: UploadSession) -> UploadSessionResponse:
+    response = UploadSessionResponse.model_validate(upload)
+    response.max_chunk_size = settings.UPLOAD_MAX_CHUNK_SIZE
+    return response
+
+
+def equipment_photo_result(photo) -> dict:
+    return EquipmentPhotoResponse.model_validate(photo).model_dump(mode="json")
+
+
+def onboarding_photo_result(photo: dict) -> dict:
+    return OnboardingPhotoResponse(
+        photo_id=UUID(photo["id"]),
+        url=photo["file_url"],
+        thumbnail_url=photo["thumbnail_url"]
+    ).model_dump(mode="json")
+
+
+async def attach_existing_blob(db: DB, upload_data: UploadCreate, user_id: UUID) -> Optional[dict]:
+    """Complete a photo upload without any data transfer if its bytes are already stored"""
+    from app.api.routes.onboarding import onboarding_sessions
+
+    if not upload_data.checksum_sha256 or upload_data.purpose == "calibration_certificate":
+        return None
+
+    if upload_data.purpose == "equipment_photo":
+        photo = await attach_equipment_photo(
+            db, upload_data.target_id, upload_data.checksum_sha256, upload_data.photo_type,
+            upload_data.description, user_id
+        )
+        return equipment_photo_result(photo) if photo else None
+
+    photo = await attach_onboarding_photo(
+        db, onboarding_sessions[str(upload_data.target_id)], upload_data.checksum_sha256,
+        upload_data.photo_type, upload_data.description
+    )
+    return onboarding_photo_result(photo) if photo else None
+
+
+async def get_own_upload(db: DB, upload_id: UUID, user_id: UUID, lock: bool = False) -> UploadSession:
+    query = select(UploadSession).where(
+        UploadSession.id == upload_id,
+        UploadSession.user_id == user_id
+    )
+    if lock:
+        # Held until the caller commits
+        query = query.with_for_update()
+    result = await db.execute(query)
+    upload = result.scalar_one_or_none()
+
+    if not upload:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return upload
+
+
+async def check_target_exists(db: DB, purpose: str, target_id: UUID) -> None:
+    from app.api.routes.onboarding import onboarding_sessions
+
+    if purpose == "equipment_photo":
+        found = (await db.execute(select(Equipment.id).where(Equipment.id == target_id))).scalar_one_or_none()
+    elif purpose == "calibration_certificate":
+        found = (await db.execute(select(Calibration.id).where(Calibration.id == target_id))).scalar_one_or_none()
+    else:
+        found = onboarding_sessions.get(str(target_id))
+
+    if not found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload target not found"
+        )
+
+
+async def validate_upload(db: DB, upload_data: UploadCreate, current_user) -> None:
+    if upload_data.purpose not in UPLOAD_PURPOSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown upload purpose: {upload_data.purpose}"
+        )
+
+    permission, allowed_types = UPLOAD_PURPOSES[upload_data.purpose]
+    if not has_permission(get_user_role(current_user), permission):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Permission denied: {permission.value}"
+        )
+
+    if upload_data.content_type not in allowed_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported file type: {upload_data.content_type}"
+        )
+
+    if upload_data.total_size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds maximum size of {settings.MAX_UPLOAD_SIZE // (1024 * 1024)} MB"
+        )
+
+    if upload_data.purpose != "calibration_certificate" and not upload_data.photo_type:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="photo_type required for photo uploads"
+        )
+
+    await check_target_exists(db, upload_data.purpose, upload_data.target_id)
+
+
+def new_upload_session(upload_data: UploadCreate, user_id: UUID, result: Optional[dict]) -> UploadSession:
+    complete = result is not None
+    return UploadSession(
+        user_id=user_id,
+        purpose=upload_data.purpose,
+        target_id=upload_data.target_id,
+        attributes={
+            "photo_type": upload_data.photo_type,
+            "description": upload_data.description,
+        },
+        filename=upload_data.filename,
+        content_type=upload_data.content_type,
+        total_size=upload_data.total_size,
+        received_size=upload_data.total_size if complete else 0,
+        checksum_sha256=upload_data.checksum_sha256.lower() if upload_data.checksum_sha256 else None,
+        status="completed" if complete else "uploading",
+        result=result,
+        completed_at=datetime.utcnow() if complete else None,
+        expires_at=session_expiry(),
+    )
+
+
+@router.post(
+    "", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED,
+    dependencies=[Idempotent],
+)
+async def create_upload(
+    upload_data: UploadCreate,
+    response: Response,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Start a resumable upload for a photo or certificate.
+
+    A photo whose checksum_sha256 matches a stored file is attached
+    immediately and the session is returned with status "completed".
+    """
+    await validate_upload(db, upload_data, current_user)
+
+    # Identical bytes already stored: record the session as completed right away
+    result = await attach_existing_blob(db, upload_data, current_user.id)
+
+    upload = new_upload_session(upload_data, current_user.id, result)
+    db.add(upload)
+    await db.flush()
+    if result is None:
+        create_spool_file(upload.id)
+    await db.commit()
+    await db.refresh(upload)
+
+    response.headers.update(upload_headers(upload))
+    response.headers["Location"] = f"{settings.API_V1_PREFIX}/uploads/{upload.id}"
+    return to_response(upload)
+
+
+def to_direct_response(upload: UploadSession) -> DirectUploadResponse:
+    response = DirectUploadResponse.model_validate(upload)
+    if upload.status == "uploading":
+        response.upload_url, response.url_expires_at = presigned_url_for("PUT", upload.storage_key)
+        response.upload_headers = {"Content-Type": upload.content_type}
+    return response
+
+
+@router.post(
+    "/direct", response_model=DirectUploadResponse, status_code=status.HTTP_201_CREATED,
+    dependencies=[Idempotent],
+)
+async def create_direct_upload(
+    upload_data: UploadCreate,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Start an upload that goes straight to object storage.
+
+    PUT the file to upload_url, then call POST /uploads/{id}/complete.
+    Photos must declare checksum_sha256; as with resumable uploads a known
+    hash completes immediately without any transfer.
+    """
+    await validate_upload(db, upload_data, current_user)
+
+    if upload_data.purpose != "calibration_certificate" and not upload_data.checksum_sha256:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="checksum_sha256 required for direct photo uploads"
+        )
+
+    result = await attach_existing_blob(db, upload_data, current_user.id)
+
+    upload = new_upload_session(upload_data, current_user.id, result)
+    db.add(upload)
+    await db.flush()
+    if result is None:
+        upload.storage_key = f"incoming/{upload.id}{file_extension(upload.filename, upload.content_type)}"
+    await db.commit()
+    await db.refresh(upload)
+
+    return to_direct_response(upload)
+
+
+@router.post("/{upload_id}/url", response_model=DirectUploadResponse)
+async def renew_direct_upload_url(
+    upload_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Issue a fresh upload URL for a direct upload whose URL has expired"""
+    upload = await get_own_upload(db, upload_id, current_user.id)
+
+    if not upload.storage_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Not a direct upload"
+        )
+    if upload.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload is {upload.status}"
+        )
+
+    upload.expires_at = session_expiry()
+    await db.commit()
+    await db.refresh(upload)
+    return to_direct_response(upload)
+
+
+@router.head("/{upload_id}")
+async def get_upload_offset(
+    upload_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Get the current offset of an upload (tus HEAD)"""
+    upload = await get_own_upload(db, upload_id, current_user.id)
+    return Response(status_code=status.HTTP_200_OK, headers=upload_headers(upload))
+
+
+@router.get("/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: UUID,
+    response: Response,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Get upload status"""
+    upload = await get_own_upload(db, upload_id, current_user.id)
+    response.headers.update(upload_headers(upload))
+    return to_response(upload)
+
+
+@router.patch("/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_chunk(
+    upload_id: UUID,
+    request: Request,
+    db: DB,
+    current_user: CurrentUser,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+):
+    """Append a chunk at Upload-Offset; the body is the raw chunk bytes"""
+    upload = await get_own_upload(db, upload_id, current_user.id)
+
+    if upload.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload is {upload.status}"
+        )
+    if upload.storage_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Direct uploads are sent to upload_url"
+        )
+    if upload.expires_at < datetime.utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Upload expired"
+        )
+
+    checksum = parse_checksum_header(upload_checksum)
+    # Do not hold a transaction open while the chunk trickles in
+    await db.commit()
+
+    new_offset, expires_at = await append_chunk(db, upload, upload_offset, request.stream(), checksum)
+
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={
+            "Upload-Offset": str(new_offset),
+            "Upload-Expires": expires_at.isoformat() + "Z",
+        },
+    )
+
+
+async def check_staged_object(upload: UploadSession) -> None:
+    size = await get_storage().stat(upload.storage_key)
+    if size is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File has not been uploaded yet"
+        )
+    if size != upload.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Uploaded file is {size} bytes, expected {upload.total_size}"
+        )
+
+
+async def acquire_upload_blob(db: DB, upload: UploadSession, background_tasks: BackgroundTasks):
+    if upload.storage_key:
+        await check_staged_object(upload)
+        return await acquire_staged(
+            db, upload.checksum_sha256, upload.total_size, upload.content_type,
+            upload.storage_key
+        )
+    spooled = await take_completed_file(upload)
+    return await acquire_spooled(db, spooled, background_tasks)
+
+
+@router.post("/{upload_id}/complete")
+async def complete_upload(
+    upload_id: UUID,
+    background_tasks: BackgroundTasks,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Verify a fully received upload and attach it to its target.
+
+    For direct uploads this is the completion callback: the object must be
+    in storage with the declared size.
+    """
+    # Locked so concurrent or retried completes attach the file only once
+    upload = await get_own_upload(db, upload_id, current_user.id, lock=True)
+
+    if upload.status == "completed":
+        return upload.result
+    if upload.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload is {upload.status}"
+        )
+
+    attributes = upload.attributes or {}
+    previous_certificate = None
+
+    if upload.purpose == "equipment_photo":
+        blob = await acquire_upload_blob(db, upload, background_tasks)
+        photo = await create_equipment_photo(
+            db, upload.target_id, blob, attributes.get("photo_type"),
+            attributes.get("description"), current_user.id
+        )
+        result = equipment_photo_result(photo)
+
+    elif upload.purpose == "onboarding_photo":
+        from app.api.routes.onboarding import onboarding_sessions
+
+        session = onboarding_sessions.get(str(upload.target_id))
+        if not session:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Session not found or expired"
+            )
+        blob = await acquire_upload_blob(db, upload, background_tasks)
+        photo = create_onboarding_photo(
+            session, blob, attributes.get("photo_type"), attributes.get("description")
+        )
+        result = onboarding_photo_result(photo)
+
+    else:
+        calibration = (await db.execute(
+            select(Calibration).where(Calibration.id == upload.target_id)
+        )).scalar_one_or_none()
+        if not calibration:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Calibration not found"
+            )
+        if upload.storage_key:
+            await check_staged_object(upload)
+            key = await store_staged_certificate(
+                calibration, upload.storage_key, upload.filename, upload.content_type
+            )
+        else:
+            spooled = await take_completed_file(upload)
+            key = await store_certificate(calibration, spooled)
+        previous_certificate = replace_certificate(calibration, key)
+        result = {"certificate_url": calibration.certificate_url}
+
+    # The attachment and the session state commit together
+    upload.status = "completed"
+    upload.received_size = upload.total_size
+    upload.result = result
+    upload.completed_at = datetime.utcnow()
+    await db.commit()
+
+    await delete_previous_certificate(previous_certificate)
+    return result
+
+
+@router.delete("/{upload_id}")
+async def abort_upload(
+    upload_id: UUID,
+    db: DB,
+    current_user: CurrentUser,
+):
+    """Abort an upload and discard received data"""
+    upload = await get_own_upload(db, upload_id, current_user.id)
+
+    if upload.status == "uploading":
+        upload.status = "aborted"
+        await db.commit()
+        if upload.storage_key:
+            await get_storage().delete(upload.storage_key)
+        else:
+            remove_spool_file(upload.id)
+
+    return {"message": "Upload aborted"}
@@ -32,19 +32,83 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
-    # Storage (MinIO/S3)
-    STORAGE_TYPE: str = "minio"  # minio or s3
+    # Storage (MinIO/S3 or local filesystem)
+    STORAGE_TYPE: str = "minio"  # minio, s3 or local (development only)
     MINIO_ENDPOINT: str = "localhost:9000"
     MINIO_ACCESS_KEY: str = "minioadmin"
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_BUCKET: str = "vercajch"
     MINIO_SECURE: bool = False
+    MINIO_PUBLIC_URL: Optional[str] = None  # e.g. https://files.spp-d.sk/vercajch
+    LOCAL_STORAGE_DIR: str = "uploads"
+    LOCAL_STORAGE_URL: str = "/uploads"
 
     # File Upload
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB read size when streaming uploads
+    THUMBNAIL_SIZE: int = 320
+    IMAGE_WORKERS: int = 2  # process pool size for thumbnail generation
+
+    # Resumable uploads
+    UPLOAD_SPOOL_DIR: str = "spool"
+    UPLOAD_MAX_CHUNK_SIZE: int = 5 * 1024 * 1024  # 5MB
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    PRESIGNED_URL_EXPIRE_MINUTES: int = 15
     ALLOWED_IMAGE_TYPES: List[str] = ["image/jpeg", "image/png", "image/webp"]
     ALLOWED_DOC_TYPES: List[str] = ["application/pdf"]
 
+    # Offline sync
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 90
+
+    # Change log
+    CHANGE_LOG_POLL_SECONDS: float = 1.0
+    CHANGE_LOG_BATCH_SIZE: int = 500
+    CHANGE_LOG_RETENTION_DAYS: int = 7
+
+    # Audit log
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_SECONDS: float = 1.0
+    AUDIT_WRITE_ATTEMPTS: int = 3
+    AUDIT_BACKPRESSURE_SECONDS: float = 0.5
+    AUDIT_LOG_RETENTION_MONTHS: int = 24
+
+    # Monthly partitions (audit_log, notifications)
+    PARTITION_MONTHS_AHEAD: int = 3
+    PARTITION_ARCHIVE_PREFIX: str = "archive"
+    NOTIFICATION_RETENTION_MONTHS: int = 12
+
+    # Push events (SSE / WebSocket)
+    PUSH_BACKEND: str = "local"  # local, redis
+    PUSH_HEARTBEAT_SECONDS: int = 15
+    PUSH_QUEUE_SIZE: int = 100
+    PUSH_REPLAY_MAX_ENTRIES: int = 5000
+
+    # Notification fan-out
+    NOTIFICATION_DEDUPE_HOURS: int = 24
+    NOTIFICATION_DIGEST_THRESHOLD: int = 5
+    NOTIFICATION_EMAIL_WORKERS: int = 4
+    NOTIFICATION_EMAIL_QUEUE_SIZE: int = 1000
+    NOTIFICATION_EMAIL_ATTEMPTS: int = 3
+
+    # Background jobs
+    JOB_WORKER_ENABLED: bool = True  # False leaves jobs to other processes
+    JOB_CONCURRENCY: int = 4  # jobs running at once per process
+    JOB_POLL_SECONDS: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BASE_SECONDS: int = 30
+    JOB_RETRY_MAX_SECONDS: int = 3600
+    JOB_TIMEOUT_SECONDS: int = 3600
+    JOB_RETENTION_DAYS: int = 14
+
+    # Idempotency-Key responses are replayed for this long
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_LOCK_SECONDS: int = 120  # a key still processing after this is released
+
+    # State transitions retried on a concurrent update or deadlock
+    TRANSACTION_RETRY_ATTEMPTS: int = 3
+    TRANSACTION_RETRY_DELAY_SECONDS: float = 0.05
+
     # Email
     SMTP_HOST: str = "smtp.gmail.com"
     SMTP_PORT: int = 587
@@ -1,8 +1,20 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy import MetaData
 from .config import settings
 
+T = TypeVar("T")
+
+# serialization_failure, deadlock_detected
+RETRYABLE_SQLSTATES = {"40001", "40P01"}
+
 # Naming conventions for constraints
 convention = {
     "ix": "ix_%(column_0_label)s",
@@ -45,3 +57,31 @@ async def get_db() -> AsyncSession:
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+
+
+def is_conflict(exc: Exception) -> bool:
+    """A concurrent writer got there first; running the transaction again may succeed"""
+    if isinstance(exc, StaleDataError):
+        return True
+    return isinstance(exc, DBAPIError) and getattr(exc.orig, "pgcode", None) in RETRYABLE_SQLSTATES
+
+
+async def retry_on_conflict(db: AsyncSession, operation: Callable[[], Awaitable[T]]) -> T:
+    """Run operation, which reads, writes and commits, again after a conflict.
+
+    The session is rolled back between attempts, so the next attempt
+    reads the rows as the other writer left them. Gives up with 409.
+    """
+    for attempt in range(1, settings.TRANSACTION_RETRY_ATTEMPTS + 1):
+        try:
+            return await operation()
+        except (StaleDataError, DBAPIError) as exc:
+            if not is_conflict(exc):
+                raise
+            await db.rollback()
+            if attempt == settings.TRANSACTION_RETRY_ATTEMPTS:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="The record was changed by someone else, please try again"
+                )
+            await asyncio.sleep(settings.TRANSACTION_RETRY_DELAY_SECONDS * attempt * (1 + random.random()))
@@ -1,5 +1,8 @@
 from enum import Enum
-from typing import List, Set
+from typing import TYPE_CHECKING, List, Set
+
+if TYPE_CHECKING:
+    from app.models.user import User
 
 
 class Permission(str, Enum):
@@ -212,6 +215,13 @@ def get_role_permissions(role: Role) -> Set[Permission]:
     return permissions
 
 
+def get_user_role(user: "User") -> Role:
+    """Get the Role enum from user's role"""
+    if not user.role:
+        return Role.WORKER
+    return Role(user.role.code)
+
+
 def has_permission(user_role: Role, permission: Permission) -> bool:
     """Check if a role has a specific permission"""
     return permission in get_role_permissions(user_role)
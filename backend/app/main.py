@@ -1,22 +1,35 @@
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
 import traceback
+from sqlalchemy.orm.exc import StaleDataError
 
 from app.core.config import settings
 from app.core.database import init_db
 from app.api.routes import api_router
+from app.services import audit, changes, images, jobs, notifications, push
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    audit.start()
+    notifications.start()
+    jobs.start()
+    changes.start()
+    push.start()
     yield
     # Shutdown
-    pass
+    await push.stop()
+    await changes.stop()
+    await jobs.stop()
+    await notifications.stop()
+    await audit.stop()
+    images.shutdown()
 
 
 app = FastAPI(
@@ -46,6 +59,15 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+# A write based on a stale read that no route retried
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "The record was changed by someone else, please try again"}
+    )
+
+
 # CORS - must be added after exception handler
 app.add_middleware(
     CORSMiddleware,
@@ -55,10 +77,20 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(audit.AuditContextMiddleware)
 
 # API routes
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
+# Local filesystem storage stand-in for MinIO/S3
+if settings.STORAGE_TYPE == "local":
+    os.makedirs(settings.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount(
+        settings.LOCAL_STORAGE_URL,
+        StaticFiles(directory=settings.LOCAL_STORAGE_DIR),
+        name="uploads",
+    )
+
 
 @app.get("/health")
 async def health_check():
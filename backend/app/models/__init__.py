@@ -11,12 +11,18 @@ from .equipment import (
 )
 from .calibration import Calibration, CalibrationReminderSetting, CalibrationReminderSent
 from .checkout import Checkout
-from .transfer import TransferRequest, TransferOffer, Transfer
+from .transfer import TransferRequest, TransferOffer, Transfer, TransferMatch
 from .maintenance import MaintenanceRecord
 from .printing import Printer, LabelTemplate, PrintJob, PrintJobItem
-from .notification import Notification
+from .notification import Notification, NotificationKey
 from .audit import AuditLog
 from .system import SystemSetting
+from .upload import UploadSession
+from .blob import StoredBlob
+from .sync import SyncTombstone
+from .change_log import ChangeLog, ChangeLogConsumer
+from .job import BackgroundJob
+from .idempotency import IdempotencyKey
 
 __all__ = [
     "User",
@@ -39,12 +45,21 @@ __all__ = [
     "TransferRequest",
     "TransferOffer",
     "Transfer",
+    "TransferMatch",
     "MaintenanceRecord",
     "Printer",
     "LabelTemplate",
     "PrintJob",
     "PrintJobItem",
     "Notification",
+    "NotificationKey",
     "AuditLog",
     "SystemSetting",
+    "UploadSession",
+    "StoredBlob",
+    "SyncTombstone",
+    "ChangeLog",
+    "ChangeLogConsumer",
+    "BackgroundJob",
+    "IdempotencyKey",
 ]
@@ -6,9 +6,10 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB, INET
 
 from app.core.database import Base
+from app.models.partitioning import MonthPartitioned
 
 
-class AuditLog(Base):
+class AuditLog(MonthPartitioned, Base):
     __tablename__ = "audit_log"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -26,11 +27,13 @@ class AuditLog(Base):
     user_agent: Mapped[Optional[str]] = mapped_column(Text)
     platform: Mapped[Optional[str]] = mapped_column(String(20))
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, default=datetime.utcnow, index=True)
 
     # Relationships
     user: Mapped[Optional["User"]] = relationship("User")
 
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+
 
 # Import for type hints
 from app.models.user import User
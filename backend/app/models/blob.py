@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, DateTime, Integer, BigInteger, Boolean, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class StoredBlob(Base):
+    """Content-addressed file in object storage, shared by all rows referencing the same bytes"""
+    __tablename__ = "stored_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    content_type: Mapped[Optional[str]] = mapped_column(String(100))
+    storage_key: Mapped[str] = mapped_column(String(500), nullable=False)
+    # False while the object is a direct upload not yet checked against sha256;
+    # unverified blobs are never handed out for deduplication
+    verified: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True, server_default=text("true"))
+
+    # Derivatives, filled in by the thumbnail task
+    thumbnail_key: Mapped[Optional[str]] = mapped_column(String(500))
+    width: Mapped[Optional[int]] = mapped_column(Integer)
+    height: Mapped[Optional[int]] = mapped_column(Integer)
+
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_referenced_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
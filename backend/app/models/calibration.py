@@ -2,14 +2,15 @@ import uuid
 from datetime import datetime, date
 from decimal import Decimal
 from typing import Optional, List
-from sqlalchemy import String, Boolean, ForeignKey, DateTime, Date, Text, Integer, Numeric, ARRAY
+from sqlalchemy import String, Boolean, ForeignKey, DateTime, Date, Text, Integer, Numeric, ARRAY, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 from app.core.database import Base
+from app.models.change_log import ChangeTracked
 
 
-class Calibration(Base):
+class Calibration(ChangeTracked, Base):
     __tablename__ = "calibrations"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -94,6 +95,16 @@ class CalibrationReminderSent(Base):
 
     sent_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Idempotency ledger: one reminder per threshold, calibration cycle and recipient
+        Index(
+            "uq_calibration_reminders_sent_cycle",
+            "equipment_id", "calibration_id", "reminder_type", "sent_to",
+            unique=True,
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
 
 # Import for type hints
 from app.models.equipment import Equipment, Category
@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Optional, List
+from sqlalchemy import String, DateTime, BigInteger, Index, ARRAY, text, event
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+# Id of the writing transaction. Unlike a sequence value it can be compared
+# against a snapshot's xmin, which is what makes sync tokens and change_log
+# positions safe against transactions that commit out of order.
+CURRENT_TXID = text("(pg_current_xact_id()::text)::bigint")
+
+
+class ChangeTracked:
+    """Marker mixin: inserts, updates and deletes are recorded in change_log"""
+
+
+class ChangeLog(Base):
+    """Ordered record of row changes, read by app.services.changes consumers"""
+    __tablename__ = "change_log"
+
+    seq: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    # Id of the writing transaction; entries are consumed in (version, seq) order
+    version: Mapped[int] = mapped_column(BigInteger, server_default=CURRENT_TXID, nullable=False)
+
+    table_name: Mapped[str] = mapped_column(String(63), nullable=False)
+    row_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    op: Mapped[str] = mapped_column(String(10), nullable=False)  # insert, update, delete
+    columns: Mapped[Optional[List[str]]] = mapped_column(ARRAY(String))  # changed columns of an update
+
+    changed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ix_change_log_version_seq", "version", "seq"),
+    )
+
+
+class ChangeLogConsumer(Base):
+    """Position of a shared change_log consumer"""
+    __tablename__ = "change_log_consumers"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    position_version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    position_seq: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+RECORD_CHANGE_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_change() RETURNS trigger AS $$
+DECLARE
+    changed text[];
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(n.key) INTO changed
+        FROM jsonb_each(to_jsonb(NEW)) n
+        JOIN jsonb_each(to_jsonb(OLD)) o USING (key)
+        WHERE n.value IS DISTINCT FROM o.value;
+        IF changed IS NULL THEN
+            RETURN NULL;
+        END IF;
+        INSERT INTO change_log (table_name, row_id, op, columns, changed_at)
+        VALUES (TG_TABLE_NAME, to_jsonb(NEW) ->> TG_ARGV[0], 'update', changed, now() AT TIME ZONE 'utc');
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO change_log (table_name, row_id, op, changed_at)
+        VALUES (TG_TABLE_NAME, to_jsonb(NEW) ->> TG_ARGV[0], 'insert', now() AT TIME ZONE 'utc');
+    ELSE
+        INSERT INTO change_log (table_name, row_id, op, changed_at)
+        VALUES (TG_TABLE_NAME, to_jsonb(OLD) ->> TG_ARGV[0], 'delete', now() AT TIME ZONE 'utc');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def change_trigger_ddl(table_name: str, key_column: str = "id") -> str:
+    return (
+        f"CREATE OR REPLACE TRIGGER {table_name}_record_change "
+        f"AFTER INSERT OR UPDATE OR DELETE ON {table_name} "
+        f"FOR EACH ROW EXECUTE FUNCTION record_change('{key_column}')"
+    )
+
+
+def tracked_tables() -> List[str]:
+    return sorted(
+        mapper.local_table.name
+        for mapper in Base.registry.mappers
+        if issubclass(mapper.class_, ChangeTracked)
+    )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_change_triggers(target, connection, **kw) -> None:
+    # Runs on every init_db(); all statements are idempotent
+    connection.execute(text(RECORD_CHANGE_FUNCTION))
+    for table_name in tracked_tables():
+        connection.execute(text(change_trigger_ddl(table_name)))
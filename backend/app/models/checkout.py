@@ -2,14 +2,19 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional
-from sqlalchemy import String, ForeignKey, DateTime, Text, Numeric
+from sqlalchemy import String, ForeignKey, DateTime, Text, Numeric, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.core.database import Base
+from app.models.sync import Versioned
 
+# Equipment still out; overdue is set by checkouts.mark_overdue
+OPEN_CHECKOUT_STATUSES = ("active", "overdue")
+OPEN_CHECKOUT_WHERE = text("status IN ('active', 'overdue')")
 
-class Checkout(Base):
+
+class Checkout(Versioned, Base):
     __tablename__ = "checkouts"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -49,6 +54,10 @@ class Checkout(Base):
     checkout_user: Mapped[Optional["User"]] = relationship("User", foreign_keys=[checked_out_by])
     checkin_user: Mapped[Optional["User"]] = relationship("User", foreign_keys=[checked_in_by])
 
+    __table_args__ = (
+        Index("ix_checkouts_open_expected_return_at", "expected_return_at", postgresql_where=OPEN_CHECKOUT_WHERE),
+    )
+
 
 # Import for type hints
 from app.models.equipment import Equipment, Location
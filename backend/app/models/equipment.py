@@ -7,10 +7,14 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 from app.core.database import Base
+from app.models.change_log import ChangeTracked
+from app.models.sync import SyncVersioned, Versioned
+from app.models.tree import MaterializedPath
 
 
-class Category(Base):
+class Category(MaterializedPath, SyncVersioned, Base):
     __tablename__ = "categories"
+    __tree_parent__ = "parent_category_id"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -36,8 +40,9 @@ class Category(Base):
     models: Mapped[List["EquipmentModel"]] = relationship("EquipmentModel", back_populates="category")
 
 
-class Location(Base):
+class Location(MaterializedPath, SyncVersioned, Base):
     __tablename__ = "locations"
+    __tree_parent__ = "parent_location_id"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -116,14 +121,16 @@ class AccessoryType(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
 
-class Equipment(Base):
+class Equipment(Versioned, Base):
     __tablename__ = "equipment"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name: Mapped[str] = mapped_column(String(200), nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text)
 
-    category_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("categories.id"))
+    category_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("categories.id"), index=True
+    )
     model_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("equipment_models.id"))
     serial_number: Mapped[Optional[str]] = mapped_column(String(100))
     internal_code: Mapped[Optional[str]] = mapped_column(String(50), unique=True)
@@ -142,9 +149,11 @@ class Equipment(Base):
     photo_url: Mapped[Optional[str]] = mapped_column(String(500))
 
     current_location_id: Mapped[Optional[uuid.UUID]] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("locations.id")
+        UUID(as_uuid=True), ForeignKey("locations.id"), index=True
+    )
+    current_holder_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id"), index=True
     )
-    current_holder_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"))
     home_location_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("locations.id"))
 
     # Accessories
@@ -159,8 +168,9 @@ class Equipment(Base):
     requires_calibration: Mapped[bool] = mapped_column(Boolean, default=False)
     calibration_interval_days: Mapped[Optional[int]] = mapped_column(Integer)
     last_calibration_date: Mapped[Optional[date]] = mapped_column(Date)
-    next_calibration_date: Mapped[Optional[date]] = mapped_column(Date)
-    calibration_status: Mapped[Optional[str]] = mapped_column(String(20))  # valid, expiring, expired, not_required
+    next_calibration_date: Mapped[Optional[date]] = mapped_column(Date, index=True)
+    # valid, expiring, expired, not_required; kept current by calibrations.refresh_status
+    calibration_status: Mapped[Optional[str]] = mapped_column(String(20), index=True)
 
     # Maintenance
     next_maintenance_date: Mapped[Optional[date]] = mapped_column(Date)
@@ -195,7 +205,7 @@ class Equipment(Base):
         return f"<Equipment {self.name} ({self.internal_code})>"
 
 
-class EquipmentTag(Base):
+class EquipmentTag(SyncVersioned, Base):
     __tablename__ = "equipment_tags"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -223,7 +233,7 @@ class EquipmentTag(Base):
     creator: Mapped[Optional["User"]] = relationship("User")
 
 
-class EquipmentPhoto(Base):
+class EquipmentPhoto(ChangeTracked, Base):
     __tablename__ = "equipment_photos"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -234,6 +244,9 @@ class EquipmentPhoto(Base):
     photo_type: Mapped[str] = mapped_column(String(20), nullable=False)  # main, detail, label, damage, calibration
     file_url: Mapped[str] = mapped_column(String(500), nullable=False)
     thumbnail_url: Mapped[Optional[str]] = mapped_column(String(500))
+    blob_sha256: Mapped[Optional[str]] = mapped_column(
+        String(64), ForeignKey("stored_blobs.sha256"), index=True
+    )
 
     local_path: Mapped[Optional[str]] = mapped_column(String(500))
     is_synced: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -0,0 +1,29 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, ForeignKey, DateTime, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    """Outcome of a request sent with an Idempotency-Key, see app.api.idempotency"""
+    __tablename__ = "idempotency_keys"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    key: Mapped[str] = mapped_column(String(200), primary_key=True)
+    # SHA-256 of method, path and body; a key may not be reused for another request
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="processing")  # processing, completed
+    status_code: Mapped[Optional[int]] = mapped_column(Integer)
+    headers: Mapped[Optional[dict]] = mapped_column(JSONB)
+    body: Mapped[Optional[bytes]] = mapped_column(LargeBinary)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # A processing key past this is taken to be abandoned, a completed one is forgotten
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
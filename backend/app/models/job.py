@@ -0,0 +1,41 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, ForeignKey, DateTime, Text, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+from app.core.database import Base
+
+
+class BackgroundJob(Base):
+    """Durable job queue, see app.services.jobs"""
+    __tablename__ = "background_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    # At most one job per key, e.g. one per schedule interval
+    key: Mapped[Optional[str]] = mapped_column(String(200), unique=True)
+
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=3)
+    run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    # A running job past this is taken to have lost its worker
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    worker: Mapped[Optional[str]] = mapped_column(String(100))
+
+    result: Mapped[Optional[dict]] = mapped_column(JSONB)
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+
+    created_by: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+    __table_args__ = (
+        Index("ix_background_jobs_due", "run_at", postgresql_where=text("status = 'queued'")),
+        Index("ix_background_jobs_running", "locked_until", postgresql_where=text("status = 'running'")),
+        Index("ix_background_jobs_name_created_at", "name", "created_at"),
+    )
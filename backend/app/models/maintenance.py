@@ -7,9 +7,10 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 from app.core.database import Base
+from app.models.change_log import ChangeTracked
 
 
-class MaintenanceRecord(Base):
+class MaintenanceRecord(ChangeTracked, Base):
     __tablename__ = "maintenance_records"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
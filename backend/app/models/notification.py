@@ -1,14 +1,16 @@
 import uuid
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import String, Boolean, ForeignKey, DateTime, Text, Index, text, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.core.database import Base
+from app.models.change_log import ChangeTracked
+from app.models.partitioning import MonthPartitioned
 
 
-class Notification(Base):
+class Notification(ChangeTracked, MonthPartitioned, Base):
     __tablename__ = "notifications"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -24,11 +26,90 @@ class Notification(Base):
     is_read: Mapped[bool] = mapped_column(Boolean, default=False)
     read_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
 
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True, default=datetime.utcnow)
 
     # Relationships
     user: Mapped["User"] = relationship("User")
 
+    __table_args__ = (
+        Index("ix_notifications_user_id_created_at", "user_id", "created_at"),
+        Index("ix_notifications_user_id_unread", "user_id", postgresql_where=text("is_read = false")),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+
+class NotificationKey(Base):
+    """Dedupe ledger: a (user, key) pair is not notified again before expires_at"""
+    __tablename__ = "notification_keys"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    key: Mapped[str] = mapped_column(String(200), primary_key=True)  # type:entity_type:entity_id
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+# Keeps users.unread_notifications in step with notifications. Statement
+# triggers with transition tables do one grouped UPDATE per statement, so
+# a bulk mark-read touches each user row once rather than once per row.
+COUNT_UNREAD_FUNCTION = """
+CREATE OR REPLACE FUNCTION count_unread_notifications() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE users u SET unread_notifications = u.unread_notifications + d.delta
+        FROM (SELECT user_id, count(*) AS delta FROM new_rows WHERE NOT is_read GROUP BY user_id) d
+        WHERE u.id = d.user_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE users u SET unread_notifications = greatest(u.unread_notifications - d.delta, 0)
+        FROM (SELECT user_id, count(*) AS delta FROM old_rows WHERE NOT is_read GROUP BY user_id) d
+        WHERE u.id = d.user_id;
+    ELSE
+        UPDATE users u SET unread_notifications = greatest(u.unread_notifications + d.delta, 0)
+        FROM (
+            SELECT user_id, sum(delta) AS delta FROM (
+                SELECT user_id, CASE WHEN is_read THEN 0 ELSE 1 END AS delta FROM new_rows
+                UNION ALL
+                SELECT user_id, CASE WHEN is_read THEN 0 ELSE -1 END FROM old_rows
+            ) changes
+            GROUP BY user_id
+            HAVING sum(delta) <> 0
+        ) d
+        WHERE u.id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+COUNT_UNREAD_TRIGGERS = [
+    "CREATE OR REPLACE TRIGGER notifications_count_unread_insert AFTER INSERT ON notifications "
+    "REFERENCING NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION count_unread_notifications()",
+    "CREATE OR REPLACE TRIGGER notifications_count_unread_update AFTER UPDATE ON notifications "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION count_unread_notifications()",
+    "CREATE OR REPLACE TRIGGER notifications_count_unread_delete AFTER DELETE ON notifications "
+    "REFERENCING OLD TABLE AS old_rows "
+    "FOR EACH STATEMENT EXECUTE FUNCTION count_unread_notifications()",
+]
+
+# Rows removed without firing triggers (dropped partitions) are corrected here
+RECONCILE_UNREAD = """
+UPDATE users u SET unread_notifications = c.unread
+FROM (
+    SELECT users.id, count(n.id) AS unread
+    FROM users
+    LEFT JOIN notifications n ON n.user_id = users.id AND NOT n.is_read
+    GROUP BY users.id
+) c
+WHERE u.id = c.id AND u.unread_notifications <> c.unread
+"""
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_unread_counters(target, connection, **kw) -> None:
+    connection.execute(text(COUNT_UNREAD_FUNCTION))
+    for ddl in COUNT_UNREAD_TRIGGERS:
+        connection.execute(text(ddl))
+
 
 # Import for type hints
 from app.models.user import User
@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from typing import List
+
+from sqlalchemy import text, event
+
+from app.core.config import settings
+from app.core.database import Base
+
+
+class MonthPartitioned:
+    """Marker mixin for tables range-partitioned by month on created_at.
+
+    The primary key has to include the partition key, so the table's key is
+    (id, created_at) while the ORM still identifies rows by id alone.
+    """
+
+    __mapper_args__ = {"primary_key": ["id"]}
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table_name: str, month: date) -> str:
+    return f"{table_name}_y{month.year:04d}m{month.month:02d}"
+
+
+def create_partition_ddl(table_name: str, month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} "
+        f"PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def default_partition_name(table_name: str) -> str:
+    return f"{table_name}_default"
+
+
+def create_default_partition_ddl(table_name: str) -> str:
+    """Catches rows of months whose partition does not exist yet, so inserts
+    never fail when partition upkeep falls behind"""
+    return f"CREATE TABLE IF NOT EXISTS {default_partition_name(table_name)} PARTITION OF {table_name} DEFAULT"
+
+
+def move_from_default_ddl(table_name: str, month: date) -> List[str]:
+    """Create a month's partition when the default partition may hold rows of
+    that month: they are moved over before the new table is attached"""
+    name = partition_name(table_name, month)
+    bounds = f"created_at >= '{month.isoformat()}' AND created_at < '{add_months(month, 1).isoformat()}'"
+    return [
+        f"CREATE TABLE {name} (LIKE {table_name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"WITH moved AS (DELETE FROM {default_partition_name(table_name)} WHERE {bounds} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        f"ALTER TABLE {table_name} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')",
+    ]
+
+
+def upcoming_months(first: date = None) -> List[date]:
+    """Months from first (default: the current one) to PARTITION_MONTHS_AHEAD ahead"""
+    current = month_start(datetime.utcnow())
+    first = min(first or current, current)
+    months = []
+    month = first
+    while month <= add_months(current, settings.PARTITION_MONTHS_AHEAD):
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partitioned_tables() -> List[str]:
+    return sorted(
+        mapper.local_table.name
+        for mapper in Base.registry.mappers
+        if issubclass(mapper.class_, MonthPartitioned)
+    )
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_partitions(target, connection, **kw) -> None:
+    for table_name in partitioned_tables():
+        for month in upcoming_months():
+            connection.execute(text(create_partition_ddl(table_name, month)))
+        connection.execute(text(create_default_partition_ddl(table_name)))
@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import String, DateTime, BigInteger, Integer, Index, text
+from sqlalchemy.orm import Mapped, mapped_column, declared_attr
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.database import Base
+from app.models.change_log import ChangeTracked, CURRENT_TXID
+
+
+class SyncVersioned(ChangeTracked):
+    """Mixin for tables delivered to offline clients by /sync/pull"""
+
+    __mapper_args__ = {"eager_defaults": True}
+
+    sync_version: Mapped[int] = mapped_column(
+        BigInteger,
+        server_default=CURRENT_TXID,
+        onupdate=CURRENT_TXID,
+        nullable=False,
+        index=True,
+    )
+
+
+class Versioned(SyncVersioned):
+    """Synced table whose rows go through state transitions.
+
+    Every ORM update checks and bumps version, so a write based on a stale
+    read fails with StaleDataError instead of overwriting the other one;
+    see retry_on_conflict. Set-based updates bump version themselves.
+    """
+
+    version: Mapped[int] = mapped_column(Integer, server_default=text("1"), nullable=False)
+
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict:
+        return {**SyncVersioned.__mapper_args__, "version_id_col": cls.__table__.c.version}
+
+
+class SyncTombstone(Base):
+    """Deleted row of a synced table, kept so clients can drop their copy"""
+    __tablename__ = "sync_tombstones"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    entity: Mapped[str] = mapped_column(String(30), nullable=False)
+    entity_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    sync_version: Mapped[int] = mapped_column(BigInteger, server_default=CURRENT_TXID, nullable=False)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_sync_tombstones_entity_sync_version", "entity", "sync_version"),
+    )
+
+
+# Deletes are recorded by a row trigger, so set-based deletes and
+# ON DELETE CASCADE leave a tombstone just like ORM deletes
+RECORD_TOMBSTONE_FUNCTION = """
+CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sync_tombstones (entity, entity_id, deleted_at)
+    VALUES (TG_ARGV[0], OLD.id, now() AT TIME ZONE 'utc');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def tombstone_trigger_ddl(table_name: str, entity: str) -> str:
+    return (
+        f"CREATE OR REPLACE TRIGGER {table_name}_record_tombstone "
+        f"AFTER DELETE ON {table_name} "
+        f"FOR EACH ROW EXECUTE FUNCTION record_tombstone('{entity}')"
+    )
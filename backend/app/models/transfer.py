@@ -2,14 +2,20 @@ import uuid
 from datetime import datetime
 from decimal import Decimal
 from typing import Optional, List
-from sqlalchemy import String, Boolean, ForeignKey, DateTime, Text, Numeric
+from sqlalchemy import String, Boolean, ForeignKey, DateTime, Text, Numeric, Integer, Float, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
 from app.core.database import Base
+from app.models.change_log import ChangeTracked
+from app.models.sync import Versioned
 
+# Requests that can still be acted on; the partial indexes below cover only these
+ACTIVE_REQUEST_STATUSES = ("pending", "requires_approval")
+ACTIVE_REQUEST_WHERE = text("status IN ('pending', 'requires_approval')")
 
-class TransferRequest(Base):
+
+class TransferRequest(Versioned, Base):
     __tablename__ = "transfer_requests"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -55,8 +61,18 @@ class TransferRequest(Base):
     approver: Mapped[Optional["User"]] = relationship("User", foreign_keys=[approved_by])
     offers: Mapped[List["TransferOffer"]] = relationship("TransferOffer", back_populates="request")
 
+    __table_args__ = (
+        Index("ix_transfer_requests_equipment_id_status", "equipment_id", "status"),
+        Index("ix_transfer_requests_requester_id_created_at", "requester_id", "created_at", "id"),
+        Index(
+            "ix_transfer_requests_active_type_created_at", "request_type", "created_at", "id",
+            postgresql_where=ACTIVE_REQUEST_WHERE
+        ),
+        Index("ix_transfer_requests_active_expires_at", "expires_at", postgresql_where=ACTIVE_REQUEST_WHERE),
+    )
+
 
-class TransferOffer(Base):
+class TransferOffer(ChangeTracked, Base):
     __tablename__ = "transfer_offers"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -81,7 +97,7 @@ class TransferOffer(Base):
     equipment: Mapped["Equipment"] = relationship("Equipment")
 
 
-class Transfer(Base):
+class Transfer(Versioned, Base):
     __tablename__ = "transfers"
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -118,6 +134,38 @@ class Transfer(Base):
     to_user: Mapped["User"] = relationship("User", foreign_keys=[to_user_id])
     location: Mapped[Optional["Location"]] = relationship("Location")
 
+    __table_args__ = (
+        Index("ix_transfers_from_user_id_created_at", "from_user_id", "created_at", "id"),
+        Index("ix_transfers_to_user_id_created_at", "to_user_id", "created_at", "id"),
+    )
+
+
+class TransferMatch(Base):
+    """A user holding equipment that could fulfil a broadcast request,
+    kept by app.services.transfer_matching"""
+    __tablename__ = "transfer_request_matches"
+
+    request_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("transfer_requests.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    # Matching pieces the user holds, and how far the nearest is from the
+    # request location; None if either has no GPS position
+    equipment_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    distance_km: Mapped[Optional[float]] = mapped_column(Float)
+
+    matched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    request: Mapped["TransferRequest"] = relationship("TransferRequest")
+    user: Mapped["User"] = relationship("User")
+
+    __table_args__ = (
+        Index("ix_transfer_request_matches_user_id_distance_km", "user_id", "distance_km"),
+    )
+
 
 # Import for type hints
 from app.models.equipment import Equipment, Category, Location
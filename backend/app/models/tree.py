@@ -0,0 +1,144 @@
+from typing import Dict
+
+from sqlalchemy import Text, Integer, FetchedValue, and_, func, select, text, event
+from sqlalchemy.orm import Mapped, mapped_column, aliased
+
+from app.core.database import Base
+
+
+class MaterializedPath:
+    """Mixin for self-referencing tables, kept up to date by triggers.
+
+    path lists the ids from the root down to the row, "/<root>/.../<id>/",
+    and depth counts its ancestors. Byte-wise collation lets the subtree
+    of a row be read as one index range on path. Subclasses name their
+    parent column in __tree_parent__.
+    """
+
+    __tree_parent__: str
+
+    path: Mapped[str] = mapped_column(
+        Text(collation="C"),
+        server_default=text("''"),
+        server_onupdate=FetchedValue(),
+        nullable=False,
+        index=True,
+    )
+    depth: Mapped[int] = mapped_column(
+        Integer,
+        server_default=text("0"),
+        server_onupdate=FetchedValue(),
+        nullable=False,
+    )
+
+    @classmethod
+    def in_subtree(cls, path: str):
+        """The row with this path and all rows below it"""
+        # "0" is the byte after "/", so the range ends past the last descendant
+        return and_(cls.path >= path, cls.path < path[:-1] + "0")
+
+    @classmethod
+    def in_subtree_of(cls, node):
+        """Join condition: the row is node (an alias of cls) or below it"""
+        return and_(cls.path >= node.path, cls.path < func.left(node.path, -1) + "0")
+
+    @classmethod
+    def subtree_ids(cls, node_id):
+        """Ids of a row and all rows below it, read as one index range"""
+        node = aliased(cls)
+        return select(cls.id).join(node, cls.in_subtree_of(node)).where(node.id == node_id)
+
+
+# Sets path and depth of a new row, or of one moved to another parent,
+# from the parent's; refuses to move a row below itself
+SET_TREE_PATH_FUNCTION = """
+CREATE OR REPLACE FUNCTION set_tree_path() RETURNS trigger AS $$
+DECLARE
+    parent_id uuid := (to_jsonb(NEW) ->> TG_ARGV[0])::uuid;
+    parent_path text;
+    parent_depth integer;
+BEGIN
+    IF TG_OP = 'UPDATE' AND parent_id IS NOT DISTINCT FROM (to_jsonb(OLD) ->> TG_ARGV[0])::uuid THEN
+        RETURN NEW;
+    END IF;
+    IF parent_id IS NULL THEN
+        NEW.path := '/' || NEW.id || '/';
+        NEW.depth := 0;
+        RETURN NEW;
+    END IF;
+    EXECUTE format('SELECT path, depth FROM %I WHERE id = $1', TG_TABLE_NAME)
+        INTO parent_path, parent_depth USING parent_id;
+    IF parent_path IS NULL THEN
+        RAISE EXCEPTION 'Parent % of % % not found', parent_id, TG_TABLE_NAME, NEW.id
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    IF position('/' || NEW.id || '/' IN parent_path) > 0 THEN
+        RAISE EXCEPTION '% % cannot be moved below itself', TG_TABLE_NAME, NEW.id
+            USING ERRCODE = 'check_violation';
+    END IF;
+    NEW.path := parent_path || NEW.id || '/';
+    NEW.depth := parent_depth + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Carries a moved row's new path over to its descendants in one UPDATE;
+# the rows that UPDATE touches do not cascade again
+MOVE_TREE_PATH_FUNCTION = """
+CREATE OR REPLACE FUNCTION move_tree_path() RETURNS trigger AS $$
+BEGIN
+    IF NEW.path = OLD.path OR OLD.path = '' OR pg_trigger_depth() > 1 THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format(
+        'UPDATE %I SET path = $1 || substr(path, length($2) + 1), depth = depth + $3 '
+        'WHERE path > $2 AND path < left($2, -1) || ''0''',
+        TG_TABLE_NAME
+    ) USING NEW.path, OLD.path, NEW.depth - OLD.depth;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def tree_trigger_ddl(table_name: str, parent_column: str) -> list:
+    return [
+        f"CREATE OR REPLACE TRIGGER {table_name}_set_path BEFORE INSERT OR UPDATE ON {table_name} "
+        f"FOR EACH ROW EXECUTE FUNCTION set_tree_path('{parent_column}')",
+        f"CREATE OR REPLACE TRIGGER {table_name}_move_path AFTER UPDATE ON {table_name} "
+        f"FOR EACH ROW EXECUTE FUNCTION move_tree_path()",
+    ]
+
+
+def backfill_tree_paths(table_name: str, parent_column: str) -> str:
+    """Compute path and depth of existing rows; run before the triggers exist"""
+    return f"""
+        WITH RECURSIVE tree AS (
+            SELECT id, '/' || id || '/' AS path, 0 AS depth
+            FROM {table_name} WHERE {parent_column} IS NULL
+            UNION ALL
+            SELECT t.id, tree.path || t.id || '/', tree.depth + 1
+            FROM {table_name} t JOIN tree ON t.{parent_column} = tree.id
+        )
+        UPDATE {table_name} SET path = tree.path, depth = tree.depth
+        FROM tree WHERE {table_name}.id = tree.id
+    """
+
+
+def tree_tables() -> Dict[str, str]:
+    """Parent column by table name"""
+    return {
+        mapper.local_table.name: mapper.class_.__tree_parent__
+        for mapper in Base.registry.mappers
+        if issubclass(mapper.class_, MaterializedPath)
+    }
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_tree_triggers(target, connection, **kw) -> None:
+    connection.execute(text(SET_TREE_PATH_FUNCTION))
+    connection.execute(text(MOVE_TREE_PATH_FUNCTION))
+    for table_name, parent_column in tree_tables().items():
+        for ddl in tree_trigger_ddl(table_name, parent_column):
+            connection.execute(text(ddl))
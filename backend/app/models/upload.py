@@ -0,0 +1,51 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, ForeignKey, DateTime, BigInteger, Index
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+
+from app.core.database import Base
+
+
+class UploadSession(Base):
+    """Resumable chunked upload; received bytes are spooled to disk until finalized.
+
+    Direct uploads instead go straight to object storage through a presigned
+    URL, to the staging key in storage_key.
+    """
+    __tablename__ = "upload_sessions"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+
+    purpose: Mapped[str] = mapped_column(String(30), nullable=False)
+    # equipment_photo, onboarding_photo, calibration_certificate
+    target_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    attributes: Mapped[Optional[dict]] = mapped_column(JSONB)  # photo_type, description
+
+    filename: Mapped[Optional[str]] = mapped_column(String(255))
+    content_type: Mapped[Optional[str]] = mapped_column(String(100))
+    total_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    received_size: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    checksum_sha256: Mapped[Optional[str]] = mapped_column(String(64))
+    storage_key: Mapped[Optional[str]] = mapped_column(String(500))  # set for direct uploads
+
+    status: Mapped[str] = mapped_column(String(20), default="uploading")  # uploading, completed, aborted
+    result: Mapped[Optional[dict]] = mapped_column(JSONB)
+
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_upload_sessions_status_expires_at", "status", "expires_at"),
+    )
+
+    # Relationships
+    user: Mapped["User"] = relationship("User")
+
+
+# Import for type hints
+from app.models.user import User
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 from typing import Optional, List
-from sqlalchemy import String, Boolean, ForeignKey, DateTime, ARRAY, Text
+from sqlalchemy import String, Boolean, ForeignKey, DateTime, ARRAY, Text, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 
@@ -99,6 +99,9 @@ class User(Base):
     last_login_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
     last_login_platform: Mapped[Optional[str]] = mapped_column(String(20))
 
+    # Maintained by triggers on notifications, see app.models.notification
+    unread_notifications: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, onupdate=datetime.utcnow)
 
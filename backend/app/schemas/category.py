@@ -45,6 +45,7 @@ class CategoryResponse(BaseSchema):
     max_transfer_days: Optional[int] = None
     icon: Optional[str] = None
     color: Optional[str] = None
+    depth: int = 0
     created_at: datetime
 
 
@@ -1,8 +1,8 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from .common import BaseSchema
 from .equipment import EquipmentListResponse, UserBasic, LocationBasic
@@ -33,6 +33,44 @@ class CheckoutExtend(BaseModel):
     reason: Optional[str] = None
 
 
+# Equipment per batch request
+MAX_BATCH_SIZE = 200
+
+
+class CheckoutBatchItems(BaseModel):
+    equipment_ids: List[UUID] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+    # Scanned tag values or RFID UIDs
+    tag_values: List[str] = Field(default_factory=list, max_length=MAX_BATCH_SIZE)
+
+
+class CheckoutBatchCreate(CheckoutBatchItems):
+    user_id: Optional[UUID] = None  # If not provided, use current user
+    location_id: Optional[UUID] = None
+    expected_return_at: Optional[datetime] = None
+    condition: Optional[str] = None
+    notes: Optional[str] = None
+    gps_lat: Optional[Decimal] = None
+    gps_lng: Optional[Decimal] = None
+
+
+class CheckoutBatchReturn(CheckoutBatchItems, CheckoutReturn):
+    pass
+
+
+class CheckoutBatchItemResult(BaseModel):
+    equipment_id: Optional[UUID] = None
+    tag_value: Optional[str] = None
+    status: str  # checked_out, returned, error
+    checkout_id: Optional[UUID] = None
+    detail: Optional[str] = None
+
+
+class CheckoutBatchResponse(BaseModel):
+    items: List[CheckoutBatchItemResult]
+    succeeded: int
+    failed: int
+
+
 class CheckoutResponse(BaseSchema):
     id: UUID
     equipment_id: UUID
@@ -90,6 +90,10 @@ class EquipmentPhotoResponse(BaseSchema):
     photo_type: str
     file_url: str
     thumbnail_url: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    file_size_bytes: Optional[int] = None
+    blob_sha256: Optional[str] = None
     description: Optional[str] = None
     sort_order: int
 
@@ -99,6 +103,10 @@ class EquipmentPhotoCreate(BaseModel):
     description: Optional[str] = None
 
 
+class EquipmentPhotoByHash(EquipmentPhotoCreate):
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")
+
+
 class EquipmentTagResponse(BaseSchema):
     id: UUID
     tag_type: str
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from .common import BaseSchema
+
+
+class JobCreate(BaseModel):
+    name: str
+    payload: dict = Field(default_factory=dict)
+    delay_seconds: int = Field(0, ge=0)
+
+
+class JobResponse(BaseSchema):
+    id: UUID
+    name: str
+    payload: dict
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    result: Optional[dict] = None
+    last_error: Optional[str] = None
+    created_by: Optional[UUID] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -46,10 +46,13 @@ class LocationResponse(BaseSchema):
     parent_location_id: Optional[UUID] = None
     responsible_user_id: Optional[UUID] = None
     is_active: bool
+    depth: int = 0
     created_at: datetime
 
 
 class LocationTree(LocationResponse):
+    # Only with with_counts; includes the locations below
+    equipment_count: Optional[int] = None
     children: List["LocationTree"] = []
 
 
@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 from uuid import UUID
 
+from pydantic import BaseModel, Field
+
 from .common import BaseSchema
 
 
@@ -15,3 +17,12 @@ class NotificationResponse(BaseSchema):
     is_read: bool
     read_at: Optional[datetime] = None
     created_at: datetime
+
+
+class NotificationBulkAction(BaseModel):
+    action: str = Field(..., pattern="^(read|delete)$")
+    # Filters are combined; at least one is required
+    ids: Optional[List[UUID]] = Field(None, max_length=1000)
+    type: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
@@ -2,7 +2,7 @@ from datetime import datetime, date
 from decimal import Decimal
 from typing import Optional, List
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class OnboardingStart(BaseModel):
@@ -33,6 +33,10 @@ class OnboardingPhotoUpload(BaseModel):
     description: Optional[str] = None
 
 
+class OnboardingPhotoByHash(OnboardingPhotoUpload):
+    sha256: str = Field(..., pattern=r"^[0-9a-fA-F]{64}$")
+
+
 class OnboardingPhotoResponse(BaseModel):
     photo_id: UUID
     url: str
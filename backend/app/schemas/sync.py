@@ -0,0 +1,36 @@
+from typing import Optional, List, Dict
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+
+class SyncPullResponse(BaseModel):
+    token: str  # pass as ?since= on the next pull
+    reset: bool  # full snapshot: drop local rows that were not sent
+    changes: Dict[str, List[dict]]
+    deleted: Dict[str, List[str]]
+
+
+class SyncOperation(BaseModel):
+    op_id: str  # client-side id, echoed in the result
+    entity: str  # equipment, checkouts
+    action: str  # update, create, return, extend
+    id: Optional[UUID] = None
+    base_version: Optional[int] = None  # sync_version the change was made against
+    data: dict = {}
+
+
+class SyncPushRequest(BaseModel):
+    operations: List[SyncOperation] = Field(..., max_length=500)
+
+
+class SyncOperationResult(BaseModel):
+    op_id: str
+    status: str  # applied, conflict, error
+    id: Optional[UUID] = None
+    sync_version: Optional[int] = None
+    detail: Optional[str] = None
+    current: Optional[dict] = None  # server row on conflict
+
+
+class SyncPushResponse(BaseModel):
+    results: List[SyncOperationResult]
@@ -71,6 +71,20 @@ class TransferRequestResponse(BaseSchema):
     offers: List[TransferOfferResponse] = []
 
 
+class MatchedTransferRequestResponse(TransferRequestResponse):
+    """A broadcast request the current user could fulfil"""
+    equipment_count: int
+    distance_km: Optional[float] = None
+
+
+class TransferMatchResponse(BaseSchema):
+    user_id: UUID
+    user: Optional[UserBasic] = None
+    equipment_count: int
+    distance_km: Optional[float] = None
+    matched_at: datetime
+
+
 class TransferConfirmation(BaseModel):
     condition: Optional[str] = None
     photo_url: Optional[str] = None
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from pydantic import BaseModel, Field
+
+from .common import BaseSchema
+
+
+class UploadCreate(BaseModel):
+    purpose: str  # equipment_photo, onboarding_photo, calibration_certificate
+    target_id: UUID  # equipment, onboarding session or calibration id
+    filename: Optional[str] = None
+    content_type: str
+    total_size: int = Field(gt=0)
+    checksum_sha256: Optional[str] = Field(default=None, pattern="^[0-9a-fA-F]{64}$")
+    photo_type: Optional[str] = None
+    description: Optional[str] = None
+
+
+class UploadSessionResponse(BaseSchema):
+    id: UUID
+    purpose: str
+    target_id: UUID
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    total_size: int
+    received_size: int
+    status: str
+    expires_at: datetime
+    max_chunk_size: int = 0
+    result: Optional[dict] = None
+
+
+class DirectUploadResponse(UploadSessionResponse):
+    """Upload session for a file the client PUTs straight to object storage"""
+    upload_url: Optional[str] = None
+    upload_method: str = "PUT"
+    upload_headers: dict = {}
+    url_expires_at: Optional[datetime] = None
+
+
+class PresignedUrlResponse(BaseModel):
+    url: str
+    method: str = "GET"
+    expires_at: datetime
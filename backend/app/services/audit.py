@@ -0,0 +1,278 @@
+"""Audit trail written off the request path.
+
+Changes to audited models are captured from attribute history when the
+session flushes, held on the session until its transaction commits, and
+then put on an in-memory queue. A background task writes the queue in
+multi-row INSERTs, so an audited request pays for a few dict copies
+rather than an extra write and its index maintenance.
+
+The queue is bounded. When it is full new entries are dropped and
+counted, and the count is itself written to the audit log as an
+audit.dropped entry, so losses are visible rather than silent.
+"""
+import asyncio
+import logging
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.audit import AuditLog
+from app.models.checkout import Checkout
+from app.models.equipment import Equipment
+from app.models.transfer import TransferRequest, TransferOffer, Transfer
+
+logger = logging.getLogger(__name__)
+
+AUDITED_MODELS = {
+    Equipment: "equipment",
+    Checkout: "checkout",
+    TransferRequest: "transfer_request",
+    TransferOffer: "transfer_offer",
+    Transfer: "transfer",
+}
+
+# Maintained by the database or by onupdate hooks; not worth a diff
+IGNORED_COLUMNS = {"sync_version", "created_at", "updated_at"}
+
+
+@dataclass
+class AuditContext:
+    user_id: Optional[uuid.UUID] = None
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    platform: Optional[str] = None
+
+
+_context: ContextVar[Optional[AuditContext]] = ContextVar("audit_context", default=None)
+
+_queue: Optional[asyncio.Queue] = None
+_writer: Optional[asyncio.Task] = None
+# Entries taken off the queue and not yet written
+_batch: List[dict] = []
+_dropped = 0
+
+
+class AuditContextMiddleware:
+    """Starts an AuditContext for each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        client = scope.get("client")
+        token = _context.set(AuditContext(
+            ip_address=client[0][:45] if client else None,
+            user_agent=headers.get("user-agent"),
+            platform=headers.get("x-platform", "")[:20] or None,
+        ))
+        try:
+            if scope["method"] not in ("GET", "HEAD", "OPTIONS"):
+                await _wait_for_capacity()
+            await self.app(scope, receive, send)
+        finally:
+            _context.reset(token)
+
+
+async def _wait_for_capacity() -> None:
+    """Hold back writes briefly while the queue is nearly full.
+
+    Past AUDIT_BACKPRESSURE_SECONDS the request goes ahead, and if the
+    queue is still full its entries are dropped and counted.
+    """
+    if _queue is None or _queue.qsize() < _queue.maxsize * 0.9:
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.AUDIT_BACKPRESSURE_SECONDS
+    while _queue.qsize() >= _queue.maxsize * 0.9 and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+
+
+def set_user(user_id: uuid.UUID) -> None:
+    """Attribute audit entries of the current request to a user"""
+    context = _context.get()
+    if context is not None:
+        # Mutated in place so the value reaches tasks that copied the context earlier
+        context.user_id = user_id
+
+
+def _entry(action: str, entity_type: Optional[str], entity_id, old_values, new_values) -> dict:
+    context = _context.get() or AuditContext()
+    return {
+        "id": uuid.uuid4(),
+        "user_id": context.user_id,
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "old_values": old_values,
+        "new_values": new_values,
+        "ip_address": context.ip_address,
+        "user_agent": context.user_agent,
+        "platform": context.platform,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def _enqueue(entries: List[dict]) -> None:
+    global _dropped
+    if _queue is None:
+        return
+    for entry in entries:
+        try:
+            _queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            _dropped += 1
+
+
+def record(
+    action: str,
+    entity_type: Optional[str] = None,
+    entity_id: Optional[uuid.UUID] = None,
+    old_values: Optional[dict] = None,
+    new_values: Optional[dict] = None,
+) -> None:
+    """Queue an audit entry for an event that is not a model change"""
+    _enqueue([_entry(action, entity_type, entity_id, old_values, new_values)])
+
+
+def _changes(obj, operation: str):
+    state = inspect(obj)
+    old_values = {}
+    new_values = {}
+    for attr in state.mapper.column_attrs:
+        if attr.key in IGNORED_COLUMNS:
+            continue
+        # Read from the state dict; getattr could load expired columns mid-flush
+        if operation == "create":
+            new_values[attr.key] = state.dict.get(attr.key)
+        elif operation == "delete":
+            old_values[attr.key] = state.dict.get(attr.key)
+        else:
+            history = state.attrs[attr.key].history
+            if not history.has_changes():
+                continue
+            old_values[attr.key] = history.deleted[0] if history.deleted else None
+            new_values[attr.key] = history.added[0] if history.added else None
+    return jsonable_encoder(old_values) or None, jsonable_encoder(new_values) or None
+
+
+@event.listens_for(Session, "after_flush")
+def _capture_changes(session: Session, flush_context) -> None:
+    # Attribute history still holds the pre-flush values at this point
+    transaction = session.get_nested_transaction() or session.get_transaction()
+    pending = session.info.setdefault("audit_pending", [])
+    for operation, objects in (
+        ("create", session.new),
+        ("update", session.dirty),
+        ("delete", session.deleted),
+    ):
+        for obj in objects:
+            entity_type = AUDITED_MODELS.get(type(obj))
+            if not entity_type:
+                continue
+            old_values, new_values = _changes(obj, operation)
+            if operation == "update" and not new_values:
+                continue
+            pending.append((
+                transaction,
+                _entry(f"{entity_type}.{operation}", entity_type, obj.id, old_values, new_values),
+            ))
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_committed(session: Session) -> None:
+    pending = session.info.pop("audit_pending", None)
+    if pending:
+        _enqueue([entry for _, entry in pending])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction) -> None:
+    pending = session.info.get("audit_pending")
+    if not pending:
+        return
+
+    def rolled_back(transaction) -> bool:
+        while transaction is not None:
+            if transaction is previous_transaction:
+                return True
+            transaction = transaction.parent
+        return False
+
+    session.info["audit_pending"] = [item for item in pending if not rolled_back(item[0])]
+
+
+async def _write(entries: List[dict]) -> None:
+    async with async_session_factory() as db:
+        # executemany is sent as multi-row INSERT ... VALUES batches
+        await db.execute(insert(AuditLog), entries)
+        await db.commit()
+
+
+async def _collect_batch() -> None:
+    _batch.append(await _queue.get())
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.AUDIT_FLUSH_SECONDS
+    while len(_batch) < settings.AUDIT_BATCH_SIZE:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            _batch.append(await asyncio.wait_for(_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+
+
+async def _flush() -> None:
+    global _dropped
+    if _dropped:
+        _batch.append(_entry("audit.dropped", None, None, None, {"count": _dropped}))
+        _dropped = 0
+
+    for attempt in range(settings.AUDIT_WRITE_ATTEMPTS):
+        try:
+            await _write(_batch)
+            _batch.clear()
+            return
+        except Exception:
+            logger.exception("Writing %d audit entries failed", len(_batch))
+            await asyncio.sleep(2 ** attempt)
+    _dropped += len(_batch)
+    _batch.clear()
+
+
+async def _run() -> None:
+    while True:
+        await _collect_batch()
+        await _flush()
+
+
+def start() -> None:
+    global _queue, _writer
+    _queue = asyncio.Queue(maxsize=settings.AUDIT_QUEUE_SIZE)
+    _writer = asyncio.create_task(_run(), name="audit:writer")
+
+
+async def stop() -> None:
+    """Stop the writer and write out whatever is still queued"""
+    global _writer
+    if _writer:
+        _writer.cancel()
+        await asyncio.gather(_writer, return_exceptions=True)
+        _writer = None
+
+    while _queue is not None and not _queue.empty():
+        _batch.append(_queue.get_nowait())
+    if _batch or _dropped:
+        await _flush()
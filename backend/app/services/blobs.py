@@ -0,0 +1,304 @@
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import select, update, delete, func, literal_column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.database import async_session_factory
+from app.models.blob import StoredBlob
+from app.models.equipment import EquipmentPhoto
+from app.services import images
+from app.services.jobs import enqueue, periodic, task
+from app.services.storage import SpooledUpload, get_storage, file_extension, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Unreferenced blobs are kept this long so that an in-flight upload of the
+# same bytes can still pick them up
+BLOB_GRACE_PERIOD = timedelta(hours=1)
+# Onboarding sessions hold references without an EquipmentPhoto row; only
+# blobs untouched for longer than any session lives get their count rebuilt
+REF_COUNT_RECONCILE_AGE = timedelta(days=1)
+
+
+def blob_key(sha256: str, content_type: Optional[str]) -> str:
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{file_extension(None, content_type)}"
+
+
+def thumbnail_key(sha256: str) -> str:
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}_thumb.webp"
+
+
+async def _upsert_blob(
+    db: AsyncSession,
+    sha256: str,
+    size: int,
+    content_type: Optional[str],
+    verified: bool,
+) -> Tuple[StoredBlob, bool]:
+    """Insert or reference a blob row; the row stays locked until the caller commits"""
+    now = datetime.utcnow()
+    stmt = (
+        pg_insert(StoredBlob)
+        .values(
+            sha256=sha256,
+            size_bytes=size,
+            content_type=content_type,
+            storage_key=blob_key(sha256, content_type),
+            ref_count=1,
+            verified=verified,
+            last_referenced_at=now,
+            created_at=now,
+        )
+        .on_conflict_do_update(
+            index_elements=[StoredBlob.sha256],
+            set_={
+                "ref_count": StoredBlob.ref_count + 1,
+                "last_referenced_at": now,
+            },
+        )
+        .returning(literal_column("(xmax = 0)").label("inserted"))
+    )
+    created = bool((await db.execute(stmt)).scalar_one())
+
+    blob = (await db.execute(
+        select(StoredBlob)
+        .where(StoredBlob.sha256 == sha256)
+        .execution_options(populate_existing=True)
+    )).scalar_one()
+    return blob, created
+
+
+async def acquire_blob(db: AsyncSession, upload: SpooledUpload) -> Tuple[StoredBlob, bool]:
+    """Take a reference on the blob for upload's bytes, storing them if needed.
+
+    Returns the blob and whether this call stored the bytes: for a new blob,
+    or over an unverified direct upload, whose object may not match its
+    hash. The upsert keeps the blob row locked until the caller commits, so
+    a concurrent upload of the same bytes waits and then reuses the stored
+    object.
+    """
+    blob, created = await _upsert_blob(db, upload.sha256, upload.size, upload.content_type, verified=True)
+    if created or not blob.verified:
+        await get_storage().put_file(blob.storage_key, upload.path, upload.content_type)
+        blob.verified = True
+        return blob, True
+    return blob, False
+
+
+async def acquire_staged_blob(
+    db: AsyncSession,
+    sha256: str,
+    size: int,
+    content_type: Optional[str],
+    staged_key: str,
+) -> Tuple[StoredBlob, bool]:
+    """Same as acquire_blob for an object a client has PUT to staged_key.
+
+    The object is checked against the declared hash by a verify_blob job
+    that commits with the reference. A duplicate of a verified blob is
+    discarded; a duplicate of an unverified one is kept and verified on its
+    own, to replace the blob's object if that one turns out not to match.
+    """
+    storage = get_storage()
+    sha256 = sha256.lower()
+    blob, created = await _upsert_blob(db, sha256, size, content_type, verified=False)
+    if created:
+        await storage.move(staged_key, blob.storage_key)
+        await enqueue(db, "blobs.verify", {"sha256": sha256})
+    elif blob.verified:
+        await storage.delete(staged_key)
+    else:
+        await enqueue(db, "blobs.verify", {"sha256": sha256, "staged_key": staged_key})
+    return blob, created
+
+
+async def add_reference(db: AsyncSession, sha256: str) -> Optional[StoredBlob]:
+    """Take a reference on an existing verified blob (metadata-only upload)"""
+    result = await db.execute(
+        update(StoredBlob)
+        .where(StoredBlob.sha256 == sha256.lower(), StoredBlob.verified.is_(True))
+        .values(ref_count=StoredBlob.ref_count + 1, last_referenced_at=datetime.utcnow())
+        .returning(StoredBlob.sha256)
+    )
+    if result.scalar_one_or_none() is None:
+        return None
+    return (await db.execute(
+        select(StoredBlob)
+        .where(StoredBlob.sha256 == sha256.lower())
+        .execution_options(populate_existing=True)
+    )).scalar_one()
+
+
+async def release_blob(db: AsyncSession, sha256: str) -> int:
+    """Drop a reference; returns the remaining count. Caller commits, then reclaims at zero"""
+    result = await db.execute(
+        update(StoredBlob)
+        .where(StoredBlob.sha256 == sha256)
+        .values(
+            ref_count=func.greatest(StoredBlob.ref_count - 1, 0),
+            last_referenced_at=datetime.utcnow(),
+        )
+        .returning(StoredBlob.ref_count)
+    )
+    remaining = result.scalar_one_or_none()
+    return remaining if remaining is not None else 0
+
+
+async def reclaim_blobs(sha256s: Optional[Iterable[str]] = None, older_than: Optional[datetime] = None) -> int:
+    """Delete unreferenced blobs and their objects from storage.
+
+    Rows are locked while their objects are deleted; an upload of the same
+    bytes that arrives meanwhile waits on the lock and then stores a fresh
+    copy instead of referencing a deleted object.
+    """
+    storage = get_storage()
+    async with async_session_factory() as db:
+        query = select(StoredBlob).where(StoredBlob.ref_count == 0)
+        if sha256s is not None:
+            query = query.where(StoredBlob.sha256.in_(list(sha256s)))
+        if older_than is not None:
+            query = query.where(StoredBlob.last_referenced_at < older_than)
+        blobs = (await db.execute(query.with_for_update(skip_locked=True))).scalars().all()
+
+        for blob in blobs:
+            for key in (blob.storage_key, blob.thumbnail_key):
+                if key:
+                    await storage.delete(key)
+
+        if blobs:
+            await db.execute(
+                delete(StoredBlob).where(StoredBlob.sha256.in_([b.sha256 for b in blobs]))
+            )
+        await db.commit()
+        return len(blobs)
+
+
+async def process_blob_thumbnail(sha256: str, upload: SpooledUpload) -> None:
+    """Background task: render a new blob's thumbnail and copy it to every photo using the blob"""
+    storage = get_storage()
+    key = thumbnail_key(sha256)
+    try:
+        derivatives = await images.render_derivatives(upload.path)
+    except Exception:
+        logger.exception("Thumbnail generation failed for blob %s", sha256)
+        return
+    finally:
+        upload.cleanup()
+
+    try:
+        await storage.put_file(key, derivatives.thumbnail_path, "image/webp")
+    finally:
+        derivatives.cleanup()
+
+    async with async_session_factory() as db:
+        await db.execute(
+            update(StoredBlob)
+            .where(StoredBlob.sha256 == sha256)
+            .values(thumbnail_key=key, width=derivatives.width, height=derivatives.height)
+        )
+        await db.execute(
+            update(EquipmentPhoto)
+            .where(EquipmentPhoto.blob_sha256 == sha256)
+            .values(
+                thumbnail_url=storage.url(key),
+                width=derivatives.width,
+                height=derivatives.height,
+            )
+        )
+        await db.commit()
+
+
+@task("blobs.verify", concurrency=2)
+async def verify_blob(sha256: str, staged_key: Optional[str] = None) -> dict:
+    """Job for directly uploaded blobs: check the bytes match the
+    declared hash, then render the thumbnail.
+
+    Checks the blob's own object, or with staged_key a later direct upload
+    of the same hash that may replace it. Bytes that do not match are
+    deleted; photos keep pointing at the blob, and the next upload of the
+    real bytes stores them for everyone.
+    """
+    storage = get_storage()
+    async with async_session_factory() as db:
+        blob = (await db.execute(
+            select(StoredBlob).where(StoredBlob.sha256 == sha256)
+        )).scalar_one_or_none()
+    if not blob or (blob.verified and not staged_key):
+        if staged_key:
+            await storage.delete(staged_key)
+        return {"verified": bool(blob and blob.verified)}
+
+    key = staged_key or blob.storage_key
+    fd, path = tempfile.mkstemp(prefix="blob_")
+    os.close(fd)
+    try:
+        await storage.get_file(key, path)
+        actual = await run_in_threadpool(file_sha256, path)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    async with async_session_factory() as db:
+        # Locked against an upload of the same bytes storing them meanwhile
+        blob = (await db.execute(
+            select(StoredBlob).where(StoredBlob.sha256 == sha256).with_for_update()
+        )).scalar_one_or_none()
+        if blob and not blob.verified and actual == sha256:
+            if staged_key:
+                await storage.move(staged_key, blob.storage_key)
+            blob.verified = True
+        elif staged_key:
+            await storage.delete(staged_key)
+        elif blob and not blob.verified:
+            logger.warning("Direct upload for blob %s has hash %s, discarding", sha256, actual)
+            await storage.delete(blob.storage_key)
+        verified = bool(blob and blob.verified)
+        render = verified and actual == sha256 and not blob.thumbnail_key
+        await db.commit()
+
+    if not render:
+        os.unlink(path)
+        return {"verified": verified}
+
+    upload = SpooledUpload(
+        path=path,
+        size=blob.size_bytes,
+        content_type=blob.content_type,
+        filename=None,
+        sha256=sha256,
+    )
+    await process_blob_thumbnail(sha256, upload)
+    return {"verified": True}
+
+
+@periodic("blobs.collect_garbage", interval_seconds=6 * 3600)
+async def collect_blob_garbage() -> dict:
+    """Rebuild stale reference counts from equipment_photos and reclaim unreferenced blobs"""
+    now = datetime.utcnow()
+    async with async_session_factory() as db:
+        counts = (
+            select(StoredBlob.sha256, func.count(EquipmentPhoto.id).label("refs"))
+            .outerjoin(EquipmentPhoto, EquipmentPhoto.blob_sha256 == StoredBlob.sha256)
+            .where(StoredBlob.last_referenced_at < now - REF_COUNT_RECONCILE_AGE)
+            .group_by(StoredBlob.sha256)
+            .subquery()
+        )
+        result = await db.execute(
+            update(StoredBlob)
+            .where(
+                StoredBlob.sha256 == counts.c.sha256,
+                StoredBlob.ref_count != counts.c.refs,
+            )
+            .values(ref_count=counts.c.refs)
+        )
+        reconciled = result.rowcount
+        await db.commit()
+
+    reclaimed = await reclaim_blobs(older_than=now - BLOB_GRACE_PERIOD)
+    return {"reconciled": reconciled, "reclaimed": reclaimed}
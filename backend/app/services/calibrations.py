@@ -0,0 +1,191 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update, case, text
+
+from app.core.database import async_session_factory
+from app.models.equipment import Equipment
+from app.models.system import SystemSetting
+from app.services.notifications import NotificationEvent, enqueue_notify
+from app.services.jobs import periodic
+
+EXPIRING_WITHIN_DAYS = 30
+STATUS_RUN_KEY = "calibration_status_last_run"
+
+
+def calibration_status(requires_calibration: bool, next_calibration_date: Optional[date]) -> str:
+    today = date.today()
+    if not requires_calibration:
+        return "not_required"
+    if next_calibration_date is None or next_calibration_date < today:
+        return "expired"
+    if next_calibration_date <= today + timedelta(days=EXPIRING_WITHIN_DAYS):
+        return "expiring"
+    return "valid"
+
+
+def calibration_status_case(today: date):
+    """calibration_status() as a SQL expression over equipment"""
+    return case(
+        (Equipment.requires_calibration == False, "not_required"),
+        (Equipment.next_calibration_date.is_(None), "expired"),
+        (Equipment.next_calibration_date < today, "expired"),
+        (Equipment.next_calibration_date <= today + timedelta(days=EXPIRING_WITHIN_DAYS), "expiring"),
+        else_="valid",
+    )
+
+
+@periodic("calibrations.refresh_status", interval_seconds=3600)
+async def refresh_calibration_status() -> dict:
+    """Bring equipment.calibration_status up to date with the calendar.
+
+    Only rows whose status actually changes are written, so runs other
+    than the first after midnight update nothing.
+    """
+    status_case = calibration_status_case(date.today())
+    async with async_session_factory() as db:
+        result = await db.execute(
+            update(Equipment)
+            .where(Equipment.calibration_status.is_distinct_from(status_case))
+            .values(calibration_status=status_case, version=Equipment.version + 1)
+            .returning(Equipment.calibration_status)
+            .execution_options(synchronize_session=False)
+        )
+        changed = dict(Counter(row[0] for row in result.fetchall()))
+
+        setting = (await db.execute(
+            select(SystemSetting).where(SystemSetting.key == STATUS_RUN_KEY)
+        )).scalar_one_or_none()
+        if not setting:
+            setting = SystemSetting(
+                key=STATUS_RUN_KEY,
+                description="Last calibration status refresh and the rows it changed, by new status"
+            )
+            db.add(setting)
+        setting.value = {"ran_at": datetime.utcnow().isoformat(), "changed": changed}
+        await db.commit()
+        return {"changed": changed}
+
+# One statement for the whole fleet:
+# - settings: the most specific active setting per equipment
+#   (equipment, then category, then global);
+# - due: the tightest threshold reached, e.g. 10 days left with
+#   days_before [30, 14, 7, 1] gives 14_days, or expired;
+# - recipients: holder, the holder's manager and notify_users;
+# - the ledger insert keeps only reminders not sent before for the same
+#   calibration cycle, so reruns and overlapping workers are harmless.
+SEND_REMINDERS = text("""
+WITH settings AS (
+    SELECT DISTINCT ON (e.id)
+        e.id AS equipment_id,
+        e.current_holder_id,
+        e.next_calibration_date - CAST(:today AS date) AS days_left,
+        s.days_before,
+        s.notify_holder,
+        s.notify_manager,
+        s.notify_users,
+        concat_ws(',',
+            CASE WHEN s.notify_in_app THEN 'in_app' END,
+            CASE WHEN s.notify_push THEN 'push' END,
+            CASE WHEN s.notify_email THEN 'email' END
+        ) AS sent_via
+    FROM equipment e
+    JOIN calibration_reminder_settings s ON s.is_active AND (
+        (s.scope_type = 'equipment' AND s.equipment_id = e.id)
+        OR (s.scope_type = 'category' AND s.category_id = e.category_id)
+        OR s.scope_type = 'global'
+    )
+    WHERE e.requires_calibration
+      AND e.status != 'retired'
+      AND e.next_calibration_date <= CAST(:today AS date) + (
+          SELECT coalesce(max(d), 0) FROM calibration_reminder_settings, unnest(days_before) d WHERE is_active
+      )
+    ORDER BY e.id, CASE s.scope_type WHEN 'equipment' THEN 0 WHEN 'category' THEN 1 ELSE 2 END
+),
+due AS (
+    SELECT st.*,
+        CASE
+            WHEN st.days_left < 0 THEN 'expired'
+            ELSE (SELECT CASE min(d) WHEN 1 THEN '1_day' ELSE min(d) || '_days' END
+                  FROM unnest(st.days_before) d WHERE d >= st.days_left HAVING min(d) IS NOT NULL)
+        END AS reminder_type
+    FROM settings st
+),
+cycles AS (
+    SELECT DISTINCT ON (c.equipment_id) c.equipment_id, c.id AS calibration_id
+    FROM calibrations c
+    JOIN due ON due.equipment_id = c.equipment_id
+    ORDER BY c.equipment_id, c.calibration_date DESC, c.created_at DESC
+),
+recipients AS (
+    SELECT DISTINCT due.equipment_id, cycles.calibration_id, due.reminder_type, due.sent_via, r.user_id
+    FROM due
+    LEFT JOIN cycles ON cycles.equipment_id = due.equipment_id
+    CROSS JOIN LATERAL (
+        SELECT due.current_holder_id AS user_id WHERE due.notify_holder
+        UNION ALL
+        SELECT u.manager_id FROM users u WHERE due.notify_manager AND u.id = due.current_holder_id
+        UNION ALL
+        SELECT unnest(due.notify_users)
+    ) r
+    WHERE due.reminder_type IS NOT NULL AND r.user_id IS NOT NULL
+),
+sent AS (
+    INSERT INTO calibration_reminders_sent
+        (id, equipment_id, calibration_id, reminder_type, sent_to, sent_via, sent_at)
+    SELECT gen_random_uuid(), equipment_id, calibration_id, reminder_type, user_id, sent_via,
+           now() AT TIME ZONE 'utc'
+    FROM recipients
+    ON CONFLICT (equipment_id, calibration_id, reminder_type, sent_to) DO NOTHING
+    RETURNING equipment_id, reminder_type, sent_to, sent_via
+)
+SELECT sent.equipment_id, sent.reminder_type, sent.sent_to, sent.sent_via,
+       e.name, e.internal_code, e.next_calibration_date
+FROM sent
+JOIN equipment e ON e.id = sent.equipment_id
+""")
+
+
+def reminder_title(name: str, code: str, reminder_type: str, due_date: date) -> str:
+    label = f"{name} ({code})" if code else name
+    if reminder_type == "expired":
+        return f"Calibration of {label} expired on {due_date.isoformat()}"
+    return f"Calibration of {label} is due on {due_date.isoformat()}"
+
+
+@periodic("calibrations.send_reminders", interval_seconds=3600)
+async def send_calibration_reminders() -> dict:
+    async with async_session_factory() as db:
+        rows = (await db.execute(SEND_REMINDERS, {"today": date.today()})).fetchall()
+        # Queued with the ledger rows, so a reminder is sent exactly when
+        # it is recorded as sent
+        await enqueue_notify(db, _reminder_events(rows))
+        await db.commit()
+    return {"reminders": len(rows)}
+
+
+def _reminder_events(rows) -> list:
+    # Recipients of the same reminder share one event
+    events = {}
+    recipients = defaultdict(list)
+    for equipment_id, reminder_type, user_id, sent_via, name, code, due_date in rows:
+        key = (equipment_id, reminder_type)
+        recipients[key].append(user_id)
+        if key not in events:
+            channels = set((sent_via or "").split(","))
+            events[key] = NotificationEvent(
+                type="calibration_expired" if reminder_type == "expired" else "calibration_reminder",
+                title=reminder_title(name, code, reminder_type, due_date),
+                recipients=recipients[key],
+                entity_type="equipment",
+                entity_id=equipment_id,
+                # Push rides on the in-app row through /events
+                channels=tuple(
+                    channel for channel in ("in_app", "email")
+                    if channel in channels or (channel == "in_app" and "push" in channels)
+                ),
+                digest_key="calibration",
+                digest_title="{count} instruments need calibration",
+            )
+    return list(events.values())
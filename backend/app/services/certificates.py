@@ -0,0 +1,60 @@
+import uuid as uuid_module
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.calibration import Calibration
+from app.services.storage import SpooledUpload, get_storage, file_extension, key_from_url
+
+
+def certificate_key(calibration: Calibration, filename: Optional[str], content_type: Optional[str]) -> str:
+    return f"calibrations/{calibration.id}/{uuid_module.uuid4()}{file_extension(filename, content_type)}"
+
+
+def replace_certificate(calibration: Calibration, key: str) -> Optional[str]:
+    """Point a calibration at a stored certificate; returns the previous
+    certificate's key, to be deleted once the caller has committed"""
+    previous_key = key_from_url(calibration.certificate_url)
+    calibration.certificate_url = get_storage().url(key)
+    return previous_key
+
+
+async def delete_previous_certificate(previous_key: Optional[str]) -> None:
+    if previous_key:
+        await get_storage().delete(previous_key)
+
+
+async def store_certificate(calibration: Calibration, upload: SpooledUpload) -> str:
+    """Put a spooled certificate file into storage and return its key"""
+    key = certificate_key(calibration, upload.filename, upload.content_type)
+    try:
+        await get_storage().put_file(key, upload.path, upload.content_type)
+    finally:
+        upload.cleanup()
+    return key
+
+
+async def store_staged_certificate(
+    calibration: Calibration,
+    staged_key: str,
+    filename: Optional[str],
+    content_type: Optional[str],
+) -> str:
+    """Same as store_certificate for a file a client uploaded directly to storage"""
+    key = certificate_key(calibration, filename, content_type)
+    await get_storage().move(staged_key, key)
+    return key
+
+
+async def save_calibration_certificate(
+    db: AsyncSession,
+    calibration: Calibration,
+    upload: SpooledUpload,
+) -> str:
+    """Store a certificate file, replacing any previous one, and return its URL"""
+    key = await store_certificate(calibration, upload)
+    previous_key = replace_certificate(calibration, key)
+    await db.commit()
+
+    await delete_previous_certificate(previous_key)
+    return calibration.certificate_url
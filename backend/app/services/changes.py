@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, tuple_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.change_log import ChangeLog, ChangeLogConsumer
+from app.services.jobs import periodic
+
+logger = logging.getLogger(__name__)
+
+# (version, seq) of the last entry seen
+Position = Tuple[int, int]
+
+
+@dataclass
+class ChangeConsumer:
+    name: str
+    func: Callable[[List[ChangeLog]], Awaitable[None]]
+    tables: Optional[List[str]]
+    # Shared consumers keep their position in change_log_consumers and run in
+    # one worker at a time; local ones run in every process from startup
+    shared: bool
+
+
+_consumers: Dict[str, ChangeConsumer] = {}
+_running: List[asyncio.Task] = []
+
+
+def consumer(name: str, tables: Optional[Iterable[str]] = None, shared: bool = True):
+    """Register a coroutine function called with each new batch of changes"""
+    def decorator(func: Callable[[List[ChangeLog]], Awaitable[None]]):
+        _consumers[name] = ChangeConsumer(
+            name=name,
+            func=func,
+            tables=list(tables) if tables else None,
+            shared=shared,
+        )
+        return func
+    return decorator
+
+
+async def head_position(db: AsyncSession) -> Position:
+    """Position just before the first change not yet committed"""
+    xmin = (await db.execute(
+        text("SELECT (pg_snapshot_xmin(pg_current_snapshot())::text)::bigint")
+    )).scalar_one()
+    return (xmin, 0)
+
+
+async def read_changes(
+    db: AsyncSession,
+    after: Position,
+    tables: Optional[List[str]] = None,
+    limit: int = 500,
+) -> List[ChangeLog]:
+    """Changes after a position, in (version, seq) order.
+
+    Only entries of transactions that had finished when the snapshot was
+    taken are returned. A transaction still running may have written
+    entries that sort earlier but are not yet visible; by holding those
+    back, no entry is ever skipped and each is delivered exactly once per
+    position.
+    """
+    xmin, _ = await head_position(db)
+    query = (
+        select(ChangeLog)
+        .where(
+            tuple_(ChangeLog.version, ChangeLog.seq) > tuple_(*after),
+            ChangeLog.version < xmin,
+        )
+        .order_by(ChangeLog.version, ChangeLog.seq)
+        .limit(limit)
+    )
+    if tables:
+        query = query.where(ChangeLog.table_name.in_(tables))
+    return list((await db.execute(query)).scalars().all())
+
+
+async def follow(
+    after: Optional[Position] = None,
+    tables: Optional[List[str]] = None,
+    limit: int = 500,
+) -> AsyncIterator[List[ChangeLog]]:
+    """Yield batches of changes as they are committed, from after or from now"""
+    async with async_session_factory() as db:
+        position = after or await head_position(db)
+        while True:
+            entries = await read_changes(db, position, tables, limit)
+            await db.commit()  # end the transaction so the next read sees new commits
+            if entries:
+                position = (entries[-1].version, entries[-1].seq)
+                yield entries
+            if len(entries) < limit:
+                await asyncio.sleep(settings.CHANGE_LOG_POLL_SECONDS)
+
+
+async def _consume_shared(consumer: ChangeConsumer) -> bool:
+    """Process one batch; returns whether a full batch was read"""
+    async with async_session_factory() as db:
+        await db.execute(
+            pg_insert(ChangeLogConsumer)
+            .values(name=consumer.name, position_version=(await head_position(db))[0], position_seq=0)
+            .on_conflict_do_nothing(index_elements=[ChangeLogConsumer.name])
+        )
+        await db.commit()
+
+        # Another worker holding the row is already processing this consumer
+        state = (await db.execute(
+            select(ChangeLogConsumer)
+            .where(ChangeLogConsumer.name == consumer.name)
+            .with_for_update(skip_locked=True)
+        )).scalar_one_or_none()
+        if not state:
+            return False
+
+        entries = await read_changes(
+            db, (state.position_version, state.position_seq), consumer.tables,
+            settings.CHANGE_LOG_BATCH_SIZE
+        )
+        if entries:
+            await consumer.func(entries)
+            state.position_version = entries[-1].version
+            state.position_seq = entries[-1].seq
+        await db.commit()
+        return len(entries) == settings.CHANGE_LOG_BATCH_SIZE
+
+
+async def _run(consumer: ChangeConsumer) -> None:
+    while True:
+        try:
+            if consumer.shared:
+                while await _consume_shared(consumer):
+                    pass
+                await asyncio.sleep(settings.CHANGE_LOG_POLL_SECONDS)
+            else:
+                async for entries in follow(tables=consumer.tables, limit=settings.CHANGE_LOG_BATCH_SIZE):
+                    await consumer.func(entries)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The batch is retried; shared consumers did not advance their position
+            logger.exception("Change consumer %s failed", consumer.name)
+            await asyncio.sleep(settings.CHANGE_LOG_POLL_SECONDS)
+
+
+def start() -> None:
+    for consumer in _consumers.values():
+        _running.append(asyncio.create_task(_run(consumer), name=f"changes:{consumer.name}"))
+
+
+async def stop() -> None:
+    for task in _running:
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+    _running.clear()
+
+
+@periodic("changes.prune", interval_seconds=3600)
+async def prune_change_log() -> dict:
+    cutoff = datetime.utcnow() - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS)
+    async with async_session_factory() as db:
+        result = await db.execute(delete(ChangeLog).where(ChangeLog.changed_at < cutoff))
+        await db.commit()
+        return {"pruned": result.rowcount}
@@ -0,0 +1,329 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, and_, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.core.database import async_session_factory
+from app.models.change_log import CURRENT_TXID
+from app.models.checkout import Checkout, OPEN_CHECKOUT_STATUSES
+from app.models.equipment import Equipment, EquipmentTag
+from app.models.user import User
+from app.schemas.checkout import (
+    CheckoutCreate,
+    CheckoutReturn,
+    CheckoutExtend,
+    CheckoutBatchItems,
+    CheckoutBatchCreate,
+    CheckoutBatchReturn,
+    CheckoutBatchItemResult,
+)
+from app.services.jobs import periodic
+from app.services.notifications import NotificationEvent, enqueue_notify
+
+# Checkouts flagged per statement
+OVERDUE_BATCH_SIZE = 1000
+
+# Flags one batch of active checkouts past their return date; rows locked
+# by a return in progress are left for the next run
+MARK_OVERDUE = text(f"""
+    WITH due AS (
+        SELECT id FROM checkouts
+        WHERE status = 'active' AND expected_return_at < :now
+        ORDER BY expected_return_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE checkouts c
+    SET status = 'overdue', version = c.version + 1, sync_version = {CURRENT_TXID.text}
+    FROM due, equipment e
+    WHERE c.id = due.id AND e.id = c.equipment_id
+    RETURNING c.id, c.user_id, e.name, c.expected_return_at
+""")
+
+
+async def get_checkout(db: AsyncSession, checkout_id: UUID) -> Checkout:
+    """Load a checkout with its equipment, both locked until the caller commits"""
+    result = await db.execute(
+        select(Checkout)
+        .options(joinedload(Checkout.equipment, innerjoin=True))
+        .where(Checkout.id == checkout_id)
+        .with_for_update()
+    )
+    checkout = result.scalar_one_or_none()
+
+    if not checkout:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Checkout not found"
+        )
+    return checkout
+
+
+async def checkout_equipment(
+    db: AsyncSession,
+    checkout_data: CheckoutCreate,
+    current_user: User,
+    checkout_id: Optional[UUID] = None,
+) -> Checkout:
+    """Check out equipment; the caller commits.
+
+    checkout_id lets offline clients create the row under the id they
+    already use locally.
+    """
+    # Locked, so a concurrent checkout of the same piece waits and then
+    # sees it checked out
+    eq_result = await db.execute(
+        select(Equipment).where(Equipment.id == checkout_data.equipment_id).with_for_update()
+    )
+    equipment = eq_result.scalar_one_or_none()
+
+    if not equipment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Equipment not found"
+        )
+
+    if equipment.status != "available":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Equipment is not available (status: {equipment.status})"
+        )
+
+    return new_checkout(db, equipment, checkout_data, current_user, checkout_id)
+
+
+def new_checkout(
+    db: AsyncSession,
+    equipment: Equipment,
+    checkout_data: CheckoutCreate,
+    current_user: User,
+    checkout_id: Optional[UUID] = None,
+) -> Checkout:
+    """Add the checkout of available, locked equipment"""
+    # Determine user
+    user_id = checkout_data.user_id or current_user.id
+
+    checkout = Checkout(
+        id=checkout_id or uuid.uuid4(),
+        equipment_id=equipment.id,
+        user_id=user_id,
+        location_id=checkout_data.location_id,
+        expected_return_at=checkout_data.expected_return_at,
+        checkout_condition=checkout_data.condition,
+        checkout_photo_url=checkout_data.photo_url,
+        checkout_notes=checkout_data.notes,
+        checkout_gps_lat=checkout_data.gps_lat,
+        checkout_gps_lng=checkout_data.gps_lng,
+        checked_out_by=current_user.id,
+        status="active"
+    )
+
+    db.add(checkout)
+
+    # Update equipment
+    equipment.status = "checked_out"
+    equipment.current_holder_id = user_id
+    if checkout_data.location_id:
+        equipment.current_location_id = checkout_data.location_id
+
+    return checkout
+
+
+def return_equipment(checkout: Checkout, return_data: CheckoutReturn, current_user: User) -> None:
+    """Close a checkout loaded with its equipment; the caller commits"""
+    close_checkout(checkout, checkout.equipment, return_data, current_user)
+
+
+def close_checkout(checkout: Checkout, equipment: Equipment, return_data: CheckoutReturn, current_user: User) -> None:
+    if checkout.status not in OPEN_CHECKOUT_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Checkout is not active"
+        )
+
+    # Update checkout
+    checkout.actual_return_at = datetime.utcnow()
+    checkout.return_condition = return_data.condition
+    checkout.return_photo_url = return_data.photo_url
+    checkout.return_notes = return_data.notes
+    checkout.return_gps_lat = return_data.gps_lat
+    checkout.return_gps_lng = return_data.gps_lng
+    checkout.checked_in_by = current_user.id
+    checkout.status = "returned"
+
+    # Update equipment
+    equipment.status = "available"
+    equipment.current_holder_id = None
+    if equipment.home_location_id:
+        equipment.current_location_id = equipment.home_location_id
+    if return_data.condition:
+        equipment.condition = return_data.condition
+
+
+def extend_return_date(checkout: Checkout, extend_data: CheckoutExtend) -> None:
+    if checkout.status not in OPEN_CHECKOUT_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Checkout is not active"
+        )
+
+    checkout.expected_return_at = extend_data.expected_return_at
+    if checkout.status == "overdue" and extend_data.expected_return_at > datetime.utcnow():
+        checkout.status = "active"
+
+
+def overdue(now: datetime):
+    """Checkouts past their return date, whether or not mark_overdue has flagged them yet"""
+    return and_(Checkout.status.in_(OPEN_CHECKOUT_STATUSES), Checkout.expected_return_at < now)
+
+
+async def resolve_batch(
+    db: AsyncSession, items: CheckoutBatchItems
+) -> List[Tuple[CheckoutBatchItemResult, Optional[Equipment]]]:
+    """Equipment for each listed id and scanned tag, locked, read with one query.
+
+    Unknown and repeated items come back without equipment and with an
+    error result.
+    """
+    tagged = select(EquipmentTag.equipment_id).where(
+        or_(EquipmentTag.tag_value.in_(items.tag_values), EquipmentTag.rfid_uid.in_(items.tag_values))
+    )
+    result = await db.execute(
+        select(Equipment, EquipmentTag.tag_value, EquipmentTag.rfid_uid)
+        .outerjoin(
+            EquipmentTag,
+            (EquipmentTag.equipment_id == Equipment.id)
+            & or_(EquipmentTag.tag_value.in_(items.tag_values), EquipmentTag.rfid_uid.in_(items.tag_values))
+        )
+        .where(or_(Equipment.id.in_(items.equipment_ids), Equipment.id.in_(tagged)))
+        # Locks in id order, so overlapping batches do not deadlock
+        .order_by(Equipment.id)
+        .with_for_update(of=Equipment)
+    )
+
+    by_id: Dict[UUID, Equipment] = {}
+    by_tag: Dict[str, Equipment] = {}
+    by_rfid: Dict[str, Equipment] = {}
+    for equipment, tag_value, rfid_uid in result.all():
+        by_id[equipment.id] = equipment
+        if tag_value:
+            by_tag[tag_value] = equipment
+        if rfid_uid:
+            by_rfid[rfid_uid] = equipment
+
+    resolved = [
+        (CheckoutBatchItemResult(equipment_id=equipment_id, status="error"), by_id.get(equipment_id))
+        for equipment_id in items.equipment_ids
+    ] + [
+        (CheckoutBatchItemResult(tag_value=value, status="error"), by_tag.get(value) or by_rfid.get(value))
+        for value in items.tag_values
+    ]
+
+    seen = set()
+    for item, equipment in resolved:
+        if equipment is None:
+            item.detail = "Equipment not found" if item.equipment_id else "Tag not found"
+        else:
+            item.equipment_id = equipment.id
+            if equipment.id in seen:
+                item.detail = "Listed more than once"
+            seen.add(equipment.id)
+    return [
+        (item, equipment if equipment is not None and item.detail is None else None)
+        for item, equipment in resolved
+    ]
+
+
+async def checkout_batch(
+    db: AsyncSession, batch: CheckoutBatchCreate, current_user: User
+) -> List[CheckoutBatchItemResult]:
+    """Check out many pieces at once; the caller commits.
+
+    Items that cannot be checked out are reported and skipped.
+    """
+    checkout_data = batch.model_dump(exclude={"equipment_ids", "tag_values"})
+    results = []
+    for item, equipment in await resolve_batch(db, batch):
+        if equipment is not None:
+            if equipment.status != "available":
+                item.detail = f"Equipment is not available (status: {equipment.status})"
+            else:
+                checkout = new_checkout(
+                    db, equipment, CheckoutCreate(equipment_id=equipment.id, **checkout_data), current_user
+                )
+                item.status = "checked_out"
+                item.checkout_id = checkout.id
+        results.append(item)
+    return results
+
+
+async def return_batch(
+    db: AsyncSession, batch: CheckoutBatchReturn, current_user: User
+) -> List[CheckoutBatchItemResult]:
+    """Return many pieces at once; the caller commits.
+
+    Items that are not checked out are reported and skipped.
+    """
+    resolved = await resolve_batch(db, batch)
+    equipment_ids = [equipment.id for _, equipment in resolved if equipment is not None]
+
+    result = await db.execute(
+        select(Checkout)
+        .where(Checkout.equipment_id.in_(equipment_ids), Checkout.status.in_(OPEN_CHECKOUT_STATUSES))
+        .order_by(Checkout.id)
+        .with_for_update()
+    )
+    open_checkouts = defaultdict(list)
+    for checkout in result.scalars():
+        open_checkouts[checkout.equipment_id].append(checkout)
+
+    results = []
+    for item, equipment in resolved:
+        if equipment is not None:
+            if not open_checkouts[equipment.id]:
+                item.detail = "Equipment is not checked out"
+            else:
+                for checkout in open_checkouts[equipment.id]:
+                    close_checkout(checkout, equipment, batch, current_user)
+                item.status = "returned"
+                item.checkout_id = open_checkouts[equipment.id][0].id
+        results.append(item)
+    return results
+
+
+@periodic("checkouts.mark_overdue", interval_seconds=900)
+async def mark_overdue() -> dict:
+    """Flag checkouts past their return date and remind their holders"""
+    flagged = 0
+    while True:
+        async with async_session_factory() as db:
+            rows = (await db.execute(
+                MARK_OVERDUE, {"now": datetime.utcnow(), "batch_size": OVERDUE_BATCH_SIZE}
+            )).fetchall()
+            # Queued with the flags, so a reminder is never lost to a failure in between
+            await enqueue_notify(db, [
+                NotificationEvent(
+                    type="checkout_overdue",
+                    title=f"{name} is overdue",
+                    message=f"It was due back on {expected_return_at:%Y-%m-%d %H:%M}",
+                    recipients=[user_id],
+                    entity_type="checkout",
+                    entity_id=checkout_id,
+                    channels=("in_app", "email"),
+                    digest_key="checkout_overdue",
+                    digest_title="{count} checked out items are overdue",
+                )
+                for checkout_id, user_id, name, expected_return_at in rows
+            ])
+            await db.commit()
+
+        flagged += len(rows)
+        if len(rows) < OVERDUE_BATCH_SIZE:
+            break
+    return {"flagged": flagged}
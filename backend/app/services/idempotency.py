@@ -0,0 +1,91 @@
+"""Idempotency-Key store.
+
+A key is claimed in its own committed transaction before the request
+runs, so a retry arriving meanwhile sees it taken; the response is saved
+under it afterwards. Requests that fail on the server release their key to
+be retried.
+"""
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.idempotency import IdempotencyKey
+from app.services.jobs import periodic
+
+
+async def claim(user_id: uuid.UUID, key: str, fingerprint: str) -> Optional[IdempotencyKey]:
+    """Reserve a key for a new request; returns the existing entry if it is taken"""
+    now = datetime.utcnow()
+    async with async_session_factory() as db:
+        # An expired entry frees its key
+        await db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.expires_at < now,
+            )
+        )
+        claimed = (await db.execute(
+            pg_insert(IdempotencyKey)
+            .values(
+                user_id=user_id,
+                key=key,
+                fingerprint=fingerprint,
+                status="processing",
+                created_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+            )
+            .on_conflict_do_nothing()
+            .returning(IdempotencyKey.key)
+        )).scalar_one_or_none()
+
+        existing = None
+        if claimed is None:
+            existing = (await db.execute(
+                select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            )).scalar_one_or_none()
+        await db.commit()
+    return existing
+
+
+async def complete(user_id: uuid.UUID, key: str, status_code: int, headers: dict, body: bytes) -> None:
+    async with async_session_factory() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            .values(
+                status="completed",
+                status_code=status_code,
+                headers=headers,
+                body=body,
+                expires_at=datetime.utcnow() + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+            )
+        )
+        await db.commit()
+
+
+async def release(user_id: uuid.UUID, key: str) -> None:
+    async with async_session_factory() as db:
+        await db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.status == "processing",
+            )
+        )
+        await db.commit()
+
+
+@periodic("idempotency.prune", interval_seconds=3600)
+async def prune_keys() -> dict:
+    async with async_session_factory() as db:
+        result = await db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow())
+        )
+        await db.commit()
+    return {"pruned": result.rowcount}
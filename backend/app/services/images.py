@@ -0,0 +1,66 @@
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import settings
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class ImageDerivatives:
+    width: int
+    height: int
+    thumbnail_path: str
+
+    def cleanup(self) -> None:
+        try:
+            os.unlink(self.thumbnail_path)
+        except FileNotFoundError:
+            pass
+
+
+def _render_thumbnail(source_path: str, thumbnail_path: str, size: int) -> tuple:
+    """Runs in a worker process: decode the image once and write a WebP thumbnail"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        image.thumbnail((size, size))
+        image.save(thumbnail_path, "WEBP", quality=75, method=4)
+    return width, height
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+async def render_derivatives(source_path: str) -> ImageDerivatives:
+    """Generate the thumbnail for an image file without blocking the event loop"""
+    fd, thumbnail_path = tempfile.mkstemp(prefix="thumb_", suffix=".webp")
+    os.close(fd)
+    loop = asyncio.get_running_loop()
+    try:
+        width, height = await loop.run_in_executor(
+            get_executor(), _render_thumbnail, source_path, thumbnail_path, settings.THUMBNAIL_SIZE
+        )
+    except BaseException:
+        os.unlink(thumbnail_path)
+        raise
+    return ImageDerivatives(width=width, height=height, thumbnail_path=thumbnail_path)
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,325 @@
+"""Durable background jobs.
+
+Jobs are rows in background_jobs: they survive restarts, are shared by
+all API workers and need nothing but Postgres. Every worker polls for due
+jobs and claims them with FOR UPDATE SKIP LOCKED, so a job runs in one
+worker at a time. A failing job is retried with exponential backoff until
+it runs out of attempts; one whose worker died is picked up again once its
+lock expires.
+
+Periodic schedules enqueue one job per interval under a unique key, so
+each interval runs once across all workers rather than once in each.
+They are also exclusive: a job is not claimed while another job of the
+same task runs in any worker, so a slow run never overlaps the next one.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import update, delete, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_TICK_SECONDS = 30
+# Added to a task's timeout for how long a claimed job stays locked
+LOCK_GRACE_SECONDS = 300
+ERROR_MAX_LENGTH = 4000
+
+
+@dataclass
+class JobTask:
+    name: str
+    func: Callable[..., Awaitable[object]]
+    max_attempts: int
+    # Jobs of this task running at once in one worker process
+    concurrency: Optional[int]
+    timeout_seconds: int
+    # At most one job of this task running across all workers
+    exclusive: bool = False
+
+
+_tasks: Dict[str, JobTask] = {}
+_schedules: Dict[str, int] = {}
+_active: Counter = Counter()
+_running: Set[asyncio.Task] = set()
+_loops: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+_worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def task(
+    name: str,
+    max_attempts: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    timeout_seconds: Optional[int] = None,
+    exclusive: bool = False,
+):
+    """Register a coroutine function as a job; the payload is passed as keyword arguments"""
+    def decorator(func: Callable[..., Awaitable[object]]):
+        _tasks[name] = JobTask(
+            name=name,
+            func=func,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            concurrency=concurrency,
+            timeout_seconds=timeout_seconds or settings.JOB_TIMEOUT_SECONDS,
+            exclusive=exclusive,
+        )
+        return func
+    return decorator
+
+
+def periodic(name: str, interval_seconds: int, timeout_seconds: Optional[int] = None):
+    """Register a coroutine function as a job enqueued every interval_seconds"""
+    def decorator(func: Callable[[], Awaitable[object]]):
+        task(name, concurrency=1, timeout_seconds=timeout_seconds, exclusive=True)(func)
+        _schedules[name] = interval_seconds
+        return func
+    return decorator
+
+
+def registered() -> Dict[str, Optional[int]]:
+    """Task names with their schedule interval, None if not periodic"""
+    return {name: _schedules.get(name) for name in sorted(_tasks)}
+
+
+async def enqueue(
+    db: AsyncSession,
+    name: str,
+    payload: Optional[dict] = None,
+    delay_seconds: float = 0,
+    key: Optional[str] = None,
+    created_by: Optional[uuid.UUID] = None,
+) -> Optional[uuid.UUID]:
+    """Add a job in the caller's transaction, so it only runs once that commits.
+
+    With a key, nothing is added if a job with that key exists; the
+    result is then None.
+    """
+    if name not in _tasks:
+        raise ValueError(f"Unknown job {name}")
+    now = datetime.utcnow()
+    statement = pg_insert(BackgroundJob).values(
+        id=uuid.uuid4(),
+        name=name,
+        payload=jsonable_encoder(payload or {}),
+        key=key,
+        status="queued",
+        attempts=0,
+        max_attempts=_tasks[name].max_attempts,
+        run_at=now + timedelta(seconds=delay_seconds),
+        created_by=created_by,
+        created_at=now,
+    )
+    if key:
+        statement = statement.on_conflict_do_nothing(index_elements=[BackgroundJob.key])
+    result = await db.execute(statement.returning(BackgroundJob.id))
+    return result.scalar_one_or_none()
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number attempts, jittered so failed batches spread out"""
+    delay = min(settings.JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.75, 1.25)
+
+
+# Exclusive tasks this claim may take, each locked until the claim
+# commits; a task whose lock another worker holds is left to it
+LOCK_EXCLUSIVE = text("""
+SELECT name FROM unnest(CAST(:names AS text[])) AS name
+WHERE pg_try_advisory_xact_lock(hashtext('background_jobs:' || name))
+""")
+
+# Runs after LOCK_EXCLUSIVE in the same transaction, so it sees every
+# claim committed before the lock was taken
+CLAIM = text("""
+UPDATE background_jobs j
+SET status = 'running', attempts = j.attempts + 1, started_at = :now,
+    locked_until = :locked_until, worker = :worker
+WHERE j.id = (
+    SELECT q.id FROM background_jobs q
+    WHERE q.status = 'queued' AND q.run_at <= :now AND q.name = ANY(:names)
+      AND NOT (q.name = ANY(:exclusive) AND EXISTS (
+          SELECT 1 FROM background_jobs r
+          WHERE r.name = q.name AND r.status = 'running' AND r.locked_until >= :now
+      ))
+    ORDER BY q.run_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING j.id, j.name, j.payload, j.attempts, j.max_attempts
+""")
+
+# A running job past its lock has lost its worker: it is retried, or
+# failed when out of attempts
+RELEASE_EXPIRED = text("""
+UPDATE background_jobs
+SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+    finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE :now END,
+    run_at = :now, locked_until = NULL,
+    last_error = 'Worker ' || coalesce(worker, '?') || ' lost the job'
+WHERE status = 'running' AND locked_until < :now
+""")
+
+
+async def _claim(names: List[str]) -> Optional[tuple]:
+    now = datetime.utcnow()
+    longest = max(_tasks[name].timeout_seconds for name in names)
+    exclusive = [name for name in names if _tasks[name].exclusive]
+    async with async_session_factory() as db:
+        if exclusive:
+            locked = set((await db.execute(LOCK_EXCLUSIVE, {"names": exclusive})).scalars())
+            names = [name for name in names if name in locked or not _tasks[name].exclusive]
+            exclusive = list(locked)
+        row = (await db.execute(CLAIM, {
+            "now": now,
+            "locked_until": now + timedelta(seconds=longest + LOCK_GRACE_SECONDS),
+            "worker": _worker_id,
+            "names": names,
+            "exclusive": exclusive,
+        })).first()
+        await db.commit()
+    return tuple(row) if row else None
+
+
+async def _finish(job_id: uuid.UUID, **values) -> None:
+    async with async_session_factory() as db:
+        await db.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id, BackgroundJob.worker == _worker_id)
+            .values(locked_until=None, **values)
+        )
+        await db.commit()
+
+
+async def run_job(job_id: uuid.UUID, name: str, payload: dict, attempts: int, max_attempts: int) -> None:
+    """Run a claimed job and record the outcome"""
+    job_task = _tasks[name]
+    try:
+        result = await asyncio.wait_for(job_task.func(**payload), job_task.timeout_seconds)
+    except asyncio.CancelledError:
+        # Shutdown: hand the job back without using up an attempt
+        await _finish(job_id, status="queued", attempts=attempts - 1, run_at=datetime.utcnow())
+        raise
+    except Exception as exc:
+        error = "".join(traceback.format_exception(exc))[-ERROR_MAX_LENGTH:]
+        now = datetime.utcnow()
+        if attempts < max_attempts:
+            delay = backoff_seconds(attempts)
+            logger.warning("Job %s %s failed (attempt %d), retrying in %ds", name, job_id, attempts, delay)
+            await _finish(job_id, status="queued", run_at=now + timedelta(seconds=delay), last_error=error)
+        else:
+            logger.error("Job %s %s failed after %d attempts: %s", name, job_id, attempts, exc)
+            await _finish(job_id, status="failed", finished_at=now, last_error=error)
+    else:
+        logger.info("Job %s %s finished: %s", name, job_id, result)
+        await _finish(
+            job_id,
+            status="succeeded",
+            finished_at=datetime.utcnow(),
+            result=jsonable_encoder(result) if isinstance(result, dict) else {"result": jsonable_encoder(result)},
+        )
+
+
+def _available() -> List[str]:
+    return [
+        name for name, job_task in _tasks.items()
+        if job_task.concurrency is None or _active[name] < job_task.concurrency
+    ]
+
+
+def _done(name: str, job: asyncio.Task) -> None:
+    _active[name] -= 1
+    _running.discard(job)
+    _wakeup.set()
+
+
+async def _poll() -> None:
+    while True:
+        try:
+            while len(_running) < settings.JOB_CONCURRENCY:
+                names = _available()
+                claimed = await _claim(names) if names else None
+                if not claimed:
+                    break
+                name = claimed[1]
+                _active[name] += 1
+                job = asyncio.create_task(run_job(*claimed), name=f"job:{name}")
+                _running.add(job)
+                job.add_done_callback(lambda job, name=name: _done(name, job))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Claiming jobs failed")
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _schedule() -> None:
+    """Enqueue the current interval of every schedule and release expired locks"""
+    while True:
+        try:
+            now = time.time()
+            async with async_session_factory() as db:
+                for name, interval in _schedules.items():
+                    await enqueue(db, name, key=f"schedule:{name}:{int(now // interval)}")
+                await db.execute(RELEASE_EXPIRED, {"now": datetime.utcnow()})
+                await db.commit()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Scheduling jobs failed")
+        await asyncio.sleep(SCHEDULE_TICK_SECONDS)
+
+
+def start() -> None:
+    global _wakeup
+    if not settings.JOB_WORKER_ENABLED:
+        return
+    _wakeup = asyncio.Event()
+    _loops.append(asyncio.create_task(_schedule(), name="jobs:schedule"))
+    _loops.append(asyncio.create_task(_poll(), name="jobs:poll"))
+
+
+async def stop() -> None:
+    for loop in _loops:
+        loop.cancel()
+    await asyncio.gather(*_loops, return_exceptions=True)
+    _loops.clear()
+    jobs = list(_running)
+    for job in jobs:
+        job.cancel()
+    await asyncio.gather(*jobs, return_exceptions=True)
+
+
+@periodic("jobs.prune", interval_seconds=24 * 3600)
+async def prune_jobs() -> dict:
+    cutoff = datetime.utcnow() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    async with async_session_factory() as db:
+        result = await db.execute(
+            delete(BackgroundJob).where(
+                BackgroundJob.status.in_(["succeeded", "failed"]),
+                BackgroundJob.finished_at < cutoff,
+            )
+        )
+        await db.commit()
+        return {"pruned": result.rowcount}
@@ -0,0 +1,310 @@
+"""Notification fan-out.
+
+notify() takes a batch of events, each addressed to many users, and:
+- drops (user, type, entity) pairs already notified within
+  NOTIFICATION_DEDUPE_HOURS, using the notification_keys ledger;
+- merges a user's events that share a digest_key into one notice once
+  there are NOTIFICATION_DIGEST_THRESHOLD of them;
+- writes in-app notices with one multi-row INSERT, which also reaches
+  connected clients through /events;
+- sends each user at most one email per batch, from a bounded pool of
+  SMTP workers with retry.
+
+Request handlers call enqueue_notify() instead, which hands the events to
+the notifications.deliver job in the caller's transaction: they are sent
+only if that commits, a failed delivery is retried, and a slow mail queue
+never holds up a response.
+"""
+import asyncio
+import logging
+import smtplib
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.notification import Notification, NotificationKey, RECONCILE_UNREAD
+from app.models.user import User
+from app.services.jobs import enqueue, periodic, task
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement
+CHUNK_SIZE = 1000
+DIGEST_PREVIEW = 10
+
+
+@dataclass
+class NotificationEvent:
+    type: str
+    title: str
+    recipients: Iterable[uuid.UUID]
+    message: Optional[str] = None
+    entity_type: Optional[str] = None
+    entity_id: Optional[uuid.UUID] = None
+    channels: Tuple[str, ...] = ("in_app",)  # in_app, email
+    # Events sharing a digest_key are merged per user, digest_title gets {count}
+    digest_key: Optional[str] = None
+    digest_title: Optional[str] = None
+
+    @property
+    def dedupe_key(self) -> Optional[str]:
+        if not self.entity_id:
+            return None
+        return f"{self.type}:{self.entity_type}:{self.entity_id}"
+
+
+@dataclass
+class Notice:
+    """What one user receives: a single event or a digest of several"""
+    user_id: uuid.UUID
+    type: str
+    title: str
+    message: Optional[str]
+    entity_type: Optional[str]
+    entity_id: Optional[uuid.UUID]
+    channels: Tuple[str, ...]
+
+
+_email_queue: Optional[asyncio.Queue] = None
+_email_workers: List[asyncio.Task] = []
+
+
+def _chunks(items: list, size: int = CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def _claim_keys(db, pairs: List[Tuple[uuid.UUID, NotificationEvent]]) -> set:
+    """(user_id, key) pairs not notified within the dedupe window; claims them"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(hours=settings.NOTIFICATION_DEDUPE_HOURS)
+    rows = [
+        {"user_id": user_id, "key": event.dedupe_key, "expires_at": expires_at}
+        for user_id, event in pairs if event.dedupe_key
+    ]
+    claimed = set()
+    for chunk in _chunks(rows):
+        statement = pg_insert(NotificationKey).values(chunk)
+        result = await db.execute(
+            statement
+            .on_conflict_do_update(
+                index_elements=[NotificationKey.user_id, NotificationKey.key],
+                set_={"expires_at": statement.excluded.expires_at},
+                where=NotificationKey.expires_at <= now,
+            )
+            .returning(NotificationKey.user_id, NotificationKey.key)
+        )
+        claimed.update((row[0], row[1]) for row in result.fetchall())
+    return claimed
+
+
+def _digest(user_id: uuid.UUID, events: List[NotificationEvent]) -> Notice:
+    first = events[0]
+    lines = [event.title for event in events[:DIGEST_PREVIEW]]
+    if len(events) > DIGEST_PREVIEW:
+        lines.append(f"... +{len(events) - DIGEST_PREVIEW}")
+    channels = tuple(sorted({channel for event in events for channel in event.channels}))
+    return Notice(
+        user_id=user_id,
+        type=f"{first.type}_digest",
+        title=(first.digest_title or "{count} " + first.type).format(count=len(events)),
+        message="\n".join(lines),
+        entity_type=None,
+        entity_id=None,
+        channels=channels,
+    )
+
+
+def _notices(pairs: List[Tuple[uuid.UUID, NotificationEvent]]) -> List[Notice]:
+    groups: Dict[Tuple[uuid.UUID, Optional[str]], List[NotificationEvent]] = defaultdict(list)
+    notices = []
+    for user_id, event in pairs:
+        if event.digest_key:
+            groups[(user_id, event.digest_key)].append(event)
+        else:
+            notices.append(_single(user_id, event))
+
+    for (user_id, _), events in groups.items():
+        if len(events) >= settings.NOTIFICATION_DIGEST_THRESHOLD:
+            notices.append(_digest(user_id, events))
+        else:
+            notices.extend(_single(user_id, event) for event in events)
+    return notices
+
+
+def _single(user_id: uuid.UUID, event: NotificationEvent) -> Notice:
+    return Notice(
+        user_id=user_id,
+        type=event.type,
+        title=event.title,
+        message=event.message,
+        entity_type=event.entity_type,
+        entity_id=event.entity_id,
+        channels=event.channels,
+    )
+
+
+async def notify(events: List[NotificationEvent]) -> dict:
+    """Deliver a batch of events; returns counts per stage"""
+    pairs = []
+    seen = set()
+    for event in events:
+        for user_id in event.recipients:
+            if not user_id:
+                continue
+            marker = (user_id, event.dedupe_key or id(event))
+            if marker not in seen:
+                seen.add(marker)
+                pairs.append((user_id, event))
+    if not pairs:
+        return {"recipients": 0, "in_app": 0, "emails": 0}
+
+    async with async_session_factory() as db:
+        claimed = await _claim_keys(db, pairs)
+        pairs = [
+            (user_id, event) for user_id, event in pairs
+            if not event.dedupe_key or (user_id, event.dedupe_key) in claimed
+        ]
+        notices = _notices(pairs)
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "user_id": notice.user_id,
+                "type": notice.type,
+                "title": notice.title[:200],
+                "message": notice.message,
+                "related_entity_type": notice.entity_type,
+                "related_entity_id": notice.entity_id,
+                "is_read": False,
+                "created_at": now,
+            }
+            for notice in notices if "in_app" in notice.channels
+        ]
+        for chunk in _chunks(rows):
+            await db.execute(insert(Notification), chunk)
+        await db.commit()
+
+        emails = await _queue_emails(db, [notice for notice in notices if "email" in notice.channels])
+
+    return {"recipients": len({user_id for user_id, _ in pairs}), "in_app": len(rows), "emails": emails}
+
+
+async def enqueue_notify(db: AsyncSession, events: List[NotificationEvent]) -> None:
+    """Deliver events once the caller's transaction commits"""
+    if events:
+        await enqueue(db, "notifications.deliver", {"events": [
+            {**asdict(event), "recipients": [user_id for user_id in event.recipients if user_id]}
+            for event in events
+        ]})
+
+
+@task("notifications.deliver")
+async def deliver(events: List[dict]) -> dict:
+    """Job behind enqueue_notify; a retry after a partial delivery is deduplicated by the ledger"""
+    return await notify([
+        NotificationEvent(**{
+            **event,
+            "recipients": [uuid.UUID(user_id) for user_id in event["recipients"]],
+            "entity_id": uuid.UUID(event["entity_id"]) if event["entity_id"] else None,
+            "channels": tuple(event["channels"]),
+        })
+        for event in events
+    ])
+
+
+async def _queue_emails(db, notices: List[Notice]) -> int:
+    if not notices:
+        return 0
+    if _email_queue is None or not settings.SMTP_USER:
+        logger.debug("Email disabled, skipping %d notices", len(notices))
+        return 0
+
+    by_user: Dict[uuid.UUID, List[Notice]] = defaultdict(list)
+    for notice in notices:
+        by_user[notice.user_id].append(notice)
+    result = await db.execute(
+        select(User.id, User.email).where(User.id.in_(list(by_user)), User.is_active == True)
+    )
+    addresses = dict(result.fetchall())
+
+    queued = 0
+    for user_id, user_notices in by_user.items():
+        if user_id not in addresses:
+            continue
+        message = EmailMessage()
+        message["From"] = settings.EMAIL_FROM
+        message["To"] = addresses[user_id]
+        message["Subject"] = (
+            user_notices[0].title if len(user_notices) == 1
+            else f"{settings.APP_NAME}: {len(user_notices)} notifications"
+        )
+        message.set_content("\n\n".join(
+            f"{notice.title}\n{notice.message or ''}".strip() for notice in user_notices
+        ))
+        # Waits when the workers fall behind instead of growing without bound
+        await _email_queue.put(message)
+        queued += 1
+    return queued
+
+
+def _send(message: EmailMessage) -> None:
+    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30) as smtp:
+        smtp.starttls()
+        smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        smtp.send_message(message)
+
+
+async def _email_worker() -> None:
+    while True:
+        message = await _email_queue.get()
+        for attempt in range(settings.NOTIFICATION_EMAIL_ATTEMPTS):
+            try:
+                await asyncio.to_thread(_send, message)
+                break
+            except Exception:
+                logger.exception("Sending email to %s failed (attempt %d)", message["To"], attempt + 1)
+                await asyncio.sleep(2 ** attempt * 5)
+
+
+def start() -> None:
+    global _email_queue
+    _email_queue = asyncio.Queue(maxsize=settings.NOTIFICATION_EMAIL_QUEUE_SIZE)
+    for index in range(settings.NOTIFICATION_EMAIL_WORKERS):
+        _email_workers.append(asyncio.create_task(_email_worker(), name=f"notifications:email:{index}"))
+
+
+async def stop() -> None:
+    for worker in _email_workers:
+        worker.cancel()
+    await asyncio.gather(*_email_workers, return_exceptions=True)
+    _email_workers.clear()
+
+
+@periodic("notifications.prune_keys", interval_seconds=3600)
+async def prune_notification_keys() -> dict:
+    async with async_session_factory() as db:
+        result = await db.execute(delete(NotificationKey).where(NotificationKey.expires_at < datetime.utcnow()))
+        await db.commit()
+        return {"pruned": result.rowcount}
+
+
+@periodic("notifications.reconcile_unread", interval_seconds=24 * 3600)
+async def reconcile_unread_counts() -> dict:
+    """Recount users.unread_notifications from the notifications table"""
+    async with async_session_factory() as db:
+        # Holds off writers so no trigger delta lands between the count and the update
+        await db.execute(text("LOCK TABLE notifications IN SHARE MODE"))
+        result = await db.execute(text(RECONCILE_UNREAD))
+        await db.commit()
+        return {"corrected": result.rowcount}
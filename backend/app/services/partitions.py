@@ -0,0 +1,138 @@
+"""Monthly partition upkeep for audit_log and notifications.
+
+Partitions are created PARTITION_MONTHS_AHEAD months in advance. Rows of
+a month without a partition, say while this job was not running, land in
+the table's default partition and are moved out when the month's
+partition is created. Months
+older than the table's retention are detached, so queries stop seeing
+them at once, exported to gzipped JSON lines in storage and dropped.
+A partition that was detached but not yet archived, say because the
+upload failed, is picked up again on the next run.
+"""
+import gzip
+import json
+import os
+import re
+import tempfile
+from datetime import date, datetime
+from typing import Dict, List, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.partitioning import (
+    partitioned_tables, partition_name, create_partition_ddl, upcoming_months, month_start, add_months,
+    default_partition_name, move_from_default_ddl,
+)
+from app.services.notifications import reconcile_unread_counts
+from app.services.jobs import periodic
+from app.services.storage import get_storage
+
+
+def retention_months() -> Dict[str, int]:
+    return {
+        "audit_log": settings.AUDIT_LOG_RETENTION_MONTHS,
+        "notifications": settings.NOTIFICATION_RETENTION_MONTHS,
+    }
+
+
+def retention_start(table_name: str) -> datetime:
+    """Oldest created_at still kept; older months are archived on the next run"""
+    month = add_months(month_start(datetime.utcnow()), -retention_months()[table_name])
+    return datetime(month.year, month.month, 1)
+
+
+def archive_key(table_name: str, month: date) -> str:
+    return f"{settings.PARTITION_ARCHIVE_PREFIX}/{table_name}/{partition_name(table_name, month)}.jsonl.gz"
+
+
+async def monthly_partitions(db: AsyncSession, table_name: str) -> Dict[date, bool]:
+    """Existing month partitions of a table, attached or not, by month"""
+    pattern = re.compile(rf"^{table_name}_y(\d{{4}})m(\d{{2}})$")
+    result = await db.execute(
+        text("""
+            SELECT c.relname, i.inhparent IS NOT NULL
+            FROM pg_class c
+            LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+            WHERE c.relkind = 'r' AND c.relname LIKE :prefix
+        """),
+        {"prefix": f"{table_name}_y%"}
+    )
+    partitions = {}
+    for name, attached in result.fetchall():
+        match = pattern.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = attached
+    return partitions
+
+
+async def default_partition_months(db: AsyncSession, table_name: str) -> Set[date]:
+    """Months with rows in the default partition"""
+    result = await db.execute(text(
+        f"SELECT DISTINCT date_trunc('month', created_at)::date FROM {default_partition_name(table_name)}"
+    ))
+    return {row[0] for row in result.fetchall()}
+
+
+async def export_partition(db: AsyncSession, table_name: str, month: date) -> int:
+    """Write a partition's rows to storage as gzipped JSON lines"""
+    fd, path = tempfile.mkstemp(suffix=".jsonl.gz")
+    os.close(fd)
+    count = 0
+    try:
+        with gzip.open(path, "wt", encoding="utf-8") as archive:
+            result = await db.stream(text(f"SELECT * FROM {partition_name(table_name, month)}"))
+            async for rows in result.mappings().partitions(1000):
+                for row in rows:
+                    archive.write(json.dumps(jsonable_encoder(dict(row))) + "\n")
+                    count += 1
+        await get_storage().put_file(archive_key(table_name, month), path, "application/gzip")
+    finally:
+        os.unlink(path)
+    return count
+
+
+async def archive_partition(db: AsyncSession, table_name: str, month: date, attached: bool) -> int:
+    name = partition_name(table_name, month)
+    if attached:
+        await db.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+        await db.commit()
+        if table_name == "notifications":
+            # Detaching does not fire the unread counter triggers
+            await reconcile_unread_counts()
+    count = await export_partition(db, table_name, month)
+    await db.execute(text(f"DROP TABLE {name}"))
+    await db.commit()
+    return count
+
+
+@periodic("partitions.maintain", interval_seconds=24 * 3600)
+async def maintain_partitions() -> dict:
+    created: List[str] = []
+    archived: Dict[str, int] = {}
+    async with async_session_factory() as db:
+        for table_name in partitioned_tables():
+            existing = await monthly_partitions(db, table_name)
+            stranded = await default_partition_months(db, table_name)
+            for month in sorted(set(upcoming_months()) | stranded):
+                if month in existing:
+                    continue
+                if month in stranded:
+                    for statement in move_from_default_ddl(table_name, month):
+                        await db.execute(text(statement))
+                else:
+                    await db.execute(text(create_partition_ddl(table_name, month)))
+                existing[month] = True
+                created.append(partition_name(table_name, month))
+            await db.commit()
+
+            cutoff = retention_start(table_name).date()
+            for month, attached in sorted(existing.items()):
+                if month < cutoff:
+                    archived[partition_name(table_name, month)] = await archive_partition(
+                        db, table_name, month, attached
+                    )
+    return {"created": created, "archived": archived}
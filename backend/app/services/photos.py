@@ -0,0 +1,216 @@
+import uuid as uuid_module
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import UUID
+
+from fastapi import BackgroundTasks
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.blob import StoredBlob
+from app.models.equipment import EquipmentPhoto
+from app.services.blobs import (
+    acquire_blob,
+    acquire_staged_blob,
+    add_reference,
+    release_blob,
+    reclaim_blobs,
+    process_blob_thumbnail,
+)
+from app.services.storage import SpooledUpload, get_storage, key_from_url
+
+# A blob still without a thumbnail after this long had its render fail
+THUMBNAIL_RETRY_AFTER = timedelta(minutes=10)
+
+
+def blob_urls(blob: StoredBlob) -> dict:
+    """URL and derivative fields copied from a blob onto a photo"""
+    storage = get_storage()
+    return {
+        "file_url": storage.url(blob.storage_key),
+        "thumbnail_url": storage.url(blob.thumbnail_key) if blob.thumbnail_key else None,
+        "file_size_bytes": blob.size_bytes,
+        "width": blob.width,
+        "height": blob.height,
+    }
+
+
+async def acquire_spooled(
+    db: AsyncSession,
+    upload: SpooledUpload,
+    background_tasks: BackgroundTasks,
+) -> StoredBlob:
+    """Reference the blob for an upload; only new bytes are stored and thumbnailed"""
+    try:
+        blob, stored = await acquire_blob(db, upload)
+    except BaseException:
+        upload.cleanup()
+        raise
+
+    if stored or (not blob.thumbnail_key and blob.created_at < datetime.utcnow() - THUMBNAIL_RETRY_AFTER):
+        # Also retried for an existing blob whose thumbnail never got rendered
+        background_tasks.add_task(process_blob_thumbnail, blob.sha256, upload)
+    else:
+        upload.cleanup()
+    return blob
+
+
+async def acquire_staged(
+    db: AsyncSession,
+    sha256: str,
+    size: int,
+    content_type: Optional[str],
+    staged_key: str,
+) -> StoredBlob:
+    """Reference the blob for a photo a client uploaded directly to storage.
+
+    The bytes are verified by a job that commits with the blob, so it is
+    not lost if the process stops before getting to it.
+    """
+    blob, _ = await acquire_staged_blob(db, sha256, size, content_type, staged_key)
+    return blob
+
+
+async def create_equipment_photo(
+    db: AsyncSession,
+    equipment_id: UUID,
+    blob: StoredBlob,
+    photo_type: str,
+    description: Optional[str],
+    user_id: UUID,
+) -> EquipmentPhoto:
+    """Add the photo row for a referenced blob; the caller commits"""
+    photo = EquipmentPhoto(
+        equipment_id=equipment_id,
+        photo_type=photo_type,
+        blob_sha256=blob.sha256,
+        description=description,
+        uploaded_at=datetime.utcnow(),
+        uploaded_by=user_id,
+        is_synced=True,
+        **blob_urls(blob)
+    )
+    db.add(photo)
+    await db.flush()
+    return photo
+
+
+def create_onboarding_photo(
+    session: dict,
+    blob: StoredBlob,
+    photo_type: str,
+    description: Optional[str],
+) -> dict:
+    photo = {
+        "id": str(uuid_module.uuid4()),
+        "photo_type": photo_type,
+        "blob_sha256": blob.sha256,
+        "description": description,
+        **blob_urls(blob)
+    }
+    session["photos"].append(photo)
+    return photo
+
+
+async def save_equipment_photo(
+    db: AsyncSession,
+    equipment_id: UUID,
+    upload: SpooledUpload,
+    photo_type: str,
+    description: Optional[str],
+    user_id: UUID,
+    background_tasks: BackgroundTasks,
+) -> EquipmentPhoto:
+    """Store an uploaded equipment photo, reusing stored bytes for identical files"""
+    blob = await acquire_spooled(db, upload, background_tasks)
+    photo = await create_equipment_photo(db, equipment_id, blob, photo_type, description, user_id)
+    await db.commit()
+    await db.refresh(photo)
+    return photo
+
+
+async def save_onboarding_photo(
+    db: AsyncSession,
+    session: dict,
+    upload: SpooledUpload,
+    photo_type: str,
+    description: Optional[str],
+    background_tasks: BackgroundTasks,
+) -> dict:
+    """Store an uploaded photo for an onboarding session.
+
+    The session holds a blob reference until complete_onboarding hands it
+    over to the EquipmentPhoto row; thumbnails are read back from the blob
+    at that point.
+    """
+    blob = await acquire_spooled(db, upload, background_tasks)
+    await db.commit()
+    return create_onboarding_photo(session, blob, photo_type, description)
+
+
+async def attach_equipment_photo(
+    db: AsyncSession,
+    equipment_id: UUID,
+    sha256: str,
+    photo_type: str,
+    description: Optional[str],
+    user_id: UUID,
+) -> Optional[EquipmentPhoto]:
+    """Metadata-only photo upload for bytes already in storage; None if unknown.
+
+    The caller commits.
+    """
+    blob = await add_reference(db, sha256)
+    if not blob:
+        return None
+    return await create_equipment_photo(db, equipment_id, blob, photo_type, description, user_id)
+
+
+async def attach_onboarding_photo(
+    db: AsyncSession,
+    session: dict,
+    sha256: str,
+    photo_type: str,
+    description: Optional[str],
+) -> Optional[dict]:
+    blob = await add_reference(db, sha256)
+    if not blob:
+        return None
+    await db.commit()
+    return create_onboarding_photo(session, blob, photo_type, description)
+
+
+async def refresh_onboarding_photos(db: AsyncSession, photos: list) -> None:
+    """Copy thumbnails rendered since upload from the blobs into session photos"""
+    sha256s = {p["blob_sha256"] for p in photos if p.get("blob_sha256")}
+    if not sha256s:
+        return
+    blobs = {
+        blob.sha256: blob for blob in (await db.execute(
+            select(StoredBlob).where(StoredBlob.sha256.in_(sha256s))
+        )).scalars().all()
+    }
+    for photo in photos:
+        blob = blobs.get(photo.get("blob_sha256"))
+        if blob:
+            photo.update(blob_urls(blob))
+
+
+async def delete_photo_files(db: AsyncSession, photo: EquipmentPhoto) -> None:
+    """Release a deleted photo's blob, reclaiming storage on the last reference.
+
+    Called after the photo row is deleted; photos stored before blobs
+    existed own their files and are removed directly.
+    """
+    if photo.blob_sha256:
+        remaining = await release_blob(db, photo.blob_sha256)
+        await db.commit()
+        if remaining == 0:
+            await reclaim_blobs([photo.blob_sha256])
+        return
+
+    storage = get_storage()
+    for url in (photo.file_url, photo.thumbnail_url):
+        key = key_from_url(url)
+        if key:
+            await storage.delete(key)
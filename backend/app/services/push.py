@@ -0,0 +1,277 @@
+"""Per-user push of notifications, transfer and calibration changes.
+
+Events are derived from change_log, so every write path is covered and
+an event id is a change_log position a client can resume from. With
+PUSH_BACKEND "local" each worker follows change_log itself. With "redis"
+one worker reads it and publishes to a Redis channel that every worker
+subscribes to.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.calibration import Calibration
+from app.models.change_log import ChangeLog
+from app.models.equipment import Equipment
+from app.models.notification import Notification
+from app.models.transfer import TransferRequest, TransferOffer, Transfer
+from app.schemas.notification import NotificationResponse
+from app.services.changes import Position, consumer, read_changes
+from app.services.sync import serialize_row
+
+logger = logging.getLogger(__name__)
+
+PUSH_TABLES = ["notifications", "transfer_requests", "transfer_offers", "transfers", "calibrations"]
+REDIS_CHANNEL = "vercajch:push"
+
+
+@dataclass
+class PushEvent:
+    id: str  # change_log position, "<version>.<seq>"
+    type: str
+    user_ids: List[uuid.UUID]
+    data: dict
+
+    @property
+    def position(self) -> Position:
+        return parse_event_id(self.id)
+
+    def payload(self) -> str:
+        return json.dumps(self.data, default=str)
+
+
+@dataclass(eq=False)
+class Subscription:
+    user_id: uuid.UUID
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=settings.PUSH_QUEUE_SIZE))
+    # Set when the client fell too far behind; it reconnects and replays instead
+    overflowed: bool = False
+
+
+_subscribers: Dict[uuid.UUID, Set[Subscription]] = defaultdict(set)
+_redis_listener: Optional[asyncio.Task] = None
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Position]:
+    try:
+        version, seq = (event_id or "").split(".")
+        return (int(version), int(seq))
+    except ValueError:
+        return None
+
+
+def _event_id(entry: ChangeLog) -> str:
+    return f"{entry.version}.{entry.seq}"
+
+
+async def _load(db: AsyncSession, model, ids: Set[str]) -> dict:
+    if not ids:
+        return {}
+    rows = (await db.execute(select(model).where(model.id.in_(ids)))).scalars().all()
+    return {str(row.id): row for row in rows}
+
+
+async def events_for(db: AsyncSession, entries: List[ChangeLog]) -> List[PushEvent]:
+    """Map change_log entries to events and the users they go to.
+
+    Rows are read as they are now, not as of the change; deletions are
+    not pushed since the row and its recipients are gone.
+    """
+    ids = defaultdict(set)
+    for entry in entries:
+        if entry.op != "delete":
+            ids[entry.table_name].add(entry.row_id)
+
+    notifications = await _load(db, Notification, ids["notifications"])
+    requests = await _load(db, TransferRequest, ids["transfer_requests"])
+    offers = await _load(db, TransferOffer, ids["transfer_offers"])
+    transfers = await _load(db, Transfer, ids["transfers"])
+    calibrations = await _load(db, Calibration, ids["calibrations"])
+
+    offer_requests = await _load(db, TransferRequest, {str(offer.request_id) for offer in offers.values()})
+    holders = {}
+    equipment_ids = {str(calibration.equipment_id) for calibration in calibrations.values()}
+    if equipment_ids:
+        result = await db.execute(
+            select(Equipment.id, Equipment.current_holder_id).where(Equipment.id.in_(equipment_ids))
+        )
+        holders = {str(row[0]): row[1] for row in result.fetchall()}
+
+    events = []
+    for entry in entries:
+        event_type = None
+        user_ids = []
+        data = None
+        if entry.table_name == "notifications" and entry.row_id in notifications:
+            notification = notifications[entry.row_id]
+            event_type = "notification"
+            user_ids = [notification.user_id]
+            data = NotificationResponse.model_validate(notification).model_dump(mode="json")
+        elif entry.table_name == "transfer_requests" and entry.row_id in requests:
+            request = requests[entry.row_id]
+            event_type = "transfer_request"
+            user_ids = [request.requester_id, request.holder_id]
+            data = serialize_row(request)
+        elif entry.table_name == "transfer_offers" and entry.row_id in offers:
+            offer = offers[entry.row_id]
+            request = offer_requests.get(str(offer.request_id))
+            event_type = "transfer_offer"
+            user_ids = [offer.offerer_id, request.requester_id if request else None]
+            data = serialize_row(offer)
+        elif entry.table_name == "transfers" and entry.row_id in transfers:
+            transfer = transfers[entry.row_id]
+            event_type = "transfer"
+            user_ids = [transfer.from_user_id, transfer.to_user_id]
+            data = serialize_row(transfer)
+        elif entry.table_name == "calibrations" and entry.row_id in calibrations:
+            calibration = calibrations[entry.row_id]
+            event_type = "calibration"
+            user_ids = [holders.get(str(calibration.equipment_id))]
+            data = serialize_row(calibration)
+
+        user_ids = list({user_id for user_id in user_ids if user_id})
+        if event_type and user_ids:
+            events.append(PushEvent(
+                id=_event_id(entry),
+                type=event_type,
+                user_ids=user_ids,
+                data={"op": entry.op, **data},
+            ))
+    return events
+
+
+def _deliver(event: PushEvent) -> None:
+    for user_id in event.user_ids:
+        for subscription in _subscribers.get(user_id, ()):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+
+
+@consumer("push", tables=PUSH_TABLES, shared=settings.PUSH_BACKEND == "redis")
+async def publish_changes(entries: List[ChangeLog]) -> None:
+    async with async_session_factory() as db:
+        events = await events_for(db, entries)
+    if settings.PUSH_BACKEND == "redis":
+        client = _redis_client()
+        try:
+            for event in events:
+                await client.publish(REDIS_CHANNEL, json.dumps({
+                    "id": event.id,
+                    "type": event.type,
+                    "user_ids": [str(user_id) for user_id in event.user_ids],
+                    "data": event.data,
+                }, default=str))
+        finally:
+            await client.aclose()
+    else:
+        for event in events:
+            _deliver(event)
+
+
+def _redis_client():
+    # Only needed for the redis backend
+    import redis.asyncio as redis
+    return redis.from_url(settings.REDIS_URL)
+
+
+async def _listen_redis() -> None:
+    while True:
+        client = _redis_client()
+        try:
+            async with client.pubsub() as pubsub:
+                await pubsub.subscribe(REDIS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    _deliver(PushEvent(
+                        id=payload["id"],
+                        type=payload["type"],
+                        user_ids=[uuid.UUID(user_id) for user_id in payload["user_ids"]],
+                        data=payload["data"],
+                    ))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Push listener lost its Redis connection")
+            await asyncio.sleep(settings.PUSH_HEARTBEAT_SECONDS)
+        finally:
+            await client.aclose()
+
+
+def start() -> None:
+    global _redis_listener
+    if settings.PUSH_BACKEND == "redis":
+        _redis_listener = asyncio.create_task(_listen_redis(), name="push:redis")
+
+
+async def stop() -> None:
+    global _redis_listener
+    if _redis_listener:
+        _redis_listener.cancel()
+        await asyncio.gather(_redis_listener, return_exceptions=True)
+        _redis_listener = None
+
+
+async def replay(user_id: uuid.UUID, after: Position) -> AsyncIterator[PushEvent]:
+    """Events for a user since a position, or a single reset event if too far behind"""
+    scanned = 0
+    async with async_session_factory() as db:
+        while True:
+            entries = await read_changes(db, after, PUSH_TABLES, 500)
+            if not entries:
+                return
+            scanned += len(entries)
+            if scanned > settings.PUSH_REPLAY_MAX_ENTRIES:
+                yield PushEvent(id=_event_id(entries[-1]), type="reset", user_ids=[user_id], data={})
+                return
+            for event in await events_for(db, entries):
+                if user_id in event.user_ids:
+                    yield event
+            after = (entries[-1].version, entries[-1].seq)
+
+
+async def user_events(user_id: uuid.UUID, last_event_id: Optional[str] = None) -> AsyncIterator[Optional[PushEvent]]:
+    """Stream of a user's events; None marks a heartbeat.
+
+    Live events are buffered from before the replay starts, and those the
+    replay already covered are skipped, so nothing falls in between.
+    """
+    subscription = Subscription(user_id=user_id)
+    _subscribers[user_id].add(subscription)
+    try:
+        position = parse_event_id(last_event_id)
+        if position:
+            async for event in replay(user_id, position):
+                yield event
+                position = event.position
+                if event.type == "reset":
+                    break
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.PUSH_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if subscription.overflowed:
+                # Resuming from the last delivered id replays what was dropped
+                return
+            if position and event.position <= position:
+                continue
+            yield event
+    finally:
+        _subscribers[user_id].discard(subscription)
+        if not _subscribers[user_id]:
+            del _subscribers[user_id]
@@ -0,0 +1,267 @@
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import quote, urlencode
+
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+@dataclass
+class SpooledUpload:
+    """Upload streamed to a temporary file on local disk"""
+    path: str
+    size: int
+    content_type: Optional[str]
+    filename: Optional[str]
+    sha256: str
+
+    def cleanup(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class StorageBackend:
+    """Object storage interface used for photos and certificates"""
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    async def get_file(self, key: str, path: str) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def stat(self, key: str) -> Optional[int]:
+        """Size of a stored object, or None if it does not exist"""
+        raise NotImplementedError
+
+    async def move(self, source_key: str, target_key: str) -> None:
+        raise NotImplementedError
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def presigned_url(self, method: str, key: str, expires: timedelta) -> str:
+        """Short-lived URL letting a client GET or PUT an object without going through the API"""
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """Filesystem stand-in for MinIO/S3, served by the API under LOCAL_STORAGE_URL"""
+
+    def __init__(self, root: str, base_url: str):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        target = self.path_for(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        await run_in_threadpool(shutil.copyfile, path, target)
+
+    async def get_file(self, key: str, path: str) -> None:
+        await run_in_threadpool(shutil.copyfile, self.path_for(key), path)
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.unlink(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    async def stat(self, key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path_for(key))
+        except FileNotFoundError:
+            return None
+
+    async def move(self, source_key: str, target_key: str) -> None:
+        target = self.path_for(target_key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.path_for(source_key), target)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def presigned_url(self, method: str, key: str, expires: timedelta) -> str:
+        # Served by the /storage routes, which check the signature
+        expires_at = int(time.time() + expires.total_seconds())
+        query = urlencode({
+            "expires": expires_at,
+            "signature": local_signature(method, key, expires_at),
+        })
+        return f"{settings.API_V1_PREFIX}/storage/{quote(key)}?{query}"
+
+
+class MinioStorage(StorageBackend):
+    """MinIO/S3 backend; files are sent with multipart uploads straight from disk"""
+
+    def __init__(self):
+        from minio import Minio
+
+        self.client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+        )
+        self.bucket = settings.MINIO_BUCKET
+        scheme = "https" if settings.MINIO_SECURE else "http"
+        self.public_url = (
+            settings.MINIO_PUBLIC_URL or f"{scheme}://{settings.MINIO_ENDPOINT}/{self.bucket}"
+        ).rstrip("/")
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> None:
+        await run_in_threadpool(
+            self.client.fput_object,
+            self.bucket,
+            key,
+            path,
+            content_type=content_type or "application/octet-stream",
+        )
+
+    async def get_file(self, key: str, path: str) -> None:
+        await run_in_threadpool(self.client.fget_object, self.bucket, key, path)
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self.client.remove_object, self.bucket, key)
+
+    async def stat(self, key: str) -> Optional[int]:
+        from minio.error import S3Error
+
+        try:
+            result = await run_in_threadpool(self.client.stat_object, self.bucket, key)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return None
+            raise
+        return result.size
+
+    async def move(self, source_key: str, target_key: str) -> None:
+        from minio.commonconfig import CopySource
+
+        # Server-side copy, the object never passes through the API
+        await run_in_threadpool(
+            self.client.copy_object, self.bucket, target_key, CopySource(self.bucket, source_key)
+        )
+        await self.delete(source_key)
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def presigned_url(self, method: str, key: str, expires: timedelta) -> str:
+        return self.client.get_presigned_url(method, self.bucket, key, expires=expires)
+
+
+@lru_cache()
+def get_storage() -> StorageBackend:
+    if settings.STORAGE_TYPE == "local":
+        return LocalStorage(settings.LOCAL_STORAGE_DIR, settings.LOCAL_STORAGE_URL)
+    return MinioStorage()
+
+
+def local_signature(method: str, key: str, expires_at: int) -> str:
+    """HMAC for LocalStorage presigned URLs"""
+    message = f"{method.upper()}\n{key}\n{expires_at}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_local_signature(method: str, key: str, expires_at: int, signature: str) -> bool:
+    if expires_at < time.time():
+        return False
+    return hmac.compare_digest(local_signature(method, key, expires_at), signature)
+
+
+def key_from_url(url: Optional[str]) -> Optional[str]:
+    """Map a stored file URL back to its storage key"""
+    if not url:
+        return None
+    storage = get_storage()
+    prefix = storage.url("")
+    if url.startswith(prefix):
+        return url[len(prefix):]
+    return None
+
+
+def presigned_url_for(method: str, key: str) -> tuple:
+    """Presigned URL for key and its expiry time"""
+    expires = timedelta(minutes=settings.PRESIGNED_URL_EXPIRE_MINUTES)
+    return get_storage().presigned_url(method, key, expires), datetime.utcnow() + expires
+
+
+async def spool_upload(
+    file: UploadFile,
+    allowed_types: Optional[list] = None,
+    max_size: int = settings.MAX_UPLOAD_SIZE,
+) -> SpooledUpload:
+    """Stream an upload to a temporary file in fixed-size chunks"""
+    if allowed_types and file.content_type not in allowed_types:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported file type: {file.content_type}"
+        )
+
+    fd, path = tempfile.mkstemp(prefix="upload_")
+    os.close(fd)
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds maximum size of {max_size // (1024 * 1024)} MB"
+                    )
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    return SpooledUpload(
+        path=path,
+        size=size,
+        content_type=file.content_type,
+        filename=file.filename,
+        sha256=digest.hexdigest(),
+    )
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        while chunk := handle.read(settings.UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_extension(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext:
+        return ext
+    return {
+        "image/jpeg": ".jpg",
+        "image/png": ".png",
+        "image/webp": ".webp",
+        "application/pdf": ".pdf",
+    }.get(content_type or "", "")
@@ -0,0 +1,285 @@
+"""Delta sync for offline clients.
+
+Every synced row carries sync_version, the id of the transaction that last
+wrote it, and deletions leave a SyncTombstone. A sync token is the xmin of
+the snapshot taken at the start of a pull: every transaction below it had
+finished by then, so the next pull only needs rows with
+sync_version >= token. Transactions still running at that point have ids
+at or above the token and are picked up next time, whatever order they
+commit in. Rows may occasionally be delivered twice; clients upsert.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import select, delete, or_, func, event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.core.config import settings
+from app.core.database import Base, async_session_factory
+from app.core.permissions import Permission, get_user_role, has_permission
+from app.models.checkout import Checkout
+from app.models.equipment import Equipment, EquipmentTag, Category, Location
+from app.models.sync import SyncTombstone, RECORD_TOMBSTONE_FUNCTION, tombstone_trigger_ddl
+from app.models.system import SystemSetting
+from app.models.transfer import TransferRequest, Transfer
+from app.models.user import User
+from app.schemas.checkout import CheckoutCreate, CheckoutReturn, CheckoutExtend
+from app.schemas.equipment import EquipmentUpdate
+from app.schemas.sync import SyncOperation, SyncOperationResult
+from app.services.checkouts import get_checkout, checkout_equipment, return_equipment, extend_return_date
+from app.services.jobs import periodic
+
+TOMBSTONE_HORIZON_KEY = "sync_tombstone_horizon"
+
+
+@dataclass
+class SyncEntity:
+    name: str
+    model: type
+    # Restricts rows to those visible to the user; None syncs the whole table
+    scope: Optional[Callable[[User], object]] = None
+
+
+SYNC_ENTITIES = [
+    SyncEntity("equipment", Equipment),
+    SyncEntity("tags", EquipmentTag),
+    SyncEntity("categories", Category),
+    SyncEntity("locations", Location),
+    SyncEntity("checkouts", Checkout, lambda user: Checkout.user_id == user.id),
+    SyncEntity(
+        "transfer_requests",
+        TransferRequest,
+        lambda user: or_(TransferRequest.requester_id == user.id, TransferRequest.holder_id == user.id),
+    ),
+    SyncEntity(
+        "transfers",
+        Transfer,
+        lambda user: or_(Transfer.from_user_id == user.id, Transfer.to_user_id == user.id),
+    ),
+]
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_tombstone_triggers(target, connection, **kw) -> None:
+    # Runs on every init_db(); all statements are idempotent
+    connection.execute(text(RECORD_TOMBSTONE_FUNCTION))
+    for entity in SYNC_ENTITIES:
+        connection.execute(text(tombstone_trigger_ddl(entity.model.__tablename__, entity.name)))
+
+
+def serialize_row(obj) -> dict:
+    """Flat column dict, the shape of the client's local tables"""
+    return jsonable_encoder({column.key: getattr(obj, column.key) for column in obj.__table__.columns})
+
+
+def parse_token(token: Optional[str]) -> Optional[int]:
+    if not token:
+        return None
+    try:
+        return int(token)
+    except ValueError:
+        return None
+
+
+async def snapshot_token(db: AsyncSession) -> int:
+    return (await db.execute(
+        text("SELECT (pg_snapshot_xmin(pg_current_snapshot())::text)::bigint")
+    )).scalar_one()
+
+
+async def tombstone_horizon(db: AsyncSession) -> int:
+    setting = (await db.execute(
+        select(SystemSetting).where(SystemSetting.key == TOMBSTONE_HORIZON_KEY)
+    )).scalar_one_or_none()
+    return int(setting.value["version"]) if setting and setting.value else 0
+
+
+async def pull_changes(db: AsyncSession, user: User, since: Optional[int]) -> dict:
+    """Rows and deletions since a token, plus the token for the next pull.
+
+    Without a token, or with one older than the pruned tombstones, the
+    response is a full snapshot with reset set and the client must drop
+    rows it did not receive.
+    """
+    # Taken before reading so that nothing committed after it can be skipped
+    token = await snapshot_token(db)
+
+    reset = since is None or since < await tombstone_horizon(db)
+    changes = {}
+    deleted = {}
+
+    for entity in SYNC_ENTITIES:
+        query = select(entity.model)
+        if entity.scope is not None:
+            query = query.where(entity.scope(user))
+        if not reset:
+            query = query.where(entity.model.sync_version >= since)
+        rows = (await db.execute(query.order_by(entity.model.sync_version))).scalars().all()
+        changes[entity.name] = [serialize_row(row) for row in rows]
+
+        if not reset:
+            result = await db.execute(
+                select(SyncTombstone.entity_id)
+                .where(
+                    SyncTombstone.entity == entity.name,
+                    SyncTombstone.sync_version >= since
+                )
+                .distinct()
+            )
+            deleted[entity.name] = [str(row[0]) for row in result.fetchall()]
+        else:
+            deleted[entity.name] = []
+
+    return {
+        "token": str(token),
+        "reset": reset,
+        "changes": changes,
+        "deleted": deleted,
+    }
+
+
+class SyncConflict(Exception):
+    """Row changed on the server since the client last pulled it"""
+
+    def __init__(self, current):
+        self.current = current
+
+
+def check_base_version(obj, op: SyncOperation) -> None:
+    if op.base_version is not None and obj.sync_version != op.base_version:
+        raise SyncConflict(serialize_row(obj))
+
+
+async def _update_equipment(db: AsyncSession, user: User, op: SyncOperation):
+    if not has_permission(get_user_role(user), Permission.EQUIPMENT_EDIT):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Permission denied: {Permission.EQUIPMENT_EDIT.value}"
+        )
+    equipment = await db.get(Equipment, op.id)
+    if not equipment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Equipment not found"
+        )
+    check_base_version(equipment, op)
+
+    update_data = EquipmentUpdate.model_validate(op.data).model_dump(exclude_unset=True)
+    if "internal_code" in update_data and update_data["internal_code"] != equipment.internal_code:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="internal_code cannot be changed offline"
+        )
+    for field, value in update_data.items():
+        setattr(equipment, field, value)
+    return equipment
+
+
+async def _create_checkout(db: AsyncSession, user: User, op: SyncOperation):
+    # The client-generated id makes a retried create a no-op
+    existing = await db.get(Checkout, op.id) if op.id else None
+    if existing:
+        return existing
+    return await checkout_equipment(db, CheckoutCreate.model_validate(op.data), user, checkout_id=op.id)
+
+
+async def _return_checkout(db: AsyncSession, user: User, op: SyncOperation):
+    checkout = await get_checkout(db, op.id)
+    check_base_version(checkout, op)
+    return_equipment(checkout, CheckoutReturn.model_validate(op.data), user)
+    return checkout
+
+
+async def _extend_checkout(db: AsyncSession, user: User, op: SyncOperation):
+    checkout = await get_checkout(db, op.id)
+    check_base_version(checkout, op)
+    extend_return_date(checkout, CheckoutExtend.model_validate(op.data))
+    return checkout
+
+
+PUSH_HANDLERS = {
+    ("equipment", "update"): _update_equipment,
+    ("checkouts", "create"): _create_checkout,
+    ("checkouts", "return"): _return_checkout,
+    ("checkouts", "extend"): _extend_checkout,
+}
+
+
+async def apply_operations(db: AsyncSession, user: User, operations: list) -> list:
+    """Apply offline mutations in order, each in its own savepoint.
+
+    A failed or conflicting operation is reported and skipped without
+    affecting the rest of the batch.
+    """
+    results = []
+    for op in operations:
+        handler = PUSH_HANDLERS.get((op.entity, op.action))
+        if not handler:
+            results.append(SyncOperationResult(
+                op_id=op.op_id, status="error", id=op.id,
+                detail=f"Unsupported operation: {op.entity}.{op.action}"
+            ))
+            continue
+
+        try:
+            async with db.begin_nested():
+                obj = await handler(db, user, op)
+            results.append(SyncOperationResult(
+                op_id=op.op_id, status="applied", id=obj.id, sync_version=obj.sync_version
+            ))
+        except SyncConflict as e:
+            results.append(SyncOperationResult(
+                op_id=op.op_id, status="conflict", id=op.id,
+                detail="Changed on the server since last sync", current=e.current
+            ))
+        except StaleDataError:
+            # Another request wrote the row between this one's read and write
+            results.append(SyncOperationResult(
+                op_id=op.op_id, status="conflict", id=op.id,
+                detail="Changed on the server while syncing"
+            ))
+        except HTTPException as e:
+            results.append(SyncOperationResult(
+                op_id=op.op_id, status="error", id=op.id, detail=str(e.detail)
+            ))
+        except ValidationError as e:
+            results.append(SyncOperationResult(
+                op_id=op.op_id, status="error", id=op.id, detail=str(e)
+            ))
+
+    await db.commit()
+    return results
+
+
+@periodic("sync.prune_tombstones", interval_seconds=24 * 3600)
+async def prune_tombstones() -> dict:
+    """Drop old tombstones; clients with older tokens get a full resync"""
+    cutoff = datetime.utcnow() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    async with async_session_factory() as db:
+        horizon = (await db.execute(
+            select(func.max(SyncTombstone.sync_version)).where(SyncTombstone.deleted_at < cutoff)
+        )).scalar()
+        if horizon is None:
+            return {"pruned": 0}
+
+        result = await db.execute(
+            delete(SyncTombstone).where(SyncTombstone.sync_version <= horizon)
+        )
+        # Tokens at or below the last pruned version could miss a deletion
+        setting = (await db.execute(
+            select(SystemSetting).where(SystemSetting.key == TOMBSTONE_HORIZON_KEY)
+        )).scalar_one_or_none()
+        if not setting:
+            setting = SystemSetting(
+                key=TOMBSTONE_HORIZON_KEY,
+                description="Oldest sync token that still receives all deletions"
+            )
+            db.add(setting)
+        setting.value = {"version": horizon + 1}
+        await db.commit()
+        return {"pruned": result.rowcount}
@@ -0,0 +1,117 @@
+"""Expiry of transfer requests.
+
+Requests still pending or awaiting approval at expires_at are moved to
+expired by a periodic sweep, with their open offers rejected and their
+broadcast matches dropped in the same statement. Between sweeps the
+routes refuse to act on a request past its expiry.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import text
+
+from app.core.database import async_session_factory
+from app.models.change_log import CURRENT_TXID
+from app.models.transfer import TransferRequest, ACTIVE_REQUEST_STATUSES, ACTIVE_REQUEST_WHERE
+from app.services.jobs import periodic
+from app.services.notifications import NotificationEvent, enqueue_notify
+
+# Requests expired per statement; row locks are held for one batch only
+EXPIRE_BATCH_SIZE = 500
+
+# Expires one batch and returns who to tell: the requester of each request
+# and the offerer of each offer it rejected. Rows locked by a request
+# being handled right now are left for the next sweep.
+EXPIRE_REQUESTS = text(f"""
+    WITH due AS (
+        SELECT id FROM transfer_requests
+        WHERE {ACTIVE_REQUEST_WHERE.text} AND expires_at <= :now
+        ORDER BY expires_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    expired AS (
+        UPDATE transfer_requests r
+        SET status = 'expired', updated_at = :now, version = r.version + 1,
+            sync_version = {CURRENT_TXID.text}
+        FROM due WHERE r.id = due.id
+        RETURNING r.id, r.requester_id, r.equipment_id, r.category_id
+    ),
+    offers AS (
+        UPDATE transfer_offers o
+        SET status = 'rejected'
+        FROM expired WHERE o.request_id = expired.id AND o.status = 'pending'
+        RETURNING o.id, o.request_id, o.offerer_id
+    ),
+    matches AS (
+        DELETE FROM transfer_request_matches m
+        USING expired WHERE m.request_id = expired.id
+    )
+    SELECT 'request', expired.id, expired.requester_id, coalesce(e.name, c.name)
+    FROM expired
+    LEFT JOIN equipment e ON e.id = expired.equipment_id
+    LEFT JOIN categories c ON c.id = expired.category_id
+    UNION ALL
+    SELECT 'offer', offers.id, offers.offerer_id, coalesce(e.name, c.name)
+    FROM offers
+    JOIN expired ON expired.id = offers.request_id
+    LEFT JOIN equipment e ON e.id = expired.equipment_id
+    LEFT JOIN categories c ON c.id = expired.category_id
+""")
+
+
+def ensure_not_expired(transfer_request: TransferRequest) -> None:
+    """Refuse an active request whose expiry has passed but was not swept yet"""
+    if (
+        transfer_request.status in ACTIVE_REQUEST_STATUSES
+        and transfer_request.expires_at
+        and transfer_request.expires_at <= datetime.utcnow()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Request has expired"
+        )
+
+
+@periodic("transfers.expire_requests", interval_seconds=300)
+async def expire_requests() -> dict:
+    counts = defaultdict(int)
+    while True:
+        async with async_session_factory() as db:
+            rows = (await db.execute(
+                EXPIRE_REQUESTS, {"now": datetime.utcnow(), "batch_size": EXPIRE_BATCH_SIZE}
+            )).fetchall()
+            await enqueue_notify(db, _expiry_events(rows))
+            await db.commit()
+
+        for kind, _, _, _ in rows:
+            counts[kind] += 1
+        if sum(1 for row in rows if row[0] == "request") < EXPIRE_BATCH_SIZE:
+            break
+    return {"requests": counts["request"], "offers": counts["offer"]}
+
+
+def _expiry_events(rows) -> list:
+    events = []
+    for kind, entity_id, user_id, label in rows:
+        label = label or "equipment"
+        if kind == "request":
+            events.append(NotificationEvent(
+                type="transfer_request_expired",
+                title=f"Your request for {label} expired",
+                recipients=[user_id],
+                entity_type="transfer_request",
+                entity_id=entity_id,
+                digest_key="transfer_request_expired",
+                digest_title="{count} of your transfer requests expired",
+            ))
+        else:
+            events.append(NotificationEvent(
+                type="transfer_offer_rejected",
+                title=f"The request you offered {label} for expired",
+                recipients=[user_id],
+                entity_type="transfer_offer",
+                entity_id=entity_id,
+            ))
+    return events
@@ -0,0 +1,134 @@
+"""Candidate holders for broadcast transfer requests.
+
+A user is a candidate for a pending broadcast if they hold transferable
+equipment in service in the requested category or one below it. Each
+candidate is kept in transfer_request_matches with the distance from the
+request location to the nearest such piece, so "requests I can fulfil"
+is one index range per user. Matching runs as a job when a broadcast is
+created and periodically for all of them, since holdings change.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import async_session_factory
+from app.models.equipment import Category
+from app.models.transfer import TransferRequest
+from app.models.user import User
+from app.services.jobs import enqueue, periodic, task
+from app.services.notifications import NotificationEvent, enqueue_notify
+
+EARTH_RADIUS_KM = 6371.0
+
+_HAVERSINE_KM = f"""
+    2 * {EARTH_RADIUS_KM} * asin(least(1, sqrt(
+        power(sin(radians(el.gps_lat::float8 - req.gps_lat::float8) / 2), 2)
+        + cos(radians(req.gps_lat::float8)) * cos(radians(el.gps_lat::float8))
+        * power(sin(radians(el.gps_lng::float8 - req.gps_lng::float8) / 2), 2)
+    )))
+"""
+
+# Recomputes the matches of one request, or of all pending broadcasts when
+# :request_id is null, dropping those that no longer hold. RETURNING tells
+# new matches (xmax = 0) from refreshed ones.
+MATCH_REQUESTS = text(f"""
+    WITH req AS (
+        SELECT r.id, r.requester_id, c.path, l.gps_lat, l.gps_lng
+        FROM transfer_requests r
+        JOIN categories c ON c.id = r.category_id
+        LEFT JOIN locations l ON l.id = r.location_id
+        WHERE r.request_type = 'broadcast' AND r.status = 'pending'
+          AND (CAST(:request_id AS uuid) IS NULL OR r.id = CAST(:request_id AS uuid))
+    ),
+    matches AS (
+        SELECT req.id AS request_id, e.current_holder_id AS user_id,
+               count(*) AS equipment_count, min({_HAVERSINE_KM}) AS distance_km
+        FROM req
+        JOIN categories ec ON ec.path >= req.path AND ec.path < left(req.path, -1) || '0'
+        JOIN equipment e ON e.category_id = ec.id
+        LEFT JOIN locations el ON el.id = e.current_location_id
+        WHERE e.is_transferable AND e.is_main_item
+          AND e.status IN ('available', 'checked_out')
+          AND e.current_holder_id IS NOT NULL
+          AND e.current_holder_id <> req.requester_id
+        GROUP BY req.id, e.current_holder_id
+    ),
+    stale AS (
+        DELETE FROM transfer_request_matches m
+        WHERE (CAST(:request_id AS uuid) IS NULL OR m.request_id = CAST(:request_id AS uuid))
+          AND NOT EXISTS (
+              SELECT 1 FROM matches
+              WHERE matches.request_id = m.request_id AND matches.user_id = m.user_id
+          )
+    )
+    INSERT INTO transfer_request_matches (request_id, user_id, equipment_count, distance_km, matched_at)
+    SELECT request_id, user_id, equipment_count, distance_km, :now FROM matches
+    ON CONFLICT (request_id, user_id) DO UPDATE
+    SET equipment_count = EXCLUDED.equipment_count, distance_km = EXCLUDED.distance_km
+    RETURNING request_id, user_id, xmax = 0 AS inserted
+""")
+
+
+async def match_requests(request_id: Optional[uuid.UUID] = None) -> dict:
+    """Refresh matches and notify users who became candidates"""
+    async with async_session_factory() as db:
+        rows = (await db.execute(
+            MATCH_REQUESTS, {"request_id": request_id, "now": datetime.utcnow()}
+        )).fetchall()
+
+        new_matches = defaultdict(list)
+        for matched_request_id, user_id, inserted in rows:
+            if inserted:
+                new_matches[matched_request_id].append(user_id)
+
+        labels = {}
+        if new_matches:
+            result = await db.execute(
+                select(TransferRequest.id, User.full_name, Category.name)
+                .join(User, User.id == TransferRequest.requester_id)
+                .join(Category, Category.id == TransferRequest.category_id)
+                .where(TransferRequest.id.in_(list(new_matches)))
+            )
+            labels = {row[0]: (row[1], row[2]) for row in result.fetchall()}
+
+        # Queued with the matches: a match counts as new only once, so its
+        # notification must not be lost after the upsert commits
+        await enqueue_notify(db, [
+            NotificationEvent(
+                type="transfer_broadcast",
+                title=f"{labels[matched_request_id][0]} needs {labels[matched_request_id][1]}",
+                message="You hold equipment that could fulfil this request",
+                recipients=user_ids,
+                entity_type="transfer_request",
+                entity_id=matched_request_id,
+                digest_key="transfer_broadcast",
+                digest_title="{count} requests you could fulfil",
+            )
+            for matched_request_id, user_ids in new_matches.items()
+            if matched_request_id in labels
+        ])
+        await db.commit()
+    return {"matches": len(rows), "new": sum(len(user_ids) for user_ids in new_matches.values())}
+
+
+async def enqueue_match(db: AsyncSession, transfer_request: TransferRequest) -> None:
+    """Match a new broadcast once the caller's transaction commits"""
+    if transfer_request.category_id:
+        await enqueue(
+            db, "transfers.match", {"request_id": transfer_request.id}, created_by=transfer_request.requester_id
+        )
+
+
+@task("transfers.match")
+async def match_request(request_id: str) -> dict:
+    """Job enqueued with each new broadcast request"""
+    return await match_requests(uuid.UUID(request_id))
+
+
+@periodic("transfers.refresh_matches", interval_seconds=900)
+async def refresh_matches() -> dict:
+    return await match_requests()
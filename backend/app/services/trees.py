@@ -0,0 +1,113 @@
+"""Location and category trees.
+
+A tree is read with one query and assembled in memory. The assembled
+forest is cached per process until change_log reports a write to its
+table; writes made through this process drop it at once.
+"""
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models.change_log import ChangeLog
+from app.models.equipment import Category, Equipment, Location
+from app.schemas.category import CategoryResponse
+from app.schemas.location import LocationResponse
+from app.services.changes import consumer
+
+TREE_TABLES = ["categories", "locations"]
+
+
+@dataclass
+class Forest:
+    # Serialized rows by id, without children
+    nodes: Dict[str, dict]
+    # Child ids by parent id, None for roots, in query order
+    children: Dict[Optional[str], List[str]]
+
+    def tree(self, node_id: str, max_depth: Optional[int] = None, extra: Optional[Dict[str, dict]] = None) -> dict:
+        """A node with its subtree; levels below max_depth are left out.
+
+        extra holds fields to add to nodes, by node id.
+        """
+        return self._subtree(node_id, max_depth, extra or {}, set())
+
+    def roots(self, max_depth: Optional[int] = None, extra: Optional[Dict[str, dict]] = None) -> List[dict]:
+        return [self.tree(node_id, max_depth, extra) for node_id in self.children.get(None, [])]
+
+    def _subtree(self, node_id: str, depth: Optional[int], extra: Dict[str, dict], seen: set) -> dict:
+        # seen guards against a parent cycle written around the API
+        seen.add(node_id)
+        children = []
+        if depth is None or depth > 1:
+            children = [
+                self._subtree(child_id, depth - 1 if depth else None, extra, seen)
+                for child_id in self.children.get(node_id, []) if child_id not in seen
+            ]
+        return {**self.nodes[node_id], **extra.get(node_id, {}), "children": children}
+
+
+def build_forest(rows: List[dict], parent_key: str) -> Forest:
+    children = defaultdict(list)
+    for row in rows:
+        children[row[parent_key]].append(row["id"])
+    return Forest(nodes={row["id"]: row for row in rows}, children=dict(children))
+
+
+_forests: Dict[str, Forest] = {}
+_generations: Counter = Counter()
+
+
+def invalidate(table_name: str) -> None:
+    _generations[table_name] += 1
+    _forests.pop(table_name, None)
+
+
+async def cached_forest(table_name: str, load: Callable[[], Awaitable[Forest]]) -> Forest:
+    forest = _forests.get(table_name)
+    if forest is None:
+        generation = _generations[table_name]
+        forest = await load()
+        # Not kept if a write was reported while loading
+        if _generations[table_name] == generation:
+            _forests[table_name] = forest
+    return forest
+
+
+async def category_forest(db: AsyncSession) -> Forest:
+    async def load() -> Forest:
+        result = await db.execute(select(Category).order_by(Category.name))
+        rows = [CategoryResponse.model_validate(category).model_dump(mode="json") for category in result.scalars()]
+        return build_forest(rows, "parent_category_id")
+    return await cached_forest("categories", load)
+
+
+async def location_equipment_counts(db: AsyncSession) -> Dict[str, dict]:
+    """equipment_count per location, including everything below it"""
+    node = aliased(Location)
+    result = await db.execute(
+        select(node.id, func.count(Equipment.id))
+        .join(Location, Location.in_subtree_of(node))
+        .join(Equipment, Equipment.current_location_id == Location.id)
+        .where(Equipment.is_main_item == True)
+        .group_by(node.id)
+    )
+    counts = {str(location_id): count for location_id, count in result.fetchall()}
+    return {node_id: {"equipment_count": counts.get(node_id, 0)} for node_id in (await location_forest(db)).nodes}
+
+
+async def location_forest(db: AsyncSession) -> Forest:
+    async def load() -> Forest:
+        result = await db.execute(select(Location).order_by(Location.name))
+        rows = [LocationResponse.model_validate(location).model_dump(mode="json") for location in result.scalars()]
+        return build_forest(rows, "parent_location_id")
+    return await cached_forest("locations", load)
+
+
+@consumer("trees", tables=TREE_TABLES, shared=False)
+async def invalidate_changed(entries: List[ChangeLog]) -> None:
+    for table_name in {entry.table_name for entry in entries}:
+        invalidate(table_name)
@@ -0,0 +1,239 @@
+import base64
+import binascii
+import fcntl
+import hashlib
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import async_session_factory
+from app.models.upload import UploadSession
+from app.services.jobs import periodic
+from app.services.storage import SpooledUpload, file_sha256, get_storage
+
+
+def spool_path(upload_id) -> str:
+    return os.path.join(settings.UPLOAD_SPOOL_DIR, f"{upload_id}.part")
+
+
+def session_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+def parse_checksum_header(value: Optional[str]) -> Optional[bytes]:
+    """Parse a tus-style 'Upload-Checksum: sha256 <base64>' header"""
+    if not value:
+        return None
+    try:
+        algorithm, encoded = value.strip().split(" ", 1)
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except (ValueError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed Upload-Checksum header"
+        )
+    if algorithm.lower() != "sha256":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported checksum algorithm: {algorithm}"
+        )
+    return digest
+
+
+def create_spool_file(upload_id) -> None:
+    os.makedirs(settings.UPLOAD_SPOOL_DIR, exist_ok=True)
+    open(spool_path(upload_id), "wb").close()
+
+
+async def append_chunk(
+    db: AsyncSession,
+    upload: UploadSession,
+    offset: int,
+    body: AsyncIterator[bytes],
+    checksum: Optional[bytes] = None,
+) -> Tuple[int, datetime]:
+    """Write a chunk at offset, record the new offset and return it with the new expiry.
+
+    The spool file is locked from before the write until the new offset is
+    committed, so concurrent PATCH requests for the same upload (even from
+    different workers) cannot interleave and the file never runs ahead of
+    the session row. If the chunk is rejected or cannot be recorded the file
+    is truncated back to the original offset and the client can resend it.
+    """
+    if offset != upload.received_size:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Offset mismatch (expected {upload.received_size})"
+        )
+
+    path = spool_path(upload.id)
+    try:
+        handle = open(path, "r+b")
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Upload data is no longer available"
+        )
+
+    with handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Another chunk for this upload is being received"
+            )
+
+        # Offsets only advance under this lock, so the row is current here;
+        # another worker may have recorded a chunk before we got the lock
+        received_size = (await db.execute(
+            select(UploadSession.received_size).where(UploadSession.id == upload.id)
+        )).scalar_one()
+        await db.commit()
+        if received_size != offset:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Offset mismatch (expected {received_size})"
+            )
+
+        digest = hashlib.sha256()
+        written = 0
+        limit = min(settings.UPLOAD_MAX_CHUNK_SIZE, upload.total_size - offset)
+        try:
+            # Drop bytes left by a request that died before recording them
+            handle.truncate(offset)
+            handle.seek(offset)
+            async for data in body:
+                written += len(data)
+                if written > limit:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Chunk exceeds the maximum chunk size or the declared upload length"
+                    )
+                digest.update(data)
+                await run_in_threadpool(handle.write, data)
+            if checksum is not None and digest.digest() != checksum:
+                raise HTTPException(
+                    status_code=460,
+                    detail="Chunk checksum mismatch"
+                )
+            handle.flush()
+            expires_at = await _record_offset(db, upload.id, offset, offset + written)
+        except BaseException:
+            handle.truncate(offset)
+            raise
+
+    return offset + written, expires_at
+
+
+async def _record_offset(db: AsyncSession, upload_id, offset: int, new_offset: int) -> datetime:
+    result = await db.execute(
+        update(UploadSession)
+        .where(
+            UploadSession.id == upload_id,
+            UploadSession.received_size == offset
+        )
+        .values(received_size=new_offset, expires_at=session_expiry())
+        .returning(UploadSession.expires_at)
+    )
+    expires_at = result.scalar_one_or_none()
+    if expires_at is None:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload was modified concurrently"
+        )
+    await db.commit()
+    return expires_at
+
+
+async def take_completed_file(upload: UploadSession) -> SpooledUpload:
+    """Verify a fully received upload and hand its spool file over for processing"""
+    if upload.received_size != upload.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload incomplete ({upload.received_size} of {upload.total_size} bytes)"
+        )
+
+    path = spool_path(upload.id)
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Upload data is no longer available"
+        )
+
+    actual = await run_in_threadpool(file_sha256, path)
+    if upload.checksum_sha256 and actual != upload.checksum_sha256:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Checksum mismatch, upload must be restarted"
+        )
+
+    return SpooledUpload(
+        path=path,
+        size=upload.total_size,
+        content_type=upload.content_type,
+        filename=upload.filename,
+        sha256=actual,
+    )
+
+
+def remove_spool_file(upload_id) -> None:
+    try:
+        os.unlink(spool_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+@periodic("uploads.collect_abandoned", interval_seconds=3600)
+async def collect_abandoned_uploads() -> dict:
+    """Delete spool files and staged objects of expired uploads and prune old session rows"""
+    now = datetime.utcnow()
+    async with async_session_factory() as db:
+        result = await db.execute(
+            delete(UploadSession)
+            .where(
+                or_(
+                    and_(UploadSession.status == "uploading", UploadSession.expires_at < now),
+                    and_(
+                        UploadSession.status.in_(["completed", "aborted"]),
+                        UploadSession.updated_at < now - timedelta(days=7),
+                    ),
+                )
+            )
+            .returning(UploadSession.id, UploadSession.storage_key, UploadSession.status)
+        )
+        removed = result.fetchall()
+        await db.commit()
+
+    storage = get_storage()
+    for upload_id, storage_key, upload_status in removed:
+        if not storage_key:
+            remove_spool_file(upload_id)
+        elif upload_status == "uploading":
+            # Staged object a client uploaded directly but never completed
+            await storage.delete(storage_key)
+
+    # Spool files without a session row (e.g. crash between create and commit)
+    orphans = 0
+    if os.path.isdir(settings.UPLOAD_SPOOL_DIR):
+        cutoff = (now - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)).timestamp()
+        async with async_session_factory() as db:
+            live = {
+                str(row[0]) for row in (await db.execute(
+                    select(UploadSession.id).where(UploadSession.status == "uploading")
+                )).fetchall()
+            }
+        for name in os.listdir(settings.UPLOAD_SPOOL_DIR):
+            path = os.path.join(settings.UPLOAD_SPOOL_DIR, name)
+            if name.removesuffix(".part") not in live and os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                orphans += 1
+
+    return {"sessions_removed": len(removed), "orphan_files_removed": orphans}
@@ -8,7 +8,10 @@ Prerequisites:
 1. Run seed script first: python -m app.db.seed
 2. API must be running on localhost:8000 (or configure TEST_API_URL)
 """
+import hashlib
 import os
+import uuid
+from datetime import datetime
 import pytest
 import httpx
 from typing import Optional
@@ -182,6 +185,28 @@ class TestEquipment:
         assert data["checkouts"] == []
         assert data["maintenance"] == []
 
+    def test_upload_photo_unknown_equipment(self, client):
+        """Test photo upload for non-existent equipment"""
+        response = client.post(
+            "/equipment/00000000-0000-0000-0000-000000000000/photos",
+            params={"photo_type": "main"},
+            files={"file": ("photo.jpg", b"not-an-image", "image/jpeg")},
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 404
+
+    def test_attach_photo_unknown_hash(self, client):
+        """Test metadata-only photo upload for bytes that were never stored"""
+        list_response = client.get("/equipment", headers=get_auth_headers("worker"))
+        items = list_response.json()["items"]
+        if len(items) > 0:
+            response = client.post(
+                f"/equipment/{items[0]['id']}/photos/by-hash",
+                json={"sha256": "0" * 64, "photo_type": "main"},
+                headers=get_auth_headers("worker"),
+            )
+            assert response.status_code == 404
+
 
 # ============= Categories Tests =============
 
@@ -200,6 +225,69 @@ class TestCategories:
         response = client.get("/categories/tree", headers=get_auth_headers("worker"))
         assert response.status_code == 200
 
+    def create_category(self, client, name: str, parent_id=None) -> str:
+        response = client.post(
+            "/categories",
+            json={"name": f"{name} {uuid.uuid4().hex[:8]}", "parent_category_id": parent_id},
+            headers=get_auth_headers("manager"),
+        )
+        assert response.status_code == 201
+        return response.json()["id"]
+
+    def delete_categories(self, client, *category_ids):
+        # Leaves first, so no category is deleted before its children
+        for category_id in reversed(category_ids):
+            client.delete(f"/categories/{category_id}", headers=get_auth_headers("admin"))
+
+    def test_move_category_moves_subtree(self, client):
+        """Test that moving a category carries its descendants along"""
+        root = self.create_category(client, "Root")
+        child = self.create_category(client, "Child", root)
+        grandchild = self.create_category(client, "Grandchild", child)
+        target = self.create_category(client, "Target")
+        target_child = self.create_category(client, "Target child", target)
+        try:
+            response = client.patch(
+                f"/categories/{child}",
+                json={"parent_category_id": target_child},
+                headers=get_auth_headers("manager"),
+            )
+            assert response.status_code == 200
+            assert response.json()["depth"] == 2
+
+            response = client.get(f"/categories/{grandchild}", headers=get_auth_headers("worker"))
+            assert response.json()["parent_category_id"] == child
+            assert response.json()["depth"] == 3
+
+            tree = client.get("/categories/tree", headers=get_auth_headers("worker")).json()
+            nodes = {node["id"]: node for node in tree}
+            assert nodes[root]["children"] == []
+            moved = nodes[target]["children"][0]["children"]
+            assert [node["id"] for node in moved] == [child]
+            assert [node["id"] for node in moved[0]["children"]] == [grandchild]
+        finally:
+            self.delete_categories(client, target, target_child, child, grandchild, root)
+
+    def test_move_category_below_itself_rejected(self, client):
+        """Test that a category cannot become its own ancestor"""
+        root = self.create_category(client, "Root")
+        child = self.create_category(client, "Child", root)
+        grandchild = self.create_category(client, "Grandchild", child)
+        try:
+            for parent_id in (root, grandchild):
+                response = client.patch(
+                    f"/categories/{root}",
+                    json={"parent_category_id": parent_id},
+                    headers=get_auth_headers("manager"),
+                )
+                assert response.status_code == 400
+
+            response = client.get(f"/categories/{root}", headers=get_auth_headers("worker"))
+            assert response.json()["parent_category_id"] is None
+            assert response.json()["depth"] == 0
+        finally:
+            self.delete_categories(client, root, child, grandchild)
+
 
 # ============= Locations Tests =============
 
@@ -213,6 +301,27 @@ class TestLocations:
         data = response.json()
         assert isinstance(data, list)
 
+    def test_get_location_tree_max_depth(self, client):
+        """Test that max_depth=1 returns roots without children"""
+        response = client.get("/locations/tree", params={"max_depth": 1}, headers=get_auth_headers("worker"))
+        assert response.status_code == 200
+        assert all(node["children"] == [] for node in response.json())
+
+    def test_get_location_tree_with_counts(self, client):
+        """Test that with_counts adds subtree equipment counts"""
+        response = client.get("/locations/tree", params={"with_counts": True}, headers=get_auth_headers("worker"))
+        assert response.status_code == 200
+        for node in response.json():
+            assert node["equipment_count"] >= sum(child["equipment_count"] for child in node["children"])
+
+    def test_get_unknown_location_subtree(self, client):
+        """Test subtree of a non-existent location"""
+        response = client.get(
+            "/locations/00000000-0000-0000-0000-000000000000/tree",
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 404
+
 
 # ============= Tags Tests =============
 
@@ -253,6 +362,25 @@ class TestCalibrations:
         )
         assert response.status_code == 200
 
+    def test_run_reminders_queues_one_job(self, client):
+        """Test that a reminder run is queued as a job, shared by requests close together"""
+        job_ids = []
+        for _ in range(3):
+            response = client.post("/calibrations/reminders/run", headers=get_auth_headers("manager"))
+            assert response.status_code == 202
+            job_ids.append(response.json()["job_id"])
+        # Two of three requests fall within one window, even across its boundary
+        assert job_ids[0] == job_ids[1] or job_ids[1] == job_ids[2]
+
+        response = client.get(f"/jobs/{job_ids[-1]}", headers=get_auth_headers("manager"))
+        assert response.status_code == 200
+        assert response.json()["name"] == "calibrations.send_reminders"
+
+    def test_run_reminders_as_worker_forbidden(self, client):
+        """Test that workers cannot trigger a reminder run"""
+        response = client.post("/calibrations/reminders/run", headers=get_auth_headers("worker"))
+        assert response.status_code == 403
+
 
 # ============= Maintenance Tests =============
 
@@ -295,6 +423,83 @@ class TestTransfers:
         assert response.status_code == 200
         assert isinstance(response.json(), list)
 
+    def test_sent_requests_page(self, client):
+        """Test that limit bounds the sent requests list"""
+        response = client.get("/transfers/requests/sent", params={"limit": 1}, headers=get_auth_headers("worker"))
+        assert response.status_code == 200
+        assert len(response.json()) <= 1
+
+    def test_history_invalid_cursor(self, client):
+        """Test that a malformed cursor is rejected"""
+        response = client.get("/transfers/history", params={"cursor": "bogus"}, headers=get_auth_headers("worker"))
+        assert response.status_code == 400
+
+    def test_get_matching_requests(self, client):
+        """Test the feed of broadcast requests the user could fulfil"""
+        me = client.get("/auth/me", headers=get_auth_headers("worker")).json()
+        response = client.get(
+            "/transfers/requests/matching", headers=get_auth_headers("worker")
+        )
+        assert response.status_code == 200
+        requests = response.json()
+        assert all(request["request_type"] == "broadcast" for request in requests)
+        assert all(request["requester_id"] != me["id"] for request in requests)
+        distances = [request["distance_km"] for request in requests if request["distance_km"] is not None]
+        assert distances == sorted(distances)
+
+    def test_matches_unknown_request(self, client):
+        """Test that matches of a nonexistent request return 404"""
+        response = client.get(
+            "/transfers/requests/00000000-0000-0000-0000-000000000000/matches",
+            headers=get_auth_headers("worker")
+        )
+        assert response.status_code == 404
+
+    def test_idempotent_request_replayed(self, client):
+        """Test that a retried request with the same Idempotency-Key is not run twice"""
+        headers = {**get_auth_headers("worker"), "Idempotency-Key": os.urandom(16).hex()}
+        payload = {"request_type": "broadcast", "message": "Idempotency test"}
+
+        first = client.post("/transfers/requests", json=payload, headers=headers)
+        assert first.status_code == 201
+        retry = client.post("/transfers/requests", json=payload, headers=headers)
+        assert retry.status_code == 201
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        assert retry.json()["id"] == first.json()["id"]
+
+        other = client.post("/transfers/requests", json={**payload, "message": "Other"}, headers=headers)
+        assert other.status_code == 422
+
+    def test_idempotent_client_error_replayed(self, client):
+        """Test that a final client error is stored under its Idempotency-Key and replayed"""
+        headers = {**get_auth_headers("worker"), "Idempotency-Key": os.urandom(16).hex()}
+        url = "/transfers/offers/00000000-0000-0000-0000-000000000000/accept"
+
+        first = client.post(url, headers=headers)
+        assert first.status_code == 404
+        assert first.headers.get("Idempotent-Replayed") is None
+        retry = client.post(url, headers=headers)
+        assert retry.status_code == 404
+        assert retry.headers.get("Idempotent-Replayed") == "true"
+        assert retry.json() == first.json()
+
+    def test_accept_unknown_offer(self, client):
+        """Test that accepting a nonexistent offer returns 404"""
+        response = client.post(
+            "/transfers/offers/00000000-0000-0000-0000-000000000000/accept",
+            headers=get_auth_headers("worker")
+        )
+        assert response.status_code == 404
+
+    def test_confirm_receipt_unknown_transfer(self, client):
+        """Test that confirming receipt of a nonexistent transfer returns 404"""
+        response = client.post(
+            "/transfers/00000000-0000-0000-0000-000000000000/confirm-receipt",
+            json={},
+            headers=get_auth_headers("worker")
+        )
+        assert response.status_code == 404
+
     def test_get_pending_approvals_as_leader(self, client):
         """Test getting pending approvals (requires leader role)"""
         response = client.get(
@@ -311,6 +516,58 @@ class TestTransfers:
         assert response.status_code == 403
 
 
+# ============= Checkout Tests =============
+
+class TestCheckouts:
+    """Checkout endpoint tests"""
+
+    def test_batch_checkout_reports_unknown_items(self, client):
+        """Test that unknown ids and tags get per-item errors"""
+        response = client.post(
+            "/checkouts/batch",
+            json={
+                "equipment_ids": ["00000000-0000-0000-0000-000000000000"],
+                "tag_values": ["no-such-tag"],
+            },
+            headers=get_auth_headers("worker")
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["succeeded"] == 0
+        assert data["failed"] == 2
+        assert [item["detail"] for item in data["items"]] == ["Equipment not found", "Tag not found"]
+
+    def test_batch_return_nothing(self, client):
+        """Test that an empty batch return succeeds with no items"""
+        response = client.post("/checkouts/batch-return", json={}, headers=get_auth_headers("worker"))
+        assert response.status_code == 200
+        assert response.json()["items"] == []
+
+    def test_overdue_checkouts(self, client):
+        """Test that overdue checkouts are open, past due and listed longest overdue first"""
+        response = client.get("/checkouts/overdue", headers=get_auth_headers("leader"))
+        assert response.status_code == 200
+        checkouts = response.json()
+        now = datetime.utcnow().isoformat()
+        assert all(checkout["status"] in ("active", "overdue") for checkout in checkouts)
+        assert all(checkout["expected_return_at"] < now for checkout in checkouts)
+        due = [checkout["expected_return_at"] for checkout in checkouts]
+        assert due == sorted(due)
+
+    def test_active_filter_excludes_overdue(self, client):
+        """Test that status=active lists only checkouts not yet flagged overdue"""
+        for checkout_status in ("active", "overdue"):
+            response = client.get(
+                "/checkouts", params={"status": checkout_status, "size": 100}, headers=get_auth_headers("leader")
+            )
+            assert response.status_code == 200
+            assert {item["status"] for item in response.json()["items"]} <= {checkout_status}
+
+        response = client.get("/jobs/tasks", headers=get_auth_headers("admin"))
+        assert response.status_code == 200
+        assert "checkouts.mark_overdue" in [task["name"] for task in response.json()]
+
+
 # ============= Reports Tests =============
 
 class TestReports:
@@ -341,6 +598,311 @@ class TestReports:
         assert response.status_code == 403
 
 
+# ============= Upload Tests =============
+
+class TestUploads:
+    """Resumable upload endpoint tests"""
+
+    def test_create_upload_unknown_purpose(self, client):
+        """Test that unknown upload purposes are rejected"""
+        response = client.post(
+            "/uploads",
+            json={
+                "purpose": "avatar",
+                "target_id": "00000000-0000-0000-0000-000000000000",
+                "content_type": "image/jpeg",
+                "total_size": 1024,
+            },
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 400
+
+    def test_create_upload_unknown_equipment(self, client):
+        """Test creating an upload for non-existent equipment"""
+        response = client.post(
+            "/uploads",
+            json={
+                "purpose": "equipment_photo",
+                "target_id": "00000000-0000-0000-0000-000000000000",
+                "content_type": "image/jpeg",
+                "total_size": 1024,
+                "photo_type": "main",
+            },
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 404
+
+    def test_direct_photo_upload_requires_checksum(self, client):
+        """Test that direct-to-storage photo uploads must declare their hash"""
+        list_response = client.get("/equipment", headers=get_auth_headers("worker"))
+        items = list_response.json()["items"]
+        if len(items) > 0:
+            response = client.post(
+                "/uploads/direct",
+                json={
+                    "purpose": "equipment_photo",
+                    "target_id": items[0]["id"],
+                    "content_type": "image/jpeg",
+                    "total_size": 1024,
+                    "photo_type": "main",
+                },
+                headers=get_auth_headers("worker"),
+            )
+            assert response.status_code == 400
+
+    def test_resend_chunk_keeps_upload_resumable(self, client):
+        """Test that a chunk sent twice is refused without breaking the upload"""
+        list_response = client.get("/equipment", headers=get_auth_headers("worker"))
+        items = list_response.json()["items"]
+        if len(items) > 0:
+            response = client.post(
+                "/uploads",
+                json={
+                    "purpose": "equipment_photo",
+                    "target_id": items[0]["id"],
+                    "content_type": "image/jpeg",
+                    "total_size": 8,
+                    "photo_type": "detail",
+                },
+                headers=get_auth_headers("worker"),
+            )
+            assert response.status_code == 201
+            upload_id = response.json()["id"]
+
+            chunk_headers = {**get_auth_headers("worker"), "Upload-Offset": "0"}
+            response = client.patch(f"/uploads/{upload_id}", content=b"abcd", headers=chunk_headers)
+            assert response.status_code == 204
+            assert response.headers["Upload-Offset"] == "4"
+
+            response = client.patch(f"/uploads/{upload_id}", content=b"abcd", headers=chunk_headers)
+            assert response.status_code == 409
+
+            response = client.head(f"/uploads/{upload_id}", headers=get_auth_headers("worker"))
+            assert response.headers["Upload-Offset"] == "4"
+
+            response = client.patch(
+                f"/uploads/{upload_id}",
+                content=b"efgh",
+                headers={**get_auth_headers("worker"), "Upload-Offset": "4"},
+            )
+            assert response.status_code == 204
+            assert response.headers["Upload-Offset"] == "8"
+
+            client.delete(f"/uploads/{upload_id}", headers=get_auth_headers("worker"))
+
+    def test_mismatched_direct_upload_not_deduplicated(self, client):
+        """Test that a direct upload is not reused for its hash until its bytes are verified"""
+        list_response = client.get("/equipment", headers=get_auth_headers("worker"))
+        items = list_response.json()["items"]
+        if len(items) > 0:
+            real = b"real-" + uuid.uuid4().bytes
+            fake = b"fake-" + uuid.uuid4().bytes
+            sha256 = hashlib.sha256(real).hexdigest()
+            response = client.post(
+                "/uploads/direct",
+                json={
+                    "purpose": "equipment_photo",
+                    "target_id": items[0]["id"],
+                    "content_type": "image/jpeg",
+                    "total_size": len(fake),
+                    "photo_type": "detail",
+                    "checksum_sha256": sha256,
+                },
+                headers=get_auth_headers("worker"),
+            )
+            assert response.status_code == 201
+            upload = response.json()
+            upload_url = upload["upload_url"]
+            if upload_url.startswith("/"):
+                upload_url = TEST_API_URL.removesuffix("/api") + upload_url
+            httpx.put(upload_url, content=fake, headers=upload["upload_headers"]).raise_for_status()
+            response = client.post(f"/uploads/{upload['id']}/complete", headers=get_auth_headers("worker"))
+            assert response.status_code == 200
+
+            by_hash = {"sha256": sha256, "photo_type": "detail"}
+            response = client.post(
+                f"/equipment/{items[0]['id']}/photos/by-hash", json=by_hash, headers=get_auth_headers("worker")
+            )
+            assert response.status_code == 404
+
+            # Uploading the real bytes stores them over the unverified object
+            response = client.post(
+                f"/equipment/{items[0]['id']}/photos",
+                params={"photo_type": "detail"},
+                files={"file": ("photo.jpg", real, "image/jpeg")},
+                headers=get_auth_headers("worker"),
+            )
+            assert response.status_code in [200, 201]
+            assert response.json()["blob_sha256"] == sha256
+
+            response = client.post(
+                f"/equipment/{items[0]['id']}/photos/by-hash", json=by_hash, headers=get_auth_headers("worker")
+            )
+            assert response.status_code == 200
+
+    def test_storage_url_requires_signature(self, client):
+        """Test that local storage URLs reject bad signatures"""
+        response = client.get("/storage/blobs/test.jpg", params={"expires": 0, "signature": "x"})
+        assert response.status_code in [403, 404]
+
+
+# ============= Sync Tests =============
+
+class TestSync:
+    """Offline sync endpoint tests"""
+
+    def test_pull_without_token(self, client):
+        """Test that a first pull returns a full snapshot and a token"""
+        response = client.get("/sync/pull", headers=get_auth_headers("worker"))
+        assert response.status_code == 200
+        data = response.json()
+        assert data["reset"] is True
+        assert data["token"]
+        assert "equipment" in data["changes"]
+
+    def test_pull_with_token(self, client):
+        """Test an incremental pull"""
+        first = client.get("/sync/pull", headers=get_auth_headers("worker")).json()
+        response = client.get(
+            "/sync/pull",
+            params={"since": first["token"]},
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["reset"] is False
+        assert int(data["token"]) >= int(first["token"])
+
+    def test_pull_reports_deleted_rows(self, client):
+        """Test that a deleted row is listed once in the next incremental pull"""
+        first = client.get("/sync/pull", headers=get_auth_headers("worker")).json()
+        response = client.post(
+            "/categories",
+            json={"name": f"Sync test {uuid.uuid4().hex[:8]}"},
+            headers=get_auth_headers("manager"),
+        )
+        assert response.status_code == 201
+        category_id = response.json()["id"]
+        response = client.delete(f"/categories/{category_id}", headers=get_auth_headers("admin"))
+        assert response.status_code == 200
+
+        response = client.get(
+            "/sync/pull",
+            params={"since": first["token"]},
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 200
+        assert response.json()["deleted"]["categories"].count(category_id) == 1
+
+    def test_push_unsupported_operation(self, client):
+        """Test that unknown operations are reported per operation"""
+        response = client.post(
+            "/sync/push",
+            json={"operations": [{"op_id": "1", "entity": "users", "action": "delete"}]},
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 200
+        result = response.json()["results"][0]
+        assert result["op_id"] == "1"
+        assert result["status"] == "error"
+
+
+# ============= Notification Tests =============
+
+class TestNotifications:
+    """Notification endpoint tests"""
+
+    def test_mark_all_as_read(self, client):
+        """Test marking all notifications read leaves nothing unread"""
+        response = client.put("/notifications/read-all", headers=get_auth_headers("worker"))
+        assert response.status_code == 200
+        count = client.get("/notifications/unread-count", headers=get_auth_headers("worker")).json()
+        assert count["unread_count"] == 0
+
+    def test_unread_count_matches_list(self, client):
+        """Test that the unread badge counts exactly the unread notifications listed"""
+        listed = client.get(
+            "/notifications", params={"unread_only": True, "size": 1}, headers=get_auth_headers("manager")
+        )
+        assert listed.status_code == 200
+        count = client.get("/notifications/unread-count", headers=get_auth_headers("manager")).json()
+        assert count["unread_count"] == listed.json()["total"]
+
+    def test_bulk_requires_filter(self, client):
+        """Test that a bulk action without filters is rejected"""
+        response = client.post(
+            "/notifications/bulk",
+            json={"action": "delete"},
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 400
+
+    def test_bulk_mark_read_by_type(self, client):
+        """Test bulk mark-read by type"""
+        response = client.post(
+            "/notifications/bulk",
+            json={"action": "read", "type": "calibration_reminder"},
+            headers=get_auth_headers("worker"),
+        )
+        assert response.status_code == 200
+        assert response.json()["action"] == "read"
+
+
+# ============= Event Stream Tests =============
+
+class TestEvents:
+    """Push channel tests"""
+
+    def test_stream_requires_auth(self, client):
+        """Test that the event stream rejects anonymous clients"""
+        response = client.get("/events/stream")
+        assert response.status_code == 401
+
+    def test_stream_accepts_query_token(self, client):
+        """Test that the stream opens with a token in the query string"""
+        token = TokenStore.tokens.get("worker")
+        with client.stream("GET", "/events/stream", params={"token": token}) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+
+
+# ============= Background Job Tests =============
+
+class TestJobs:
+    """Background job endpoint tests"""
+
+    def test_list_jobs_as_worker_forbidden(self, client):
+        """Test that workers cannot list jobs"""
+        response = client.get("/jobs", headers=get_auth_headers("worker"))
+        assert response.status_code == 403
+
+    def test_create_unknown_job(self, client):
+        """Test that only registered jobs can be queued"""
+        response = client.post("/jobs", json={"name": "no.such.job"}, headers=get_auth_headers("admin"))
+        assert response.status_code == 400
+
+    def test_create_and_get_job(self, client):
+        """Test queueing a registered job and reading its status"""
+        response = client.post("/jobs", json={"name": "jobs.prune"}, headers=get_auth_headers("admin"))
+        assert response.status_code == 201
+        job = response.json()
+        assert job["status"] == "queued"
+
+        response = client.get(f"/jobs/{job['id']}", headers=get_auth_headers("admin"))
+        assert response.status_code == 200
+        assert response.json()["status"] in ("queued", "running", "succeeded")
+
+    def test_run_transfer_expiry(self, client):
+        """Test that the transfer request sweeper is scheduled and can be queued"""
+        response = client.get("/jobs/tasks", headers=get_auth_headers("admin"))
+        assert response.status_code == 200
+        tasks = {task["name"]: task["interval_seconds"] for task in response.json()}
+        assert tasks.get("transfers.expire_requests")
+
+        response = client.post("/jobs", json={"name": "transfers.expire_requests"}, headers=get_auth_headers("admin"))
+        assert response.status_code == 201
+
+
 # ============= Settings Tests =============
 
 class TestSettings:
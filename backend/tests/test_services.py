@@ -0,0 +1,1017 @@
+"""
+Service Test Script for Vercajch
+
+Exercises background services (change log, audit writer, partitions,
+notifications, jobs) directly against the database, for behavior that has
+no API of its own.
+
+Run with: pytest tests/test_services.py -v
+
+Prerequisites:
+1. Database migrated (alembic upgrade head) and seeded: python -m app.db.seed
+2. DATABASE_URL pointing at it, as for the API
+"""
+import asyncio
+import uuid
+from datetime import date, datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.api.routes.transfers import respond_to_request
+from app.core.config import settings
+from app.core.database import async_session_factory, engine, retry_on_conflict
+from app.models.audit import AuditLog
+from app.models.calibration import CalibrationReminderSent, CalibrationReminderSetting
+from app.models.change_log import ChangeLogConsumer
+from app.models.checkout import Checkout
+from app.models.equipment import Category, Equipment, EquipmentTag, Location
+from app.models.job import BackgroundJob
+from app.models.notification import Notification
+from app.models.partitioning import add_months, month_start, partition_name, upcoming_months
+from app.models.system import SystemSetting
+from app.models.transfer import TransferMatch, TransferOffer, TransferRequest
+from app.models.user import User
+from app.schemas.checkout import (
+    CheckoutBatchCreate, CheckoutBatchReturn, CheckoutCreate, CheckoutExtend, CheckoutReturn,
+)
+from app.schemas.transfer import TransferRequestRespond
+from app.services import audit
+from app.services.calibrations import STATUS_RUN_KEY, refresh_calibration_status, send_calibration_reminders
+from app.services.changes import ChangeConsumer, _consume_shared, head_position, read_changes
+from app.services.checkouts import (
+    checkout_batch, checkout_equipment, extend_return_date, get_checkout, mark_overdue, return_batch,
+    return_equipment,
+)
+from app.services.jobs import _claim, task
+from app.services.notifications import (
+    NotificationEvent, deliver, enqueue_notify, notify, reconcile_unread_counts,
+)
+from app.services.partitions import maintain_partitions, monthly_partitions, retention_start
+from app.services.transfer_expiry import expire_requests
+from app.services.transfer_matching import match_requests
+
+
+def run(coro):
+    """Run a test coroutine on a fresh event loop, dropping pooled connections after"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+async def user_id(email: str) -> uuid.UUID:
+    async with async_session_factory() as db:
+        return (await db.execute(select(User.id).where(User.email == email))).scalar_one()
+
+
+def unique(prefix: str) -> str:
+    return f"{prefix} {uuid.uuid4().hex[:8]}"
+
+
+async def eventually(check, attempts: int = 50, delay: float = 0.1):
+    """Poll an async check until it returns something truthy"""
+    for _ in range(attempts):
+        result = await check()
+        if result:
+            return result
+        await asyncio.sleep(delay)
+    return await check()
+
+
+async def notification_jobs(db, entity_id: uuid.UUID) -> list:
+    """notifications.deliver jobs queued with an event about entity_id"""
+    return (await db.execute(
+        select(BackgroundJob).where(
+            BackgroundJob.name == "notifications.deliver",
+            BackgroundJob.payload["events"].contains([{"entity_id": str(entity_id)}]),
+        )
+    )).scalars().all()
+
+
+# ============= Change Log Tests =============
+
+class TestChangeLog:
+    """Change-data capture tests"""
+
+    def test_changes_read_in_commit_order(self):
+        """Test that insert, update and delete of a row are read back in order"""
+        async def scenario():
+            async with async_session_factory() as db:
+                start = await head_position(db)
+                await db.commit()
+
+                category = Category(name=unique("Changes"))
+                db.add(category)
+                await db.commit()
+                category.name = unique("Renamed")
+                await db.commit()
+                await db.delete(category)
+                await db.commit()
+
+                async def entries():
+                    rows = await read_changes(db, start, ["categories"])
+                    await db.commit()
+                    rows = [row for row in rows if row.row_id == str(category.id)]
+                    return rows if len(rows) == 3 else None
+
+                return await eventually(entries)
+
+        entries = run(scenario())
+        assert [entry.op for entry in entries] == ["insert", "update", "delete"]
+        assert "name" in entries[1].columns
+        positions = [(entry.version, entry.seq) for entry in entries]
+        assert positions == sorted(positions)
+
+    def test_shared_consumer_delivers_each_change_once(self):
+        """Test that a shared consumer starts at the head and does not see a change twice"""
+        seen = []
+
+        async def collect(entries):
+            seen.extend(entries)
+
+        consumer = ChangeConsumer(
+            name=f"test.{uuid.uuid4().hex}", func=collect, tables=["categories"], shared=True
+        )
+
+        async def scenario():
+            await _consume_shared(consumer)
+            async with async_session_factory() as db:
+                category = Category(name=unique("Consumer"))
+                db.add(category)
+                await db.commit()
+
+                async def delivered():
+                    await _consume_shared(consumer)
+                    return any(entry.row_id == str(category.id) for entry in seen)
+
+                found = await eventually(delivered)
+                await _consume_shared(consumer)
+
+                await db.delete(category)
+                await db.execute(delete(ChangeLogConsumer).where(ChangeLogConsumer.name == consumer.name))
+                await db.commit()
+            return found, str(category.id)
+
+        found, category_id = run(scenario())
+        assert found
+        assert [entry.row_id for entry in seen].count(category_id) == 1
+
+
+# ============= Audit Tests =============
+
+class TestAudit:
+    """Batched audit writer tests"""
+
+    def test_only_committed_changes_are_queued(self):
+        """Test that a change is queued on commit with its values and dropped on rollback"""
+        async def scenario():
+            audit._queue = asyncio.Queue(maxsize=10)
+            try:
+                async with async_session_factory() as db:
+                    db.add(Equipment(name=unique("Rolled back")))
+                    await db.flush()
+                    await db.rollback()
+                    rolled_back = audit._queue.qsize()
+
+                    equipment = Equipment(name=unique("Audited"))
+                    db.add(equipment)
+                    await db.commit()
+                    equipment.description = "changed"
+                    await db.commit()
+                    entries = [audit._queue.get_nowait() for _ in range(audit._queue.qsize())]
+
+                    await db.delete(equipment)
+                    await db.commit()
+                return rolled_back, entries, equipment.id
+            finally:
+                audit._queue = None
+
+        rolled_back, entries, equipment_id = run(scenario())
+        assert rolled_back == 0
+        assert [entry["action"] for entry in entries] == ["equipment.create", "equipment.update"]
+        assert all(entry["entity_id"] == equipment_id for entry in entries)
+        assert entries[1]["old_values"] == {"description": None}
+        assert entries[1]["new_values"] == {"description": "changed"}
+
+    def test_entries_written_in_batch_on_stop(self):
+        """Test that queued entries are written by the writer, and drained on stop"""
+        entity_id = uuid.uuid4()
+
+        async def scenario():
+            audit.start()
+            for _ in range(3):
+                audit.record("test.batch", "test", entity_id)
+            await audit.stop()
+            async with async_session_factory() as db:
+                return (await db.execute(
+                    select(AuditLog).where(AuditLog.entity_id == entity_id)
+                )).scalars().all()
+
+        rows = run(scenario())
+        assert [row.action for row in rows] == ["test.batch"] * 3
+
+    def test_dropped_entries_are_counted(self):
+        """Test that entries refused by a full queue are logged as one audit.dropped entry"""
+        started = datetime.utcnow()
+        entity_id = uuid.uuid4()
+
+        async def scenario():
+            audit._queue = asyncio.Queue(maxsize=1)
+            try:
+                for _ in range(3):
+                    audit.record("test.dropped", "test", entity_id)
+                await audit.stop()
+            finally:
+                audit._queue = None
+            async with async_session_factory() as db:
+                kept = (await db.execute(
+                    select(AuditLog).where(AuditLog.entity_id == entity_id)
+                )).scalars().all()
+                dropped = (await db.execute(
+                    select(AuditLog).where(
+                        AuditLog.action == "audit.dropped",
+                        AuditLog.created_at >= started,
+                    )
+                )).scalars().all()
+            return kept, dropped
+
+        kept, dropped = run(scenario())
+        assert len(kept) == 1
+        assert {"count": 2} in [row.new_values for row in dropped]
+
+
+# ============= Partition Tests =============
+
+async def insert_audit_row(created_at: datetime) -> uuid.UUID:
+    row_id = uuid.uuid4()
+    async with async_session_factory() as db:
+        await db.execute(insert(AuditLog).values(id=row_id, action="test.partition", created_at=created_at))
+        await db.commit()
+    return row_id
+
+
+async def audit_row_partition(row_id: uuid.UUID):
+    async with async_session_factory() as db:
+        return (await db.execute(
+            text("SELECT tableoid::regclass::text FROM audit_log WHERE id = :id"), {"id": row_id}
+        )).scalar_one_or_none()
+
+
+class TestPartitions:
+    """Monthly partition upkeep tests"""
+
+    def test_rows_without_partition_kept_in_default(self):
+        """Test that a month without a partition still takes inserts, and is moved out by upkeep"""
+        month = add_months(month_start(datetime.utcnow()), 60)
+        name = partition_name("audit_log", month)
+
+        async def scenario():
+            row_id = await insert_audit_row(datetime(month.year, month.month, 15))
+            before = await audit_row_partition(row_id)
+            result = await maintain_partitions()
+            after = await audit_row_partition(row_id)
+            async with async_session_factory() as db:
+                partitions = {
+                    table: await monthly_partitions(db, table) for table in ("audit_log", "notifications")
+                }
+                await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                await db.commit()
+            return before, result, after, partitions
+
+        before, result, after, partitions = run(scenario())
+        assert before == "audit_log_default"
+        assert name in result["created"]
+        assert after == name
+        for existing in partitions.values():
+            assert set(upcoming_months()) <= set(existing)
+
+    def test_expired_month_archived(self):
+        """Test that a month past retention is exported and dropped"""
+        month = add_months(month_start(retention_start("audit_log")), -1)
+        name = partition_name("audit_log", month)
+
+        async def scenario():
+            row_id = await insert_audit_row(datetime(month.year, month.month, 15))
+            result = await maintain_partitions()
+            async with async_session_factory() as db:
+                remaining = await monthly_partitions(db, "audit_log")
+            return result, await audit_row_partition(row_id), remaining
+
+        result, partition, remaining = run(scenario())
+        assert result["archived"][name] >= 1
+        assert partition is None
+        assert month not in remaining
+
+
+# ============= Notification Tests =============
+
+class TestUnreadCounters:
+    """users.unread_notifications trigger tests"""
+
+    def test_counter_follows_inserts_reads_and_deletes(self):
+        """Test that the counter moves with set-based inserts, updates and deletes"""
+        async def scenario():
+            worker_id = await user_id("worker1@spp-d.sk")
+            title = unique("Counter")
+
+            async def unread():
+                async with async_session_factory() as db:
+                    return (await db.execute(
+                        select(User.unread_notifications).where(User.id == worker_id)
+                    )).scalar_one()
+
+            counts = [await unread()]
+            async with async_session_factory() as db:
+                await db.execute(insert(Notification), [
+                    {"id": uuid.uuid4(), "user_id": worker_id, "type": "test", "title": title,
+                     "is_read": read, "created_at": datetime.utcnow()}
+                    for read in (False, False, False, True)
+                ])
+                await db.commit()
+                counts.append(await unread())
+
+                await db.execute(
+                    update(Notification)
+                    .where(Notification.title == title, Notification.is_read == False)
+                    .values(is_read=True)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                counts.append(await unread())
+
+                await db.execute(update(User).where(User.id == worker_id).values(unread_notifications=99))
+                await db.commit()
+                await reconcile_unread_counts()
+                counts.append(await unread())
+
+                await db.execute(delete(Notification).where(Notification.title == title))
+                await db.commit()
+                counts.append(await unread())
+            return counts
+
+        start, inserted, read, reconciled, deleted = run(scenario())
+        assert inserted == start + 3
+        assert read == start
+        assert reconciled == start
+        assert deleted == start
+
+
+class TestNotify:
+    """Notification fan-out tests"""
+
+    def test_repeated_event_delivered_once(self):
+        """Test that an event already sent to a user within the dedupe window is dropped"""
+        entity_id = uuid.uuid4()
+
+        async def scenario():
+            worker_id = await user_id("worker1@spp-d.sk")
+            event = NotificationEvent(
+                type="test_dedupe", title=unique("Dedupe"), recipients=[worker_id, worker_id],
+                entity_type="test", entity_id=entity_id,
+            )
+            results = [await notify([event]), await notify([event])]
+            async with async_session_factory() as db:
+                rows = (await db.execute(
+                    select(Notification).where(Notification.related_entity_id == entity_id)
+                )).scalars().all()
+                await db.execute(delete(Notification).where(Notification.related_entity_id == entity_id))
+                await db.commit()
+            return results, rows
+
+        (first, second), rows = run(scenario())
+        assert first["in_app"] == 1
+        assert second["in_app"] == 0
+        assert len(rows) == 1
+
+    def test_events_sharing_digest_key_merged(self):
+        """Test that a user's events with one digest_key become a single notice past the threshold"""
+        count = settings.NOTIFICATION_DIGEST_THRESHOLD
+        digest_title = unique("{count} digested")
+
+        async def scenario():
+            worker_id = await user_id("worker1@spp-d.sk")
+            result = await notify([
+                NotificationEvent(
+                    type="test_digest", title=f"Item {index}", recipients=[worker_id],
+                    entity_type="test", entity_id=uuid.uuid4(),
+                    digest_key="test_digest", digest_title=digest_title,
+                )
+                for index in range(count)
+            ])
+            async with async_session_factory() as db:
+                rows = (await db.execute(
+                    select(Notification).where(
+                        Notification.user_id == worker_id, Notification.type == "test_digest_digest",
+                        Notification.title == digest_title.format(count=count),
+                    )
+                )).scalars().all()
+                await db.execute(delete(Notification).where(Notification.id.in_([row.id for row in rows])))
+                await db.commit()
+            return result, rows
+
+        result, rows = run(scenario())
+        assert result["in_app"] == 1
+        assert len(rows) == 1
+        assert rows[0].message.splitlines()[0] == "Item 0"
+
+    def test_enqueued_events_delivered_only_after_commit(self):
+        """Test that enqueue_notify adds a job with the caller's transaction, which then delivers"""
+        entity_id = uuid.uuid4()
+
+        async def scenario():
+            worker_id = await user_id("worker1@spp-d.sk")
+            event = NotificationEvent(
+                type="test_enqueued", title=unique("Enqueued"), recipients=[worker_id, None],
+                entity_type="test", entity_id=entity_id, channels=("in_app",),
+            )
+
+            async def jobs():
+                return (await db.execute(
+                    select(BackgroundJob).where(
+                        BackgroundJob.name == "notifications.deliver",
+                        BackgroundJob.payload["events"][0]["entity_id"].astext == str(entity_id),
+                    )
+                )).scalars().all()
+
+            async with async_session_factory() as db:
+                await enqueue_notify(db, [event])
+                await db.rollback()
+                rolled_back = await jobs()
+
+                await enqueue_notify(db, [event])
+                await db.commit()
+                queued = await jobs()
+                # Delivered here rather than by a worker, which the test does not run
+                await db.execute(delete(BackgroundJob).where(BackgroundJob.id.in_([job.id for job in queued])))
+                await db.commit()
+
+            result = await deliver(**queued[0].payload)
+            async with async_session_factory() as db:
+                rows = (await db.execute(
+                    select(Notification).where(Notification.related_entity_id == entity_id)
+                )).scalars().all()
+                await db.execute(delete(Notification).where(Notification.related_entity_id == entity_id))
+                await db.commit()
+            return rolled_back, queued, result, rows, worker_id
+
+        rolled_back, queued, result, rows, worker_id = run(scenario())
+        assert rolled_back == []
+        assert len(queued) == 1
+        assert queued[0].payload["events"][0]["recipients"] == [str(worker_id)]
+        assert result["in_app"] == 1
+        assert [row.user_id for row in rows] == [worker_id]
+
+
+# ============= Calibration Tests =============
+
+class TestCalibrationStatus:
+    """calibrations.refresh_status tests"""
+
+    def test_refresh_rewrites_only_stale_statuses(self):
+        """Test that stored statuses follow the calendar and current ones are left alone"""
+        today = date.today()
+        due_dates = {
+            "expired": today - timedelta(days=1),
+            "expiring": today + timedelta(days=10),
+            "valid": today + timedelta(days=60),
+        }
+
+        async def scenario():
+            async with async_session_factory() as db:
+                equipment = {
+                    expected: Equipment(
+                        name=unique(f"Calibration {expected}"), requires_calibration=True,
+                        next_calibration_date=due_date, calibration_status="valid",
+                    )
+                    for expected, due_date in due_dates.items()
+                }
+                equipment["not_required"] = Equipment(name=unique("No calibration"), calibration_status="valid")
+                db.add_all(equipment.values())
+                await db.commit()
+                versions = {expected: item.version for expected, item in equipment.items()}
+
+            result = await refresh_calibration_status()
+            async with async_session_factory() as db:
+                rows = {
+                    expected: (await db.execute(
+                        select(Equipment.calibration_status, Equipment.version).where(Equipment.id == item.id)
+                    )).one()
+                    for expected, item in equipment.items()
+                }
+                run_record = (await db.execute(
+                    select(SystemSetting.value).where(SystemSetting.key == STATUS_RUN_KEY)
+                )).scalar_one()
+                await db.execute(delete(Equipment).where(Equipment.id.in_([item.id for item in equipment.values()])))
+                await db.commit()
+            return result, rows, versions, run_record
+
+        result, rows, versions, run_record = run(scenario())
+        for expected, (status, version) in rows.items():
+            assert status == expected
+        assert rows["valid"][1] == versions["valid"]
+        assert rows["expired"][1] == versions["expired"] + 1
+        for status in ("expired", "expiring", "not_required"):
+            assert result["changed"][status] >= 1
+        assert run_record["changed"] == result["changed"]
+
+
+class TestCalibrationReminders:
+    """calibrations.send_reminders tests"""
+
+    def test_reminder_queued_once_per_cycle(self):
+        """Test that a due reminder is recorded and queued for delivery once, and a rerun adds nothing"""
+        async def scenario():
+            worker_id = await user_id("worker1@spp-d.sk")
+            async with async_session_factory() as db:
+                equipment = Equipment(
+                    name=unique("Reminder"), requires_calibration=True, current_holder_id=worker_id,
+                    next_calibration_date=date.today() + timedelta(days=3),
+                )
+                db.add(equipment)
+                await db.flush()
+                setting = CalibrationReminderSetting(
+                    scope_type="equipment", equipment_id=equipment.id, days_before=[7],
+                    notify_manager=False, notify_email=False, notify_push=False,
+                )
+                db.add(setting)
+                await db.commit()
+
+            results = [await send_calibration_reminders(), await send_calibration_reminders()]
+            async with async_session_factory() as db:
+                ledger = (await db.execute(
+                    select(CalibrationReminderSent).where(CalibrationReminderSent.equipment_id == equipment.id)
+                )).scalars().all()
+                reminders = await notification_jobs(db, equipment.id)
+
+                await db.execute(delete(BackgroundJob).where(BackgroundJob.id.in_([job.id for job in reminders])))
+                await db.execute(delete(CalibrationReminderSent).where(
+                    CalibrationReminderSent.equipment_id == equipment.id
+                ))
+                await db.execute(delete(CalibrationReminderSetting).where(CalibrationReminderSetting.id == setting.id))
+                await db.execute(delete(Equipment).where(Equipment.id == equipment.id))
+                await db.commit()
+            return results, ledger, reminders, worker_id
+
+        (first, second), ledger, reminders, worker_id = run(scenario())
+        assert first["reminders"] >= 1
+        assert [(row.reminder_type, row.sent_to) for row in ledger] == [("7_days", worker_id)]
+        assert len(reminders) == 1
+        event = reminders[0].payload["events"][0]
+        assert event["recipients"] == [str(worker_id)]
+        assert event["channels"] == ["in_app"]
+
+
+# ============= Transfer Tests =============
+
+class TestTransferMatching:
+    """Broadcast request matching tests"""
+
+    def test_holders_below_category_matched_nearest_first(self):
+        """Test that holders in the requested subtree are matched by distance, others are not"""
+        async def scenario():
+            requester, near, far, outside = [
+                await user_id(email) for email in
+                ("worker1@spp-d.sk", "manager@spp-d.sk", "leader@spp-d.sk", "admin@spp-d.sk")
+            ]
+            async with async_session_factory() as db:
+                requested, sibling = Category(name=unique("Requested")), Category(name=unique("Sibling"))
+                db.add_all([requested, sibling])
+                await db.flush()
+                subcategory = Category(name=unique("Subcategory"), parent_category_id=requested.id)
+                site, nearby, distant = [
+                    Location(name=unique(name), type="project", gps_lat=lat, gps_lng=17)
+                    for name, lat in (("Site", 48), ("Nearby", 48.01), ("Distant", 49))
+                ]
+                db.add_all([subcategory, site, nearby, distant])
+                await db.flush()
+                equipment = [
+                    Equipment(
+                        name=unique("Matched"), category_id=category.id,
+                        current_holder_id=holder, current_location_id=location.id,
+                    )
+                    for category, holder, location in (
+                        (subcategory, far, distant),
+                        (subcategory, near, nearby),
+                        (requested, requester, site),
+                        (sibling, outside, site),
+                    )
+                ]
+                transfer_request = TransferRequest(
+                    request_type="broadcast", requester_id=requester,
+                    category_id=requested.id, location_id=site.id, status="pending",
+                )
+                db.add_all([*equipment, transfer_request])
+                await db.commit()
+
+            result = await match_requests(transfer_request.id)
+            async with async_session_factory() as db:
+                matches = (await db.execute(
+                    select(TransferMatch.user_id, TransferMatch.distance_km)
+                    .where(TransferMatch.request_id == transfer_request.id)
+                    .order_by(TransferMatch.distance_km.asc().nulls_last())
+                )).all()
+                broadcasts = await notification_jobs(db, transfer_request.id)
+
+                await db.execute(delete(BackgroundJob).where(BackgroundJob.id.in_([job.id for job in broadcasts])))
+                await db.execute(delete(TransferRequest).where(TransferRequest.id == transfer_request.id))
+                await db.execute(delete(Equipment).where(Equipment.id.in_([item.id for item in equipment])))
+                await db.execute(delete(Category).where(Category.id == subcategory.id))
+                await db.execute(delete(Category).where(Category.id.in_([requested.id, sibling.id])))
+                await db.execute(delete(Location).where(Location.id.in_([site.id, nearby.id, distant.id])))
+                await db.commit()
+            return result, matches, broadcasts, (near, far)
+
+        result, matches, broadcasts, (near, far) = run(scenario())
+        assert result == {"matches": 2, "new": 2}
+        assert [user for user, _ in matches] == [near, far]
+        assert matches[0][1] < 2 < 100 < matches[1][1]
+        assert len(broadcasts) == 1
+        assert sorted(broadcasts[0].payload["events"][0]["recipients"]) == sorted([str(near), str(far)])
+
+
+class TestTransferExpiry:
+    """transfers.expire_requests tests"""
+
+    def test_expired_request_closed_with_its_offers_and_matches(self):
+        """Test that a request past expiry is refused, then expired with its offer rejected and matches dropped"""
+        async def scenario():
+            requester, offerer = await user_id("worker1@spp-d.sk"), await user_id("leader@spp-d.sk")
+            async with async_session_factory() as db:
+                category = Category(name=unique("Expiring"))
+                db.add(category)
+                await db.flush()
+                equipment = Equipment(name=unique("Offered"), category_id=category.id, current_holder_id=offerer)
+                transfer_request = TransferRequest(
+                    request_type="broadcast", requester_id=requester, category_id=category.id,
+                    status="pending", expires_at=datetime.utcnow() - timedelta(minutes=1),
+                )
+                db.add_all([equipment, transfer_request])
+                await db.flush()
+                offer = TransferOffer(
+                    request_id=transfer_request.id, offerer_id=offerer, equipment_id=equipment.id, status="pending"
+                )
+                match = TransferMatch(request_id=transfer_request.id, user_id=offerer, equipment_count=1)
+                db.add_all([offer, match])
+                await db.commit()
+
+                try:
+                    await respond_to_request(
+                        transfer_request.id, TransferRequestRespond(action="accept"),
+                        db, await db.get(User, offerer),
+                    )
+                    refused = None
+                except HTTPException as exc:
+                    await db.rollback()
+                    refused = (exc.status_code, exc.detail)
+
+            result = await expire_requests()
+            async with async_session_factory() as db:
+                request_status = (await db.execute(
+                    select(TransferRequest.status).where(TransferRequest.id == transfer_request.id)
+                )).scalar_one()
+                offer_status = (await db.execute(
+                    select(TransferOffer.status).where(TransferOffer.id == offer.id)
+                )).scalar_one()
+                matches = (await db.execute(
+                    select(TransferMatch).where(TransferMatch.request_id == transfer_request.id)
+                )).scalars().all()
+                expiries = await notification_jobs(db, transfer_request.id)
+                notified = {
+                    (event["entity_type"], event["entity_id"], tuple(event["recipients"]))
+                    for job in expiries for event in job.payload["events"]
+                }
+
+                await db.execute(delete(BackgroundJob).where(BackgroundJob.id.in_([job.id for job in expiries])))
+                await db.execute(delete(TransferOffer).where(TransferOffer.id == offer.id))
+                await db.execute(delete(TransferRequest).where(TransferRequest.id == transfer_request.id))
+                await db.execute(delete(Equipment).where(Equipment.id == equipment.id))
+                await db.execute(delete(Category).where(Category.id == category.id))
+                await db.commit()
+            return refused, result, request_status, offer_status, matches, notified, (
+                transfer_request.id, offer.id, requester, offerer
+            )
+
+        refused, result, request_status, offer_status, matches, notified, ids = run(scenario())
+        request_id, offer_id, requester, offerer = ids
+        assert refused == (400, "Request has expired")
+        assert result["requests"] >= 1 and result["offers"] >= 1
+        assert request_status == "expired"
+        assert offer_status == "rejected"
+        assert matches == []
+        assert ("transfer_request", str(request_id), (str(requester),)) in notified
+        assert ("transfer_offer", str(offer_id), (str(offerer),)) in notified
+
+
+# ============= Job Tests =============
+
+@task("test.exclusive", exclusive=True)
+async def exclusive_job() -> None:
+    pass
+
+
+class TestJobs:
+    """Background job claiming tests"""
+
+    def test_exclusive_job_not_claimed_while_one_runs(self):
+        """Test that a job of an exclusive task waits for the running one, in any worker"""
+        async def scenario():
+            now = datetime.utcnow()
+            running, queued = uuid.uuid4(), uuid.uuid4()
+            async with async_session_factory() as db:
+                await db.execute(insert(BackgroundJob), [
+                    {"id": running, "name": "test.exclusive", "payload": {}, "status": "running",
+                     "attempts": 1, "max_attempts": 1, "run_at": now, "created_at": now,
+                     "worker": "elsewhere:1", "locked_until": now + timedelta(hours=1)},
+                    {"id": queued, "name": "test.exclusive", "payload": {}, "status": "queued",
+                     "attempts": 0, "max_attempts": 1, "run_at": now, "created_at": now},
+                ])
+                await db.commit()
+
+                blocked = await _claim(["test.exclusive"])
+                await db.execute(
+                    update(BackgroundJob).where(BackgroundJob.id == running)
+                    .values(status="succeeded", locked_until=None)
+                )
+                await db.commit()
+                claimed = await _claim(["test.exclusive"])
+
+                await db.execute(delete(BackgroundJob).where(BackgroundJob.id.in_([running, queued])))
+                await db.commit()
+            return blocked, claimed, queued
+
+        blocked, claimed, queued = run(scenario())
+        assert blocked is None
+        assert claimed[0] == queued
+
+
+# ============= Tree Path Tests =============
+
+class TestCategoryPaths:
+    """Materialized path trigger tests"""
+
+    def test_move_rewrites_descendant_paths(self):
+        """Test that a set-based move rewrites the subtree and a cycle is refused by the database"""
+        async def scenario():
+            async with async_session_factory() as db:
+                root, target = Category(name=unique("Root")), Category(name=unique("Target"))
+                db.add_all([root, target])
+                await db.flush()
+                child = Category(name=unique("Child"), parent_category_id=root.id)
+                db.add(child)
+                await db.flush()
+                grandchild = Category(name=unique("Grandchild"), parent_category_id=child.id)
+                db.add(grandchild)
+                await db.commit()
+                ids = [root.id, target.id, child.id, grandchild.id]
+
+                async def paths():
+                    rows = (await db.execute(
+                        select(Category.id, Category.path, Category.depth).where(Category.id.in_(ids))
+                    )).all()
+                    return {row[0]: (row[1], row[2]) for row in rows}
+
+                await db.execute(update(Category).where(Category.id == child.id).values(parent_category_id=target.id))
+                await db.commit()
+                moved = await paths()
+
+                try:
+                    await db.execute(
+                        update(Category).where(Category.id == target.id).values(parent_category_id=grandchild.id)
+                    )
+                    await db.commit()
+                    refused = False
+                except DBAPIError as exc:
+                    await db.rollback()
+                    refused = getattr(exc.orig, "pgcode", None) == "23514"
+                unchanged = await paths()
+
+                for category_id in (grandchild.id, child.id, root.id, target.id):
+                    await db.execute(delete(Category).where(Category.id == category_id))
+                await db.commit()
+            return ids, moved, refused, unchanged
+
+        (root, target, child, grandchild), moved, refused, unchanged = run(scenario())
+        assert moved[child] == (f"/{target}/{child}/", 1)
+        assert moved[grandchild] == (f"/{target}/{child}/{grandchild}/", 2)
+        assert moved[root] == (f"/{root}/", 0)
+        assert refused
+        assert unchanged == moved
+
+
+# ============= Checkout Tests =============
+
+class TestConcurrentWrites:
+    """Row locking and conflict retry tests"""
+
+    def test_concurrent_checkouts_of_one_piece(self):
+        """Test that of two checkouts of one available piece, the second waits and is refused"""
+        async def scenario():
+            worker = await user_id("worker1@spp-d.sk")
+            async with async_session_factory() as db:
+                equipment = Equipment(name=unique("Contended"))
+                db.add(equipment)
+                await db.commit()
+                user = await db.get(User, worker)
+            first_locked = asyncio.Event()
+
+            async def check_out(first: bool):
+                async with async_session_factory() as db:
+                    if not first:
+                        await first_locked.wait()
+                    try:
+                        await checkout_equipment(db, CheckoutCreate(equipment_id=equipment.id), user)
+                        if first:
+                            # Hold the lock while the other checkout tries
+                            first_locked.set()
+                            await asyncio.sleep(0.5)
+                        await db.commit()
+                        return 201
+                    except HTTPException as exc:
+                        await db.rollback()
+                        return exc.status_code
+                    finally:
+                        first_locked.set()
+
+            outcomes = await asyncio.gather(check_out(True), check_out(False))
+            async with async_session_factory() as db:
+                checkouts = (await db.execute(
+                    select(Checkout).where(Checkout.equipment_id == equipment.id)
+                )).scalars().all()
+                equipment_status = (await db.execute(
+                    select(Equipment.status).where(Equipment.id == equipment.id)
+                )).scalar_one()
+                await db.execute(delete(Checkout).where(Checkout.equipment_id == equipment.id))
+                await db.execute(delete(Equipment).where(Equipment.id == equipment.id))
+                await db.commit()
+            return outcomes, checkouts, equipment_status
+
+        outcomes, checkouts, equipment_status = run(scenario())
+        assert outcomes == [201, 400]
+        assert len(checkouts) == 1
+        assert equipment_status == "checked_out"
+
+    def test_retry_after_stale_data(self):
+        """Test that retry_on_conflict rolls back and runs the operation again after StaleDataError"""
+        attempts = []
+
+        async def scenario():
+            async with async_session_factory() as db:
+                async def operation():
+                    attempts.append(db.in_transaction())
+                    await db.execute(text("SELECT 1"))
+                    if len(attempts) == 1:
+                        raise StaleDataError("changed meanwhile")
+                    return "done"
+
+                return await retry_on_conflict(db, operation)
+
+        assert run(scenario()) == "done"
+        # The second attempt starts from a rolled back session
+        assert attempts == [False, False]
+
+    def test_retry_gives_up_with_conflict(self):
+        """Test that retry_on_conflict answers 409 after TRANSACTION_RETRY_ATTEMPTS conflicts"""
+        attempts = []
+
+        async def scenario():
+            async with async_session_factory() as db:
+                async def operation():
+                    attempts.append(1)
+                    raise StaleDataError("changed meanwhile")
+
+                try:
+                    await retry_on_conflict(db, operation)
+                except HTTPException as exc:
+                    return exc.status_code
+
+        assert run(scenario()) == 409
+        assert len(attempts) == settings.TRANSACTION_RETRY_ATTEMPTS
+
+
+class TestBatchCheckouts:
+    """Batch checkout and return tests"""
+
+    def test_batch_checkout_and_return(self):
+        """Test checking out pieces by id and by tag in one batch, then returning them"""
+        async def scenario():
+            worker = await user_id("worker1@spp-d.sk")
+            async with async_session_factory() as db:
+                by_id, by_tag = Equipment(name=unique("Batch id")), Equipment(name=unique("Batch tag"))
+                db.add_all([by_id, by_tag])
+                await db.flush()
+                tag = EquipmentTag(equipment_id=by_tag.id, tag_type="qr_code", tag_value=f"batch-{uuid.uuid4().hex}")
+                db.add(tag)
+                await db.commit()
+                user = await db.get(User, worker)
+
+                checked_out = await checkout_batch(db, CheckoutBatchCreate(
+                    equipment_ids=[by_id.id], tag_values=[tag.tag_value, tag.tag_value],
+                ), user)
+                await db.commit()
+                checkouts = (await db.execute(
+                    select(Checkout).where(Checkout.equipment_id.in_([by_id.id, by_tag.id]))
+                )).scalars().all()
+                out_statuses = (await db.execute(
+                    select(Equipment.status).where(Equipment.id.in_([by_id.id, by_tag.id]))
+                )).scalars().all()
+
+                returned = await return_batch(db, CheckoutBatchReturn(
+                    equipment_ids=[by_id.id], tag_values=[tag.tag_value],
+                ), user)
+                await db.commit()
+                db.expire_all()
+                in_statuses = (await db.execute(
+                    select(Equipment.status).where(Equipment.id.in_([by_id.id, by_tag.id]))
+                )).scalars().all()
+                closed = (await db.execute(
+                    select(Checkout.status).where(Checkout.equipment_id.in_([by_id.id, by_tag.id]))
+                )).scalars().all()
+
+                await db.execute(delete(Checkout).where(Checkout.equipment_id.in_([by_id.id, by_tag.id])))
+                await db.execute(delete(EquipmentTag).where(EquipmentTag.id == tag.id))
+                await db.execute(delete(Equipment).where(Equipment.id.in_([by_id.id, by_tag.id])))
+                await db.commit()
+            return checked_out, checkouts, out_statuses, returned, in_statuses, closed, (by_id.id, by_tag.id)
+
+        checked_out, checkouts, out_statuses, returned, in_statuses, closed, ids = run(scenario())
+        assert [(item.equipment_id, item.status, item.detail) for item in checked_out] == [
+            (ids[0], "checked_out", None),
+            (ids[1], "checked_out", None),
+            (ids[1], "error", "Listed more than once"),
+        ]
+        assert {checkout.equipment_id for checkout in checkouts} == set(ids)
+        assert len(checkouts) == 2
+        assert out_statuses == ["checked_out", "checked_out"]
+        assert [item.status for item in returned] == ["returned", "returned"]
+        assert in_statuses == ["available", "available"]
+        assert closed == ["returned", "returned"]
+
+
+class TestOverdueCheckouts:
+    """checkouts.mark_overdue tests"""
+
+    def test_overdue_checkout_flagged_and_still_open(self):
+        """Test that a late checkout is flagged with a reminder, and can still be extended and returned"""
+        async def scenario():
+            worker_id = await user_id("worker1@spp-d.sk")
+            async with async_session_factory() as db:
+                equipment = Equipment(name=unique("Overdue"), status="checked_out", current_holder_id=worker_id)
+                db.add(equipment)
+                await db.flush()
+                checkout = Checkout(
+                    equipment_id=equipment.id, user_id=worker_id, status="active",
+                    expected_return_at=datetime.utcnow() - timedelta(hours=1),
+                )
+                db.add(checkout)
+                await db.commit()
+
+            result = await mark_overdue()
+            async with async_session_factory() as db:
+                flagged = (await get_checkout(db, checkout.id)).status
+                reminders = (await db.execute(
+                    select(BackgroundJob).where(
+                        BackgroundJob.name == "notifications.deliver",
+                        BackgroundJob.payload["events"].contains([{"entity_id": str(checkout.id)}]),
+                    )
+                )).scalars().all()
+                await db.commit()
+
+                loaded = await get_checkout(db, checkout.id)
+                extend_return_date(loaded, CheckoutExtend(expected_return_at=datetime.utcnow() + timedelta(days=1)))
+                await db.commit()
+                extended = loaded.status
+
+                await db.execute(
+                    update(Checkout).where(Checkout.id == checkout.id)
+                    .values(expected_return_at=datetime.utcnow() - timedelta(hours=1))
+                )
+                await db.commit()
+                await mark_overdue()
+                db.expire_all()
+                loaded = await get_checkout(db, checkout.id)
+                reflagged = loaded.status
+                return_equipment(loaded, CheckoutReturn(), await db.get(User, worker_id))
+                await db.commit()
+                returned = loaded.status, loaded.equipment.status
+
+                await db.execute(delete(BackgroundJob).where(
+                    BackgroundJob.name == "notifications.deliver",
+                    BackgroundJob.payload["events"].contains([{"entity_id": str(checkout.id)}]),
+                ))
+                await db.execute(delete(Checkout).where(Checkout.id == checkout.id))
+                await db.execute(delete(Equipment).where(Equipment.id == equipment.id))
+                await db.commit()
+            return result, flagged, reminders, extended, reflagged, returned
+
+        result, flagged, reminders, extended, reflagged, returned = run(scenario())
+        assert result["flagged"] >= 1
+        assert flagged == "overdue"
+        assert len(reminders) == 1
+        assert extended == "active"
+        assert reflagged == "overdue"
+        assert returned == ("returned", "available")
@@ -316,12 +316,18 @@ export default function EquipmentDetailPage() {
                     </div>
                     <span
                       className={`text-xs px-2 py-1 rounded-full ${
-                        checkout.status === 'active'
-                          ? 'bg-blue-100 text-blue-800'
-                          : 'bg-gray-100 text-gray-800'
+                        checkout.status === 'overdue'
+                          ? 'bg-red-100 text-red-800'
+                          : checkout.status === 'active'
+                            ? 'bg-blue-100 text-blue-800'
+                            : 'bg-gray-100 text-gray-800'
                       }`}
                     >
-                      {checkout.status === 'active' ? 'Aktívne' : 'Vrátené'}
+                      {checkout.status === 'overdue'
+                        ? 'Oneskorené'
+                        : checkout.status === 'active'
+                          ? 'Aktívne'
+                          : 'Vrátené'}
                     </span>
                   </div>
                 ))}